@@ -4,7 +4,7 @@ from pathlib import Path
 
 # Import UI components
 from ui import styling, sidebar, chat, session
-from core.agent import PRISMAgent
+from core.warmup import start_warmup
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -13,9 +13,11 @@ logger = logging.getLogger(__name__)
 # Initialize PRISM agent (singleton pattern for Streamlit)
 @st.cache_resource
 def get_prism_agent():
-    """Get or create PRISM agent instance."""
+    """Get or create PRISM agent instance (shared with the warm-up thread)."""
     try:
-        return PRISMAgent()
+        # Imported here so the graph and its dependencies load after the page has rendered
+        from core.agent import get_prism_agent as get_shared_agent
+        return get_shared_agent()
     except Exception as e:
         logger.error(f"Error initializing PRISM agent: {e}")
         return None
@@ -67,20 +69,10 @@ def generate_response(user_query):
         
         # Get conversation history for context
         # Exclude the last message (current query) since it's passed separately as 'query'
-        conversation_history = None
-        if 'chat_history' in st.session_state and len(st.session_state.chat_history) > 0:
-            # Get all messages except the last one (which is the current query we just added)
-            history_messages = [
-                {"role": msg["role"], "content": msg["content"]}
-                for msg in st.session_state.chat_history[:-1]  # Exclude last message (current query)
-                if msg["role"] in ["user", "assistant"] and msg.get("content")  # Filter out None content
-            ]
-            # Only set conversation_history if we have messages (not just the current one)
-            if history_messages:
-                conversation_history = history_messages
+        conversation_history = session.get_conversation_history(exclude_last=True)
         
         # Generate thread ID from session (for memory)
-        thread_id = f"session_{st.session_state.user_context.get('student_id', 'default')}"
+        thread_id = session.get_thread_id()
         
         # Process query through agentic flow
         result = agent.process_query(
@@ -123,6 +115,9 @@ def main():
     # Initialize styling
     styling.set_streamlit_config()
     
+    # Build clients, indexes and the agent graph in the background (once per process)
+    start_warmup()
+    
     # Initialize session state
     session.initialize_session_state()
     
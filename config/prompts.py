@@ -0,0 +1,92 @@
+"""Cached access to the prompt and course configuration in prompts.yaml."""
+
+from functools import lru_cache
+from pathlib import Path
+from string import Formatter
+from typing import Dict, Any, List, Optional, Tuple
+import yaml
+from config.settings import OPENAI_MODEL, TRIAGE_MODEL
+
+PROMPTS_PATH = Path(__file__).resolve().parent / "prompts.yaml"
+
+
+@lru_cache(maxsize=1)
+def get_prompt_config() -> Dict[str, Any]:
+    """
+    Load prompts.yaml once per process.
+
+    Agents are constructed per request, so reading the file in each
+    constructor re-parsed it on every node call. Treat the result as read-only.
+
+    Returns:
+        Parsed configuration
+    """
+    with open(PROMPTS_PATH, 'r') as f:
+        return yaml.safe_load(f) or {}
+
+
+class CompiledTemplate:
+    """A prompt template parsed once into literal text and named fields."""
+
+    def __init__(self, template: str):
+        """
+        Parse the template.
+
+        Args:
+            template: Template text with {name} placeholders
+        """
+        self.template = template
+        self._parts: List[Tuple[str, Optional[str]]] = [
+            (literal, field) for literal, field, _, _ in Formatter().parse(template)
+        ]
+        self.fields = {field for _, field in self._parts if field}
+
+    def render(self, **values: Any) -> str:
+        """
+        Fill in the placeholders.
+
+        Args:
+            **values: Value for every field in the template
+
+        Returns:
+            Rendered prompt
+        """
+        pieces = []
+        for literal, field in self._parts:
+            pieces.append(literal)
+            if field:
+                pieces.append(str(values[field]))
+        return "".join(pieces)
+
+
+@lru_cache(maxsize=None)
+def get_template(section: str, name: str) -> CompiledTemplate:
+    """
+    Get a compiled template from prompts.yaml, parsed on first use.
+
+    Args:
+        section: Top-level section (e.g. "personalization")
+        name: Template name within the section
+
+    Returns:
+        Compiled template
+    """
+    return CompiledTemplate(get_prompt_config()[section][name])
+
+
+def get_node_model(node: str) -> str:
+    """
+    Get the chat model configured for an LLM call site under node_models.
+
+    Args:
+        node: Call site name (e.g. "relevance", "personalization")
+
+    Returns:
+        Model name; OPENAI_MODEL when the node is not configured
+    """
+    tier = (get_prompt_config().get('node_models') or {}).get(node, "default")
+    if tier == "default":
+        return OPENAI_MODEL
+    if tier == "triage":
+        return TRIAGE_MODEL
+    return tier
@@ -10,6 +10,7 @@ load_dotenv()
 # OpenAI Configuration
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o")
+TRIAGE_MODEL = os.getenv("TRIAGE_MODEL", "gpt-4o-mini")  # Short JSON classification calls
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-large")
 EMBEDDING_DIMENSION = 3072  # For text-embedding-3-large
 
@@ -22,16 +23,133 @@ PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "prism-course-materials")
 BASE_DIR = Path(__file__).resolve().parent.parent
 COURSES_DIR = "courses"
 COURSES_PATH = BASE_DIR / COURSES_DIR
+DATA_DIR = BASE_DIR / "data"
+INDEX_DIR = DATA_DIR / "indexes"
 
 # Document Processing Settings
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 200
 TOP_K_RESULTS = 5
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))  # Max course context tokens per prompt
 
-# Validate required environment variables
-if not OPENAI_API_KEY:
-    raise ValueError("OPENAI_API_KEY not found in environment variables")
+# Local Document Store Settings (full chunk text kept outside Pinecone metadata)
+DOCUMENT_STORE_ENABLED = os.getenv("DOCUMENT_STORE_ENABLED", "true").lower() == "true"
+DOCUMENT_STORE_PATH = Path(os.getenv("DOCUMENT_STORE_PATH", str(DATA_DIR / "documents.sqlite3")))
 
-if not PINECONE_API_KEY:
-    raise ValueError("PINECONE_API_KEY not found in environment variables")
+# Hybrid Retrieval Settings (dense Pinecone search fused with a local BM25 index)
+HYBRID_SEARCH_ENABLED = os.getenv("HYBRID_SEARCH_ENABLED", "true").lower() == "true"
+HYBRID_RRF_K = 60  # Reciprocal rank fusion constant
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Reranking Settings (optional local cross-encoder over a wider candidate set)
+RERANKER_ENABLED = os.getenv("RERANKER_ENABLED", "false").lower() == "true"
+RERANKER_MODEL = os.getenv("RERANKER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATES = 30  # Chunks retrieved for the reranker to choose from
+RERANK_BATCH_SIZE = 16
+RERANK_TOKEN_BUDGET = 3000  # Max context tokens kept after reranking
+
+# Flashcard Bank Settings (flashcards pre-generated at ingestion and served by similarity)
+FLASHCARD_BANK_ENABLED = os.getenv("FLASHCARD_BANK_ENABLED", "true").lower() == "true"
+FLASHCARDS_PER_MODULE = int(os.getenv("FLASHCARDS_PER_MODULE", "15"))
+FLASHCARD_BANK_MIN_SIMILARITY = 0.5  # Minimum topic-to-card cosine similarity served from the bank
+FLASHCARD_BANK_DEDUPE_SIMILARITY = 0.92  # Cards at least this similar to a banked card are dropped
+
+# Adaptive Retrieval Settings (start with a small k and widen only for weak or flat score curves)
+# Off until retrieval_thresholds in prompts.yaml hold calibrated values; until then a question is
+# answered from the course whenever any chunk is retrieved
+ADAPTIVE_RETRIEVAL_ENABLED = os.getenv("ADAPTIVE_RETRIEVAL_ENABLED", "false").lower() == "true"
+ADAPTIVE_INITIAL_K = 4  # Chunks retrieved on the first pass
+# Default score thresholds; per-course values live under retrieval_thresholds in prompts.yaml
+ADAPTIVE_MIN_SCORE = 0.25  # Top dense score below this routes the question to web search
+ADAPTIVE_CONFIDENT_SCORE = 0.45  # Top dense score below this widens retrieval
+ADAPTIVE_FLAT_SPREAD = 0.03  # Top-to-last score gap below this (flat curve) widens retrieval
+
+# Caching and Prefetch Settings (process-wide caches shared across turns)
+EMBEDDING_CACHE_SIZE = 1024  # Query/text embeddings kept in memory
+RETRIEVAL_CACHE_SIZE = 256  # Retrieval results kept in memory
+RETRIEVAL_CACHE_TTL = 600  # Seconds before a cached retrieval is refreshed
+CHUNK_CACHE_SIZE = 2048  # Hydrated chunks kept in memory
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "false").lower() == "true"
+PREFETCH_FOLLOW_UPS = 3  # Follow-up questions predicted (and retrieved ahead) per answered turn
+PREFETCH_MATCH_SIMILARITY = 0.9  # Question-to-prediction cosine similarity needed to reuse a prefetched retrieval
+
+# Web Result Ranking Settings (embedding similarity to the question and course, plus recency)
+WEB_RANKING_ENABLED = os.getenv("WEB_RANKING_ENABLED", "true").lower() == "true"
+WEB_RESULTS_TO_PROMPT = int(os.getenv("WEB_RESULTS_TO_PROMPT", "4"))  # Top-ranked web results passed to personalization
+WEB_RANK_QUERY_WEIGHT = 0.6  # Similarity of the result to the question
+WEB_RANK_COURSE_WEIGHT = 0.2  # Similarity of the result to the course description
+WEB_RANK_RECENCY_WEIGHT = 0.1  # Recency credit for ordinary questions
+WEB_RANK_CURRENT_RECENCY_WEIGHT = 0.4  # Recency credit for "latest"/"current" questions
+WEB_RANK_RECENCY_YEARS = 5  # Results this many years old (or undated) get no recency credit
+
+# Web Page Fetch Settings (optional: read the top results' pages and keep their most relevant passages)
+WEB_FETCH_ENABLED = os.getenv("WEB_FETCH_ENABLED", "false").lower() == "true"
+WEB_FETCH_CONCURRENCY = int(os.getenv("WEB_FETCH_CONCURRENCY", "4"))  # Pages fetched at the same time
+WEB_FETCH_TIMEOUT = float(os.getenv("WEB_FETCH_TIMEOUT", "5"))  # Seconds per page, further limited by the remaining budget
+WEB_FETCH_MAX_BYTES = 1_000_000  # Pages are cut off after this many bytes
+WEB_PAGE_CHUNK_WORDS = 150  # Words per passage a page is split into
+WEB_PAGE_MAX_CHUNKS = 40  # Passages per page considered for selection
+WEB_PAGE_CHUNKS_SELECTED = 2  # Passages per page passed to personalization
+
+# HTTP Connection Settings (process-wide pooled clients for OpenAI, Pinecone and Tavily)
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))  # Open connections per upstream
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "10"))  # Idle connections kept warm per upstream
+HTTP_KEEPALIVE_EXPIRY = 120.0  # Seconds an idle connection stays in the pool
+HTTP_CONNECT_TIMEOUT = 5.0
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "60"))  # Read/write timeout in seconds
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"  # Used when the h2 package is installed
+
+# Resilience Settings (deadline budget, retries and circuit breakers for external calls)
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "60"))  # Total budget per student query
+UPSTREAM_TIMEOUTS = {  # Per-attempt timeout caps in seconds, further limited by the remaining budget
+    "openai": 30.0,
+    "pinecone": 10.0,
+    "tavily": 20.0,
+}
+RETRY_MAX_ATTEMPTS = 3
+RETRY_BASE_DELAY = 0.5  # Seconds; doubled per attempt with full jitter
+RETRY_MAX_DELAY = 4.0
+CIRCUIT_FAILURE_THRESHOLD = 5  # Consecutive failures before an upstream is skipped
+CIRCUIT_RESET_SECONDS = 30.0  # Seconds before a trial call is let through again
+
+# Model Tiering Settings (per-node models are set under node_models in prompts.yaml)
+MODEL_ESCALATION_ENABLED = os.getenv("MODEL_ESCALATION_ENABLED", "true").lower() == "true"
+ESCALATION_CONFIDENCE = 0.7  # Triage answers below this self-reported confidence are re-asked on OPENAI_MODEL
+LATENCY_SAMPLES = 500  # Recent timings kept per node for latency percentiles
+
+# Admission Control Settings (cap on concurrent queries/flashcard runs and per-student rate limits)
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", "8"))  # Graph runs and flashcard calls at once
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "20"))  # Seconds a request may wait for a slot
+ADMISSION_MAX_QUEUE = 50  # Waiting requests beyond this are turned away immediately
+STUDENT_RATE_PER_MINUTE = float(os.getenv("STUDENT_RATE_PER_MINUTE", "10"))  # Sustained requests per student
+STUDENT_BURST = 5  # Requests a student may make back to back
+
+# Batch Job Settings (offline bulk generation through the provider's batch API)
+BATCH_BACKEND = os.getenv("BATCH_BACKEND", "openai")  # "openai", or "local" to run requests directly
+BATCH_POLL_SECONDS = float(os.getenv("BATCH_POLL_SECONDS", "60"))  # Seconds between batch status checks
+BATCH_COMPLETION_WINDOW = "24h"
+
+# Conversation Memory Settings
+CHECKPOINT_SHARDS = int(os.getenv("CHECKPOINT_SHARDS", "16"))  # Independently locked checkpoint stores
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", "7200"))  # Seconds before an abandoned session's thread is freed
+SESSION_MAX_THREADS = int(os.getenv("SESSION_MAX_THREADS", "1000"))  # Threads kept at most; least recently used are freed first
+
+# Warm-up Settings (build clients, index handles and the graph when the app starts)
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+WARMUP_EMBEDDING_CALL = os.getenv("WARMUP_EMBEDDING_CALL", "true").lower() == "true"  # Opens the OpenAI connection
+
+
+def validate_settings():
+    """
+    Validate required environment variables.
+
+    Called when the agent or an API client is first created rather than on
+    import, so modules that only need paths or constants import cheaply.
+    """
+    if not OPENAI_API_KEY:
+        raise ValueError("OPENAI_API_KEY not found in environment variables")
+
+    if not PINECONE_API_KEY:
+        raise ValueError("PINECONE_API_KEY not found in environment variables")
 
@@ -0,0 +1,224 @@
+"""Admission control for graph runs and flashcard generation: global cap, per-student rate limits, fair queue."""
+
+import time
+import logging
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Optional
+from config.settings import (
+    ADMISSION_MAX_CONCURRENT,
+    ADMISSION_QUEUE_TIMEOUT,
+    ADMISSION_MAX_QUEUE,
+    STUDENT_RATE_PER_MINUTE,
+    STUDENT_BURST
+)
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is rate limited or waits too long for a slot."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Refills at a steady rate up to a burst size; each request takes one token."""
+
+    def __init__(self, rate_per_second: float, capacity: float):
+        """
+        Initialize a full bucket.
+
+        Args:
+            rate_per_second: Tokens added per second
+            capacity: Maximum tokens (the allowed burst)
+        """
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """
+        Take a token, borrowing against the refill if the bucket is empty.
+
+        Returns:
+            Seconds the caller must wait before its token is available (0 if none)
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def give_back(self):
+        """Return a token taken by a request that was turned away."""
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+
+class _Ticket:
+    """A queued request waiting for a slot."""
+
+    __slots__ = ("student_id", "granted")
+
+    def __init__(self, student_id: str):
+        self.student_id = student_id
+        self.granted = False
+
+
+class AdmissionController:
+    """
+    Limits concurrent work and shares it fairly between students.
+
+    At most max_concurrent requests run at once. Further requests wait in a
+    queue that hands freed slots to students in round-robin order, so one
+    student's burst cannot starve the others. Each student also has a token
+    bucket; requests beyond the burst are delayed to the sustained rate, or
+    turned away if that delay exceeds the queue timeout.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = ADMISSION_MAX_CONCURRENT,
+        queue_timeout: float = ADMISSION_QUEUE_TIMEOUT,
+        max_queue: int = ADMISSION_MAX_QUEUE,
+        rate_per_minute: float = STUDENT_RATE_PER_MINUTE,
+        burst: int = STUDENT_BURST
+    ):
+        """
+        Initialize the controller.
+
+        Args:
+            max_concurrent: Requests allowed to run at the same time
+            queue_timeout: Seconds a request may wait before being turned away
+            max_queue: Requests allowed to wait at once; more are turned away immediately
+            rate_per_minute: Sustained requests per student
+            burst: Requests a student may make back to back
+        """
+        self.max_concurrent = max(1, max_concurrent)
+        self.queue_timeout = queue_timeout
+        self.max_queue = max_queue
+        self.rate_per_second = rate_per_minute / 60.0
+        self.burst = max(1, burst)
+        self._running = 0
+        self._queued = 0
+        self._waiting: "OrderedDict[str, Deque[_Ticket]]" = OrderedDict()
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._condition = threading.Condition()
+
+    def _rate_limit(self, student_id: str, timeout: float) -> float:
+        """Take a token from the student's bucket and return how long to wait for it."""
+        with self._condition:
+            bucket = self._buckets.get(student_id)
+            if bucket is None:
+                bucket = self._buckets[student_id] = TokenBucket(self.rate_per_second, self.burst)
+            wait = bucket.take()
+            if wait > timeout:
+                bucket.give_back()
+                raise AdmissionRejected(
+                    f"You're sending requests faster than PRISM can answer them. Please try again in about {int(wait) + 1} seconds.",
+                    retry_after=wait
+                )
+        return wait
+
+    def _grant_next(self):
+        """Hand free slots to waiting students in round-robin order. Call with the lock held."""
+        while self._running < self.max_concurrent and self._waiting:
+            student_id, tickets = next(iter(self._waiting.items()))
+            ticket = tickets.popleft()
+            if tickets:
+                self._waiting.move_to_end(student_id)
+            else:
+                del self._waiting[student_id]
+            ticket.granted = True
+            self._queued -= 1
+            self._running += 1
+        self._condition.notify_all()
+
+    def _acquire(self, student_id: str, timeout: float):
+        """Take a slot, waiting in the fair queue for at most timeout seconds."""
+        with self._condition:
+            if self._running < self.max_concurrent and not self._waiting:
+                self._running += 1
+                return
+            if self._queued >= self.max_queue or timeout <= 0:
+                raise AdmissionRejected(
+                    "PRISM is answering a lot of questions right now. Please try again in a few seconds.",
+                    retry_after=self.queue_timeout
+                )
+
+            ticket = _Ticket(student_id)
+            self._waiting.setdefault(student_id, deque()).append(ticket)
+            self._queued += 1
+            logger.info(f"Queued request for {student_id} ({self._running} running, {self._queued} waiting)")
+
+            granted = self._condition.wait_for(lambda: ticket.granted, timeout=timeout)
+            if granted:
+                return
+
+            # Timed out: leave the queue
+            tickets = self._waiting.get(student_id)
+            tickets.remove(ticket)
+            if not tickets:
+                del self._waiting[student_id]
+            self._queued -= 1
+            raise AdmissionRejected(
+                "PRISM is answering a lot of questions right now. Please try again in a few seconds.",
+                retry_after=self.queue_timeout
+            )
+
+    def _release(self):
+        """Free a slot and pass it on to the next waiting student."""
+        with self._condition:
+            self._running -= 1
+            self._grant_next()
+
+    @contextmanager
+    def admit(self, student_id: Optional[str], rate_limited: bool = True, timeout: Optional[float] = None):
+        """
+        Run the block once the student is within their rate and a slot is free.
+
+        Args:
+            student_id: Student (or session) the request belongs to
+            rate_limited: Whether the request counts against the student's rate limit
+                (background work such as prefetching only needs a slot)
+            timeout: Seconds to wait in total, defaulting to the queue timeout; 0 fails
+                immediately when no slot is free
+
+        Raises:
+            AdmissionRejected: If the request is over the rate limit or times out in the queue
+        """
+        student_id = str(student_id or "anonymous")
+        timeout = self.queue_timeout if timeout is None else timeout
+        start = time.monotonic()
+
+        if rate_limited:
+            wait = self._rate_limit(student_id, timeout)
+            if wait > 0:
+                logger.info(f"Rate limiting {student_id} for {wait:.1f}s")
+                time.sleep(wait)
+
+        self._acquire(student_id, timeout - (time.monotonic() - start))
+        waited = time.monotonic() - start
+        if waited > 0.05:
+            logger.info(f"Admitted request for {student_id} after {waited:.2f}s")
+        try:
+            yield
+        finally:
+            self._release()
+
+    def snapshot(self) -> Dict[str, int]:
+        """
+        Get the current load.
+
+        Returns:
+            Dictionary with running and waiting request counts
+        """
+        with self._condition:
+            return {"running": self._running, "waiting": self._queued}
+
+
+admission_controller = AdmissionController()
@@ -1,9 +1,16 @@
 """Main agent orchestrator for LangGraph-based agentic RAG system."""
 
+import time
 import logging
+import threading
 from typing import Dict, Any, Optional, List
 from core.state import create_initial_state, AgentState
 from core.graph import create_agent_graph
+from core.session_manager import SessionManager
+from core.admission import admission_controller, AdmissionRejected
+from utils.metrics import connection_metrics, prompt_cache_metrics, latency_metrics
+from utils.resilience import deadline_scope
+from config.settings import REQUEST_DEADLINE_SECONDS, validate_settings
 
 logger = logging.getLogger(__name__)
 
@@ -14,12 +21,15 @@ class PRISMAgent:
     def __init__(self):
         """Initialize the PRISM agent."""
         self.graph = None
+        self.session_manager = None
         self._initialize_graph()
     
     def _initialize_graph(self):
         """Initialize the LangGraph."""
         try:
+            validate_settings()
             self.graph = create_agent_graph()
+            self.session_manager = SessionManager(self.graph.checkpointer)
             logger.info("PRISM agent graph initialized successfully")
         except Exception as e:
             logger.error(f"Error initializing agent graph: {e}")
@@ -31,7 +41,8 @@ class PRISMAgent:
         course_name: str,
         user_context: Dict[str, Any],
         conversation_history: Optional[List[Dict[str, str]]] = None,
-        thread_id: str = "default"
+        thread_id: str = "default",
+        triage: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
         """
         Process a user query through the agentic flow.
@@ -42,13 +53,71 @@ class PRISMAgent:
             user_context: Student information (degree, major, etc.)
             conversation_history: Previous conversation messages (optional, LangGraph handles this via checkpointing)
             thread_id: Thread ID for conversation memory
+            triage: Clarity and relevance already decided for this query (e.g. by follow-up
+                refinement), with is_relevant and relevance_reason. A relevant query skips
+                the refinement and relevance nodes.
             
         Returns:
             Dictionary with response and metadata
         """
+        student_id = user_context.get("student_id") or thread_id
+        try:
+            # Queue behind other students' runs instead of all hitting OpenAI at once
+            with admission_controller.admit(student_id):
+                return self._process_query(
+                    query=query,
+                    course_name=course_name,
+                    user_context=user_context,
+                    conversation_history=conversation_history,
+                    thread_id=thread_id,
+                    triage=triage
+                )
+        except AdmissionRejected as e:
+            return self._rejected_response(student_id, e)
+    
+    def _rejected_response(self, student_id: str, error: AdmissionRejected) -> Dict[str, Any]:
+        """Build the reply for a request turned away by admission control."""
+        logger.warning(f"Query from {student_id} not admitted: {error} (load: {admission_controller.snapshot()})")
+        return {
+            "response": str(error),
+            "needs_follow_up": False,
+            "follow_up_questions": [],
+            "is_relevant": None,
+            "citations": []
+        }
+    
+    def _process_query(
+        self,
+        query: str,
+        course_name: str,
+        user_context: Dict[str, Any],
+        conversation_history: Optional[List[Dict[str, str]]] = None,
+        thread_id: str = "default",
+        triage: Optional[Dict[str, Any]] = None,
+        deadline: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        Run the graph for an admitted query; see process_query for the other arguments.
+        
+        Args:
+            deadline: Time budget already started by the caller (e.g. follow-up
+                refinement); a new budget starts when not given
+        """
         try:
             from langchain_core.messages import HumanMessage
             
+            # Keep the thread's memory alive while it is in use. A freed thread has an
+            # empty checkpoint, so it is seeded from conversation_history below
+            if not self.session_manager.touch(thread_id):
+                if conversation_history:
+                    logger.warning(f"Thread {thread_id} was freed; rebuilding its memory from {len(conversation_history)} chat messages")
+                else:
+                    logger.warning(f"Thread {thread_id} was freed and no chat history was given; earlier context is lost")
+            
+            # Time budget for every external call made while answering this query
+            if deadline is None:
+                deadline = time.time() + REQUEST_DEADLINE_SECONDS
+            
             # Create config for thread (memory)
             config = {
                 "configurable": {
@@ -98,6 +167,8 @@ class PRISMAgent:
                     "web_search_citations": [],
                     "user_context": user_context,
                     "course_name": course_name,
+                    "triage_complete": False,
+                    "deadline": deadline,
                     "current_node": "start",
                     "next_node": None,
                     "should_continue": True,
@@ -110,15 +181,26 @@ class PRISMAgent:
                     query=query,
                     course_name=course_name,
                     user_context=user_context,
-                    conversation_history=conversation_history  # Use provided history for first message
+                    conversation_history=conversation_history,  # Use provided history for first message
+                    deadline=deadline
                 )
                 logger.info("Created new state (first message in thread)")
             
+            if triage and triage.get("is_relevant"):
+                initial_state["refined_query"] = query
+                initial_state["is_relevant"] = True
+                initial_state["relevance_reason"] = triage.get("relevance_reason")
+                initial_state["triage_complete"] = True
+                logger.info("Using triage from follow-up refinement, skipping query refinement and relevance")
+            
             # Run the graph - use invoke for proper checkpointing
             # LangGraph will automatically save state to checkpoint after invoke
             final_state = self.graph.invoke(initial_state, config=config)
             
             logger.info(f"Graph execution completed. Final state keys: {list(final_state.keys()) if isinstance(final_state, dict) else 'Not a dict'}")
+            logger.info(f"HTTP connection reuse: {connection_metrics.snapshot()}")
+            logger.info(f"Prompt cache usage: {prompt_cache_metrics.snapshot()}")
+            logger.info(f"Node latency: {latency_metrics.snapshot()}")
             
             # Extract final state - invoke returns the final state directly
             last_node_state = final_state
@@ -189,7 +271,8 @@ class PRISMAgent:
         follow_up_answer: str,
         course_name: str,
         user_context: Dict[str, Any],
-        thread_id: str = "default"
+        thread_id: str = "default",
+        conversation_history: Optional[List[Dict[str, str]]] = None
     ) -> Dict[str, Any]:
         """
         Refine a query using follow-up answer and check if it's clear.
@@ -201,12 +284,41 @@ class PRISMAgent:
             course_name: Name of the course
             user_context: Student information
             thread_id: Thread ID for conversation memory
+            conversation_history: Chat messages shown so far, used when the thread's memory was freed
             
         Returns:
             Dictionary with response and metadata (may include needs_follow_up if still vague)
         """
+        student_id = user_context.get("student_id") or thread_id
+        try:
+            # The refinement call counts against the student's rate like any other query,
+            # and shares one slot and one time budget with the graph run that follows
+            with admission_controller.admit(student_id):
+                return self._refine_query_with_follow_up(
+                    original_query=original_query,
+                    follow_up_answer=follow_up_answer,
+                    course_name=course_name,
+                    user_context=user_context,
+                    thread_id=thread_id,
+                    conversation_history=conversation_history
+                )
+        except AdmissionRejected as e:
+            return self._rejected_response(student_id, e)
+    
+    def _refine_query_with_follow_up(
+        self,
+        original_query: str,
+        follow_up_answer: str,
+        course_name: str,
+        user_context: Dict[str, Any],
+        thread_id: str = "default",
+        conversation_history: Optional[List[Dict[str, str]]] = None
+    ) -> Dict[str, Any]:
+        """Refine and answer an admitted follow-up; see refine_query_with_follow_up for the arguments."""
         from core.nodes.query_refinement import QueryRefinementAgent
         
+        deadline = time.time() + REQUEST_DEADLINE_SECONDS
+        
         agent = QueryRefinementAgent()
         
         # Get conversation history for context
@@ -226,18 +338,25 @@ class PRISMAgent:
                     role = "User" if msg.type == "human" else "Assistant"
                     content = str(msg.content)[:300]  # Limit length
                     conversation_history_parts.append(f"{role}: {content}")
+            if not messages and conversation_history:
+                # Freed thread: fall back to the chat shown in the UI
+                for msg in conversation_history[-10:]:
+                    role = "User" if msg["role"] == "user" else "Assistant"
+                    conversation_history_parts.append(f"{role}: {str(msg['content'])[:300]}")
             
-            conversation_history = "\n".join(conversation_history_parts) if conversation_history_parts else ""
+            history_text = "\n".join(conversation_history_parts) if conversation_history_parts else ""
         except Exception as e:
             logger.info(f"Could not retrieve conversation history: {e}")
-            conversation_history = ""
+            history_text = ""
         
         # Refine query and check if it's clear
-        refinement_result = agent.refine_query(
-            query=original_query,
-            follow_up_answer=follow_up_answer,
-            conversation_history=conversation_history
-        )
+        with deadline_scope(deadline):
+            refinement_result = agent.refine_query(
+                query=original_query,
+                follow_up_answer=follow_up_answer,
+                conversation_history=history_text,
+                course_name=course_name
+            )
         
         # If still vague, return with follow-up question
         if not refinement_result.get("is_clear", True):
@@ -250,12 +369,34 @@ class PRISMAgent:
                 "citations": []
             }
         
-        # Query is now clear, process it
+        # Query is now clear, process it - refinement already judged clarity and
+        # relevance, so the graph starts at retrieval
         refined_query = refinement_result.get("refined_query", f"{original_query} {follow_up_answer}")
-        return self.process_query(
+        return self._process_query(
             query=refined_query,
             course_name=course_name,
             user_context=user_context,
-            conversation_history=None,  # Will use thread memory
-            thread_id=thread_id
+            conversation_history=conversation_history,  # Only used if the thread's memory was freed
+            thread_id=thread_id,
+            triage=refinement_result if "is_relevant" in refinement_result else None,
+            deadline=deadline
         )
+
+
+_shared_agent: Optional[PRISMAgent] = None
+_shared_agent_lock = threading.Lock()
+
+
+def get_prism_agent() -> PRISMAgent:
+    """
+    Get the process-wide PRISM agent, compiling its graph on first use.
+
+    Returns:
+        The shared agent
+    """
+    global _shared_agent
+    if _shared_agent is None:
+        with _shared_agent_lock:
+            if _shared_agent is None:
+                _shared_agent = PRISMAgent()
+    return _shared_agent
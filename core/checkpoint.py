@@ -0,0 +1,104 @@
+"""In-memory LangGraph checkpoint storage sharded by conversation thread."""
+
+import zlib
+import threading
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.memory import MemorySaver
+from config.settings import CHECKPOINT_SHARDS
+
+
+class ShardedMemorySaver(BaseCheckpointSaver):
+    """
+    Spreads threads over several MemorySavers, each guarded by its own lock.
+
+    Concurrent sessions on different shards never wait on each other, and
+    each shard only holds the checkpoints of its own threads.
+    """
+
+    def __init__(self, num_shards: int = CHECKPOINT_SHARDS):
+        """
+        Initialize the shards.
+
+        Args:
+            num_shards: Number of independent MemorySavers
+        """
+        super().__init__()
+        self._shards: List[Tuple[MemorySaver, threading.RLock]] = [
+            (MemorySaver(), threading.RLock()) for _ in range(max(1, num_shards))
+        ]
+
+    def _shard_for_thread(self, thread_id: str) -> Tuple[MemorySaver, threading.RLock]:
+        """Pick a thread's shard by a stable hash of its ID."""
+        return self._shards[zlib.crc32(str(thread_id).encode("utf-8")) % len(self._shards)]
+
+    def _shard(self, config: Dict[str, Any]) -> Tuple[MemorySaver, threading.RLock]:
+        return self._shard_for_thread(config["configurable"]["thread_id"])
+
+    def get_tuple(self, config):
+        saver, lock = self._shard(config)
+        with lock:
+            return saver.get_tuple(config)
+
+    def list(self, config, *, filter=None, before=None, limit=None) -> Iterator:
+        configurable = (config or {}).get("configurable") or {}
+        thread_id = configurable.get("thread_id")
+        if thread_id is not None:
+            saver, lock = self._shard_for_thread(thread_id)
+            with lock:
+                items = list(saver.list(config, filter=filter, before=before, limit=limit))
+            yield from items
+            return
+
+        # No thread to pick a shard by (e.g. a namespace-only config): scan every shard.
+        # MemorySaver needs a thread ID in any config it gets, so the namespace is matched here.
+        checkpoint_ns = configurable.get("checkpoint_ns")
+        remaining = limit
+        for saver, lock in self._shards:
+            with lock:
+                items = [
+                    item for item in saver.list(None, filter=filter, before=before)
+                    if checkpoint_ns is None or item.config["configurable"].get("checkpoint_ns") == checkpoint_ns
+                ]
+            if remaining is not None:
+                items = items[:remaining]
+                remaining -= len(items)
+            yield from items
+            if remaining is not None and remaining <= 0:
+                return
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        saver, lock = self._shard(config)
+        with lock:
+            return saver.put(config, checkpoint, metadata, new_versions)
+
+    def put_writes(self, config, writes: Sequence[Tuple[str, Any]], task_id: str, task_path: str = "") -> None:
+        saver, lock = self._shard(config)
+        with lock:
+            saver.put_writes(config, writes, task_id, task_path)
+
+    def delete_thread(self, thread_id: str) -> None:
+        saver, lock = self._shard_for_thread(thread_id)
+        with lock:
+            saver.delete_thread(thread_id)
+
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        return self._shards[0][0].get_next_version(current, channel)
+
+    # Async variants run the in-memory operations directly
+
+    async def aget_tuple(self, config):
+        return self.get_tuple(config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None) -> AsyncIterator:
+        for item in self.list(config, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes: Sequence[Tuple[str, Any]], task_id: str, task_path: str = "") -> None:
+        self.put_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        self.delete_thread(thread_id)
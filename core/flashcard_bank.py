@@ -0,0 +1,336 @@
+"""Precomputed per-course flashcard bank served by embedding similarity."""
+
+import json
+import re
+import logging
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Set
+import numpy as np
+from config.settings import (
+    FLASHCARDS_PER_MODULE,
+    FLASHCARD_BANK_MIN_SIMILARITY,
+    FLASHCARD_BANK_DEDUPE_SIMILARITY
+)
+from retrieval.reference_filter import is_reference_chunk
+from utils.paths import course_index_dir
+from utils.artifact_cache import load_cached_artifact
+
+logger = logging.getLogger(__name__)
+
+FLASHCARD_BANK_FILENAME = "flashcards.json"
+FLASHCARD_BATCH_STATE_FILENAME = "flashcards_batch.json"
+
+CHUNKS_PER_BATCH = 8  # Chunks given to the LLM per generation call
+CARDS_PER_BATCH = 5
+EMBEDDING_BATCH_SIZE = 100
+
+
+def normalize_question(question: str) -> str:
+    """Normalize a question for exact duplicate detection."""
+    return re.sub(r'[^a-z0-9 ]', '', re.sub(r'\s+', ' ', question.lower())).strip()
+
+
+def card_embedding_text(card: Dict[str, Any]) -> str:
+    """Text embedded for a card: its topic tag, question and answer."""
+    return f"{card.get('topic', '')}\n{card['question']}\n{card['answer']}"
+
+
+class FlashcardBank:
+    """Deduplicated flashcards for a course with normalized embeddings for lookup."""
+
+    def __init__(self):
+        """Initialize an empty bank."""
+        self.cards: List[Dict[str, Any]] = []
+        self.embeddings = np.zeros((0, 0), dtype=np.float32)
+        self._questions: Set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self.cards)
+
+    def add_cards(self, cards: List[Dict[str, Any]], embeddings: List[List[float]]) -> int:
+        """
+        Add cards, skipping exact and near-duplicate questions.
+
+        Args:
+            cards: Flashcards in the generator's format
+            embeddings: One embedding per card
+
+        Returns:
+            Number of cards added
+        """
+        added = 0
+        for card, embedding in zip(cards, embeddings):
+            question_key = normalize_question(card["question"])
+            if question_key in self._questions:
+                continue
+
+            vector = np.asarray(embedding, dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            if norm == 0:
+                continue
+            vector = vector / norm
+
+            if len(self.cards) and float(np.max(self.embeddings @ vector)) >= FLASHCARD_BANK_DEDUPE_SIMILARITY:
+                logger.debug(f"Skipping near-duplicate flashcard: {card['question']}")
+                continue
+
+            self.cards.append(card)
+            self.embeddings = vector[None, :] if not len(self.embeddings) else np.vstack([self.embeddings, vector])
+            self._questions.add(question_key)
+            added += 1
+        return added
+
+    def search(
+        self,
+        query_embedding: List[float],
+        num_cards: int,
+        exclude_questions: Optional[Set[str]] = None,
+        min_similarity: float = FLASHCARD_BANK_MIN_SIMILARITY
+    ) -> List[Dict[str, Any]]:
+        """
+        Find the cards most similar to a topic.
+
+        Args:
+            query_embedding: Embedding of the requested topic
+            num_cards: Maximum number of cards to return
+            exclude_questions: Normalized questions the student has already seen
+            min_similarity: Minimum cosine similarity for a card to match
+
+        Returns:
+            Matching cards in descending similarity, each with a "similarity"
+        """
+        if not self.cards:
+            return []
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+        similarities = self.embeddings @ (query / norm)
+
+        exclude_questions = exclude_questions or set()
+        matches = []
+        for idx in np.argsort(-similarities):
+            similarity = float(similarities[idx])
+            if similarity < min_similarity or len(matches) >= num_cards:
+                break
+            card = self.cards[idx]
+            if normalize_question(card["question"]) in exclude_questions:
+                continue
+            matches.append({**card, "similarity": similarity})
+        return matches
+
+    def save(self, path: Path):
+        """Persist the cards and their embeddings to a JSON file."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {
+            "cards": self.cards,
+            "embeddings": self.embeddings.round(6).tolist()
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(payload, f)
+        logger.info(f"Saved flashcard bank with {len(self.cards)} cards to {path}")
+
+    @classmethod
+    def load(cls, path: Path) -> "FlashcardBank":
+        """Load a bank saved with save()."""
+        with open(path, 'r', encoding='utf-8') as f:
+            payload = json.load(f)
+        bank = cls()
+        bank.cards = payload.get("cards", [])
+        bank.embeddings = np.asarray(payload.get("embeddings", []), dtype=np.float32)
+        bank._questions = {normalize_question(card["question"]) for card in bank.cards}
+        return bank
+
+
+def flashcard_bank_path(course_name: str) -> Path:
+    """Get the on-disk location of a course's flashcard bank."""
+    return course_index_dir(course_name) / FLASHCARD_BANK_FILENAME
+
+
+def _group_by_module(documents: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """Group chunks by module, or by document for courses without modules."""
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    for doc in documents:
+        if not doc.get("content"):
+            continue
+        label = doc.get("module_name") or doc.get("document_name") or "General"
+        groups.setdefault(label, []).append(doc)
+    return groups
+
+
+def build_course_flashcard_bank(
+    course_name: str,
+    documents: List[Dict[str, Any]],
+    generator=None,
+    cards_per_module: int = FLASHCARDS_PER_MODULE
+) -> FlashcardBank:
+    """
+    Generate, deduplicate, embed and save the flashcard bank for a course.
+
+    Cards are generated per module from windows of consecutive non-reference
+    chunks and tagged with the module (or document) they came from.
+
+    Args:
+        course_name: Name of the course
+        documents: All chunks ingested for the course
+        generator: FlashcardGenerator to use (created if not given)
+        cards_per_module: Target number of cards per module
+
+    Returns:
+        The built bank
+    """
+    from core.flashcard_generator import FlashcardGenerator
+
+    generator = generator or FlashcardGenerator()
+    embed = generator.retriever.vector_store.create_embeddings
+    bank = FlashcardBank()
+
+    for label, chunks in _group_by_module(documents).items():
+        chunks = [chunk for chunk in chunks if not is_reference_chunk(chunk)]
+        module_added = 0
+
+        for start in range(0, len(chunks), CHUNKS_PER_BATCH):
+            if module_added >= cards_per_module:
+                break
+            window = chunks[start:start + CHUNKS_PER_BATCH]
+            try:
+                cards = generator.generate_cards_from_chunks(
+                    topic=label,
+                    chunks=window,
+                    num_flashcards=min(CARDS_PER_BATCH, cards_per_module - module_added)
+                )
+                for i in range(0, len(cards), EMBEDDING_BATCH_SIZE):
+                    batch = cards[i:i + EMBEDDING_BATCH_SIZE]
+                    embeddings = embed([card_embedding_text(card) for card in batch])
+                    module_added += bank.add_cards(batch, embeddings)
+            except Exception as e:
+                logger.error(f"Error generating flashcards for {label} in {course_name}: {e}")
+
+        logger.info(f"Banked {module_added} flashcards for {label}")
+
+    bank.save(flashcard_bank_path(course_name))
+    return bank
+
+
+def _batch_chunk(chunk: Dict[str, Any]) -> Dict[str, Any]:
+    """The fields of a chunk parse_cards needs to attribute cards, kept in the batch state."""
+    return {
+        "content": chunk.get("content", "")[:100],
+        "document_name": chunk.get("document_name"),
+        "module_name": chunk.get("module_name"),
+        "page_number": chunk.get("page_number"),
+        "timestamp": chunk.get("timestamp")
+    }
+
+
+def _cards_per_label(bank: FlashcardBank) -> Dict[str, int]:
+    counts: Dict[str, int] = {}
+    for card in bank.cards:
+        counts[card.get("topic", "")] = counts.get(card.get("topic", ""), 0) + 1
+    return counts
+
+
+def _load_or_new_bank(course_name: str) -> FlashcardBank:
+    path = flashcard_bank_path(course_name)
+    return FlashcardBank.load(path) if path.exists() else FlashcardBank()
+
+
+def run_flashcard_batch(
+    course_name: str,
+    documents: List[Dict[str, Any]],
+    generator=None,
+    backend=None,
+    cards_per_module: int = FLASHCARDS_PER_MODULE,
+    wait: bool = True
+) -> Dict[str, Any]:
+    """
+    Generate the flashcard bank through a batch job instead of one call per window.
+
+    Only modules with fewer than cards_per_module banked cards get requests,
+    and results are merged into the existing bank. Each module gets one window
+    more than it needs so cards lost to deduplication can be made up. Re-running
+    after an interruption resumes the submitted batch.
+
+    Args:
+        course_name: Name of the course
+        documents: All chunks ingested for the course
+        generator: FlashcardGenerator used for prompts, parsing and embeddings (created if not given)
+        backend: Batch backend (from BATCH_BACKEND if not given)
+        cards_per_module: Target number of cards per module
+        wait: Poll until the batch finishes
+
+    Returns:
+        The batch job state
+    """
+    from core.flashcard_generator import FlashcardGenerator, FLASHCARD_TEMPERATURE
+    from config.prompts import get_node_model
+    from utils.batch import BatchJob, get_batch_backend
+
+    generator = generator or FlashcardGenerator()
+    state_path = course_index_dir(course_name, create=True) / FLASHCARD_BATCH_STATE_FILENAME
+    backend = backend or get_batch_backend(work_dir=state_path.parent)
+
+    def build():
+        model = get_node_model("flashcards")
+        banked = _cards_per_label(_load_or_new_bank(course_name))
+        windows_needed = -(-cards_per_module // CARDS_PER_BATCH) + 1
+        requests = []
+        windows = {}
+
+        for label, chunks in _group_by_module(documents).items():
+            if banked.get(label, 0) >= cards_per_module:
+                continue
+            chunks = [chunk for chunk in chunks if not is_reference_chunk(chunk)]
+            for start in list(range(0, len(chunks), CHUNKS_PER_BATCH))[:windows_needed]:
+                window = chunks[start:start + CHUNKS_PER_BATCH]
+                custom_id = f"flashcards-{len(requests)}"
+                requests.append((custom_id, {
+                    "model": model,
+                    "messages": generator.build_card_messages(label, window, CARDS_PER_BATCH),
+                    "temperature": FLASHCARD_TEMPERATURE,
+                    "response_format": {"type": "json_object"}
+                }))
+                windows[custom_id] = {"label": label, "chunks": [_batch_chunk(chunk) for chunk in window]}
+
+        return requests, {"windows": windows}
+
+    def merge(results: Dict[str, Any], context: Dict[str, Any]):
+        embed = generator.retriever.vector_store.create_embeddings
+        bank = _load_or_new_bank(course_name)
+        banked = _cards_per_label(bank)
+
+        # Request order, so each module keeps the cards from its first windows
+        for custom_id, window in sorted(context.get("windows", {}).items(), key=lambda item: int(item[0].rsplit("-", 1)[1])):
+            label = window["label"]
+            remaining = cards_per_module - banked.get(label, 0)
+            content = results.get(custom_id)
+            if remaining <= 0 or content is None:
+                continue
+            cards = generator.parse_cards(content, label, window["chunks"], CARDS_PER_BATCH)[:remaining]
+            if not cards:
+                continue
+            try:
+                added = bank.add_cards(cards, embed([card_embedding_text(card) for card in cards]))
+                banked[label] = banked.get(label, 0) + added
+            except Exception as e:
+                logger.error(f"Error embedding batch flashcards for {label} in {course_name}: {e}")
+
+        bank.save(flashcard_bank_path(course_name))
+        logger.info(f"Merged batch flashcards for {course_name}: {banked}")
+
+    return BatchJob(state_path, backend).run(build, merge, wait=wait)
+
+
+def load_course_flashcard_bank(course_name: str) -> Optional[FlashcardBank]:
+    """
+    Load a course's flashcard bank, reusing the cached copy when unchanged.
+
+    Args:
+        course_name: Name of the course
+
+    Returns:
+        The bank, or None if it has not been built for this course
+    """
+    return load_cached_artifact(flashcard_bank_path(course_name.strip()), FlashcardBank.load)
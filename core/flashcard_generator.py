@@ -3,147 +3,51 @@
 import logging
 import json
 import re
-from typing import List, Dict, Any, Set
-from openai import OpenAI
-from config.settings import OPENAI_API_KEY, OPENAI_MODEL
+from typing import List, Dict, Any, Set, Optional
+from config.settings import FLASHCARD_BANK_ENABLED
+from config.prompts import get_node_model
+from utils.http_clients import get_openai_client
+from utils.resilience import call_upstream
 from retrieval.retriever import CourseRetriever
+from retrieval.reference_filter import is_reference_chunk
+from core.flashcard_bank import load_course_flashcard_bank, normalize_question
+from core.admission import admission_controller, AdmissionRejected
 
 logger = logging.getLogger(__name__)
 
+FLASHCARD_TEMPERATURE = 0.7
+
 
 class FlashcardGenerator:
     """Generates flashcards from course content."""
     
     def __init__(self):
         """Initialize the flashcard generator."""
-        self.client = OpenAI(api_key=OPENAI_API_KEY)
+        self.client = get_openai_client()
         self.retriever = CourseRetriever()
     
-    def generate_flashcards(
+    def build_card_messages(
         self,
         topic: str,
-        course_name: str,
-        existing_flashcards: List[Dict[str, Any]] = None,
+        chunks: List[Dict[str, Any]],
         num_flashcards: int = 5
-    ) -> Dict[str, Any]:
+    ) -> List[Dict[str, str]]:
         """
-        Generate flashcards for a given topic.
+        Build the chat messages asking for flashcards from the given chunks.
         
         Args:
-            topic: The topic/question to generate flashcards for
-            course_name: Name of the course
-            existing_flashcards: Previously generated flashcards to avoid duplicates
+            topic: The topic the flashcards should cover
+            chunks: Course chunks to base the flashcards on
             num_flashcards: Number of flashcards to generate
             
         Returns:
-            Dictionary with flashcards, has_more flag, and message
+            System and user messages
         """
-        try:
-            # Enhance query to avoid references when asking about authors
-            query_lower = topic.lower()
-            enhanced_query = topic
-            
-            # If asking about authors, make it more specific to avoid cited references
-            if any(keyword in query_lower for keyword in ['author', 'who wrote', 'who created', 'who developed']):
-                # Enhance to focus on the document's own authors, not cited authors
-                enhanced_query = f"{topic} document paper authors contributors"
-                logger.info(f"Enhanced query for authors: '{enhanced_query}'")
-            
-            # Retrieve relevant content
-            logger.info(f"Retrieving content for flashcard topic: '{topic}'")
-            retrieved_chunks = self.retriever.retrieve(
-                query=enhanced_query,
-                course_name=course_name,
-                top_k=15  # Get more chunks for flashcard generation
-            )
-            
-            # If enhanced query didn't return good results, try original
-            if not retrieved_chunks or len(retrieved_chunks) < 3:
-                logger.info("Enhanced query returned few results, trying original query...")
-                retrieved_chunks = self.retriever.retrieve(
-                    query=topic,
-                    course_name=course_name,
-                    top_k=15
-                )
-            
-            if not retrieved_chunks:
-                return {
-                    "flashcards": [],
-                    "has_more": False,
-                    "message": f"No content found for '{topic}'. Please try a different topic."
-                }
-            
-            # Track used content to avoid duplicates
-            used_content_ids = set()
-            if existing_flashcards:
-                # Extract content snippets from existing flashcards to avoid duplicates
-                for card in existing_flashcards:
-                    if 'content_id' in card:
-                        used_content_ids.add(card['content_id'])
-            
-            # Filter out already used chunks and reference sections
-            available_chunks = []
-            import re
-            
-            for chunk in retrieved_chunks:
-                chunk_id = chunk.get('content', '')[:100]  # Use first 100 chars as ID
-                if chunk_id not in used_content_ids:
-                    content_lower = chunk.get('content', '').lower()
-                    is_reference = False
-                    
-                    # Strong indicators of reference sections
-                    # Check if chunk starts with or is primarily citation patterns
-                    content_start = content_lower[:200].strip()
-                    
-                    # Pattern 1: Starts with author name pattern followed by year (typical reference format)
-                    # e.g., "Smith, J., & Doe, A. (2024). Title..."
-                    author_year_pattern = r'^[A-Z][a-z]+,\s*[A-Z]\.\s*(?:&|and)?\s*[A-Z][a-z]+.*\(\d{4}\)'
-                    if re.match(author_year_pattern, content_start):
-                        is_reference = True
-                    
-                    # Pattern 2: Multiple citation patterns in a row (reference list)
-                    citation_count = len(re.findall(r'\[\d+\]|\(\w+,\s*\d{4}\)', content_lower))
-                    if citation_count > 3:  # More than 3 citations suggests reference list
-                        is_reference = True
-                    
-                    # Pattern 3: Contains "References" or "Bibliography" as section header
-                    if re.search(r'^(references|bibliography)\s*$', content_start, re.MULTILINE):
-                        is_reference = True
-                    
-                    # Pattern 4: Document name indicates references
-                    doc_name = chunk.get('document_name', '').lower()
-                    if 'reference' in doc_name or 'bibliography' in doc_name:
-                        is_reference = True
-                    
-                    # Pattern 5: Mostly URLs and DOIs (typical of reference entries)
-                    url_count = len(re.findall(r'https?://|doi:', content_lower))
-                    if url_count > 2 and len(content_lower) < 500:  # Short chunk with many URLs
-                        is_reference = True
-                    
-                    # Skip reference chunks
-                    if not is_reference:
-                        available_chunks.append(chunk)
-                    else:
-                        logger.debug(f"Filtered out reference chunk: {content_start[:100]}...")
-            
-            # If we filtered out all chunks, use original chunks (better than nothing)
-            if not available_chunks and retrieved_chunks:
-                logger.warning("All chunks appeared to be references. Using original chunks anyway.")
-                available_chunks = [chunk for chunk in retrieved_chunks 
-                                  if chunk.get('content', '')[:100] not in used_content_ids]
-            
-            if not available_chunks:
-                return {
-                    "flashcards": [],
-                    "has_more": False,
-                    "message": "We've covered everything available for this topic! Try asking about a different aspect or topic."
-                }
-            
-            # Re-format context with only available chunks
-            context = self.retriever.format_context(available_chunks[:10])  # Use top 10 available
-            
-            # Generate flashcards using LLM
-            system_prompt = """You are a flashcard generator for educational content. 
+        # Re-format context with only the given chunks
+        context = self.retriever.format_context(chunks[:10])  # Use top 10 available
+        
+        # Flashcard generation prompt
+        system_prompt = """You are a flashcard generator for educational content. 
 Create clear, concise question-and-answer flashcards based on the provided course content.
 
 Guidelines:
@@ -157,8 +61,8 @@ Guidelines:
 - If the content appears to be from a references section, skip it and use other available content
 
 Format your response as a JSON object with a "flashcards" key containing an array of objects, each with "question" and "answer" fields."""
-            
-            user_prompt = f"""Based on the following course content about '{topic}', generate exactly {num_flashcards} flashcards.
+        
+        user_prompt = f"""Based on the following course content about '{topic}', generate exactly {num_flashcards} flashcards.
 
 Course Content:
 {context}
@@ -176,69 +80,302 @@ Generate {num_flashcards} diverse flashcards covering different aspects of this
 Example format:
 {{
   "flashcards": [
-    {{"question": "What is X?", "answer": "X is..."}},
-    {{"question": "How does Y work?", "answer": "Y works by..."}}
+{{"question": "What is X?", "answer": "X is..."}},
+{{"question": "How does Y work?", "answer": "Y works by..."}}
   ]
 }}"""
+        
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+    
+    def parse_cards(
+        self,
+        content: str,
+        topic: str,
+        chunks: List[Dict[str, Any]],
+        num_flashcards: int = 5
+    ) -> List[Dict[str, Any]]:
+        """
+        Parse the model's flashcard JSON into flashcards with source metadata.
+        
+        Args:
+            content: Model output
+            topic: The topic the flashcards cover
+            chunks: Chunks the flashcards were generated from, in prompt order
+            num_flashcards: Maximum number of flashcards to keep
             
-            response = self.client.chat.completions.create(
-                model=OPENAI_MODEL,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.7,
-                response_format={"type": "json_object"}
-            )
-            
-            # Parse response
-            content = response.choices[0].message.content.strip()
+        Returns:
+            List of flashcards with source metadata
+        """
+        content = (content or "").strip()
+        
+        # Try to extract JSON
+        try:
+            parsed = json.loads(content)
+            # Extract flashcards array
+            if isinstance(parsed, dict):
+                flashcards_data = parsed.get("flashcards", [])
+            elif isinstance(parsed, list):
+                flashcards_data = parsed
+            else:
+                flashcards_data = []
             
-            # Try to extract JSON
-            try:
-                parsed = json.loads(content)
-                # Extract flashcards array
-                if isinstance(parsed, dict):
+        except json.JSONDecodeError:
+            # Try to extract JSON array from text
+            json_match = re.search(r'\{.*"flashcards".*\}', content, re.DOTALL)
+            if json_match:
+                try:
+                    parsed = json.loads(json_match.group())
                     flashcards_data = parsed.get("flashcards", [])
-                elif isinstance(parsed, list):
-                    flashcards_data = parsed
-                else:
+                except:
                     flashcards_data = []
+            else:
+                logger.error(f"Could not parse flashcard JSON: {content}")
+                flashcards_data = []
+        
+        # Create flashcard objects with metadata
+        flashcards = []
+        for i, card_data in enumerate(flashcards_data[:num_flashcards]):
+            if isinstance(card_data, dict) and "question" in card_data and "answer" in card_data:
+                # Use the chunk that was most relevant for this flashcard
+                chunk_idx = min(i, len(chunks) - 1)
+                source_chunk = chunks[chunk_idx] if chunks else {}
                 
-            except json.JSONDecodeError:
-                # Try to extract JSON array from text
-                json_match = re.search(r'\{.*"flashcards".*\}', content, re.DOTALL)
-                if json_match:
-                    try:
-                        parsed = json.loads(json_match.group())
-                        flashcards_data = parsed.get("flashcards", [])
-                    except:
-                        flashcards_data = []
-                else:
-                    logger.error(f"Could not parse flashcard JSON: {content}")
-                    flashcards_data = []
-            
-            # Create flashcard objects with metadata
-            flashcards = []
-            for i, card_data in enumerate(flashcards_data[:num_flashcards]):
-                if isinstance(card_data, dict) and "question" in card_data and "answer" in card_data:
-                    # Use the chunk that was most relevant for this flashcard
-                    chunk_idx = min(i, len(available_chunks) - 1)
-                    source_chunk = available_chunks[chunk_idx] if available_chunks else {}
-                    
-                    flashcard = {
-                        "question": card_data["question"],
-                        "answer": card_data["answer"],
-                        "topic": topic,
-                        "content_id": source_chunk.get('content', '')[:100] if source_chunk else f"card_{i}",
-                        "source": {
-                            "document": source_chunk.get('document_name', 'Unknown'),
-                            "module": source_chunk.get('module_name'),
-                            "page": source_chunk.get('page_number'),
-                            "timestamp": source_chunk.get('timestamp')
-                        }
+                flashcard = {
+                    "question": card_data["question"],
+                    "answer": card_data["answer"],
+                    "topic": topic,
+                    "content_id": source_chunk.get('content', '')[:100] if source_chunk else f"card_{i}",
+                    "source": {
+                        "document": source_chunk.get('document_name', 'Unknown'),
+                        "module": source_chunk.get('module_name'),
+                        "page": source_chunk.get('page_number'),
+                        "timestamp": source_chunk.get('timestamp')
                     }
-                    flashcards.append(flashcard)
+                }
+                flashcards.append(flashcard)
+        
+        return flashcards
+    
+    def generate_cards_from_chunks(
+        self,
+        topic: str,
+        chunks: List[Dict[str, Any]],
+        num_flashcards: int = 5
+    ) -> List[Dict[str, Any]]:
+        """
+        Generate flashcards from already selected chunks with a single LLM call.
+        
+        Args:
+            topic: The topic the flashcards should cover
+            chunks: Course chunks to base the flashcards on
+            num_flashcards: Number of flashcards to generate
+            
+        Returns:
+            List of flashcards with source metadata
+        """
+        messages = self.build_card_messages(topic, chunks, num_flashcards)
+        model = get_node_model("flashcards")
+        response = call_upstream("openai", lambda timeout: self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=FLASHCARD_TEMPERATURE,
+            response_format={"type": "json_object"},
+            timeout=timeout
+        ))
+        
+        return self.parse_cards(response.choices[0].message.content, topic, chunks, num_flashcards)
+    
+    def rank_chunks(self, topic: str, course_name: str) -> List[Dict[str, Any]]:
+        """
+        Retrieve candidate chunks for a flashcard topic, best first.
+        
+        Args:
+            topic: The topic/question to generate flashcards for
+            course_name: Name of the course
+            
+        Returns:
+            Ranked chunks with reference sections removed
+        """
+        # Enhance query to avoid references when asking about authors
+        query_lower = topic.lower()
+        enhanced_query = topic
+        
+        # If asking about authors, make it more specific to avoid cited references
+        if any(keyword in query_lower for keyword in ['author', 'who wrote', 'who created', 'who developed']):
+            # Enhance to focus on the document's own authors, not cited authors
+            enhanced_query = f"{topic} document paper authors contributors"
+            logger.info(f"Enhanced query for authors: '{enhanced_query}'")
+        
+        # Retrieve relevant content, excluding chunks flagged as references at ingestion
+        logger.info(f"Retrieving content for flashcard topic: '{topic}'")
+        retrieved_chunks = self.retriever.retrieve(
+            query=enhanced_query,
+            course_name=course_name,
+            top_k=15,  # Get more chunks for flashcard generation
+            exclude_references=True
+        )
+        
+        # If enhanced query didn't return good results, try original
+        if not retrieved_chunks or len(retrieved_chunks) < 3:
+            logger.info("Enhanced query returned few results, trying original query...")
+            retrieved_chunks = self.retriever.retrieve(
+                query=topic,
+                course_name=course_name,
+                top_k=15,
+                exclude_references=True
+            )
+        
+        # Skip reference sections in chunks ingested before they were flagged
+        ranked_chunks = []
+        for chunk in retrieved_chunks:
+            if not is_reference_chunk(chunk):
+                ranked_chunks.append(chunk)
+            else:
+                logger.debug(f"Filtered out reference chunk: {chunk.get('content', '')[:100]}...")
+        
+        # If we filtered out all chunks, use original chunks (better than nothing)
+        if not ranked_chunks and retrieved_chunks:
+            logger.warning("All chunks appeared to be references. Using original chunks anyway.")
+            ranked_chunks = retrieved_chunks
+        
+        return ranked_chunks
+    
+    def serve_from_bank(
+        self,
+        topic: str,
+        course_name: str,
+        existing_flashcards: List[Dict[str, Any]] = None,
+        num_flashcards: int = 5
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Serve flashcards from the course's precomputed bank.
+        
+        Args:
+            topic: The topic/question to find flashcards for
+            course_name: Name of the course
+            existing_flashcards: Previously shown flashcards to skip
+            num_flashcards: Number of flashcards wanted
+            
+        Returns:
+            Result in the generate_flashcards format, or None if the bank
+            cannot supply enough matching cards
+        """
+        bank = load_course_flashcard_bank(course_name)
+        if bank is None or not len(bank):
+            return None
+        
+        try:
+            topic_embedding = self.retriever.vector_store.create_embeddings([topic])[0]
+        except Exception as e:
+            logger.warning(f"Could not embed topic for flashcard bank lookup: {e}")
+            return None
+        
+        seen_questions = {
+            normalize_question(card['question'])
+            for card in (existing_flashcards or []) if card.get('question')
+        }
+        # Look one past the request to know whether more cards remain
+        matches = bank.search(topic_embedding, num_flashcards + 1, exclude_questions=seen_questions)
+        if len(matches) < num_flashcards:
+            logger.info(f"Flashcard bank has {len(matches)} matches for '{topic}', falling back to generation")
+            return None
+        
+        flashcards = [
+            {key: value for key, value in card.items() if key != 'similarity'}
+            for card in matches[:num_flashcards]
+        ]
+        logger.info(f"Served {len(flashcards)} flashcards for '{topic}' from the bank (top similarity {matches[0]['similarity']:.3f})")
+        return {
+            "flashcards": flashcards,
+            "has_more": len(matches) > num_flashcards,
+            "message": None
+        }
+    
+    def generate_flashcards(
+        self,
+        topic: str,
+        course_name: str,
+        existing_flashcards: List[Dict[str, Any]] = None,
+        num_flashcards: int = 5,
+        student_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Generate flashcards for a given topic.
+        
+        Args:
+            topic: The topic/question to generate flashcards for
+            course_name: Name of the course
+            existing_flashcards: Previously generated flashcards to avoid duplicates
+            num_flashcards: Number of flashcards to generate
+            student_id: Student making the request, for admission control
+            
+        Returns:
+            Dictionary with flashcards, has_more flag, and message
+        """
+        try:
+            with admission_controller.admit(student_id):
+                return self._generate_flashcards(topic, course_name, existing_flashcards, num_flashcards)
+        except AdmissionRejected as e:
+            logger.warning(f"Flashcards for {student_id} not admitted: {e}")
+            return {
+                "flashcards": [],
+                "has_more": False,
+                "message": str(e)
+            }
+    
+    def _generate_flashcards(
+        self,
+        topic: str,
+        course_name: str,
+        existing_flashcards: List[Dict[str, Any]] = None,
+        num_flashcards: int = 5
+    ) -> Dict[str, Any]:
+        """Generate flashcards for an admitted request; see generate_flashcards."""
+        try:
+            # Serve from the precomputed bank when it covers the topic
+            if FLASHCARD_BANK_ENABLED:
+                banked = self.serve_from_bank(topic, course_name, existing_flashcards, num_flashcards)
+                if banked is not None:
+                    return banked
+            
+            retrieved_chunks = self.rank_chunks(topic, course_name)
+            
+            if not retrieved_chunks:
+                return {
+                    "flashcards": [],
+                    "has_more": False,
+                    "message": f"No content found for '{topic}'. Please try a different topic."
+                }
+            
+            # Track used content to avoid duplicates
+            used_content_ids = set()
+            if existing_flashcards:
+                # Extract content snippets from existing flashcards to avoid duplicates
+                for card in existing_flashcards:
+                    if 'content_id' in card:
+                        used_content_ids.add(card['content_id'])
+            
+            # Filter out already used chunks
+            available_chunks = [
+                chunk for chunk in retrieved_chunks
+                if chunk.get('content', '')[:100] not in used_content_ids  # Use first 100 chars as ID
+            ]
+            
+            if not available_chunks:
+                return {
+                    "flashcards": [],
+                    "has_more": False,
+                    "message": "We've covered everything available for this topic! Try asking about a different aspect or topic."
+                }
+            
+            flashcards = self.generate_cards_from_chunks(
+                topic=topic,
+                chunks=available_chunks,
+                num_flashcards=num_flashcards
+            )
             
             # Check if there's more content available
             remaining_chunks = len(available_chunks) - len(flashcards)
@@ -0,0 +1,238 @@
+"""Stateful flashcard pagination over a topic's ranked chunks."""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import List, Dict, Any, Optional, Set, Tuple
+from config.settings import FLASHCARD_BANK_ENABLED
+from core.admission import admission_controller, AdmissionRejected
+
+logger = logging.getLogger(__name__)
+
+# Generates the next page of flashcards while the student reads the current one
+_prefetch_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="flashcard-prefetch")
+
+CONTEXT_CHUNKS = 10  # Chunks given to the LLM per page, matching generate_cards_from_chunks
+
+
+def chunk_key(chunk: Dict[str, Any]) -> str:
+    """Stable identifier for a retrieved chunk."""
+    return chunk.get('id') or chunk.get('content', '')[:100]
+
+
+class FlashcardSession:
+    """
+    Pages through flashcards for one topic.
+
+    Retrieval runs once per topic. Each further page is a single LLM call over
+    the next unused chunks, and the page after that is generated in the background.
+    """
+
+    def __init__(self, generator, topic: str, course_name: str, num_flashcards: int = 5, student_id: Optional[str] = None):
+        """
+        Initialize the session.
+
+        Args:
+            generator: Shared FlashcardGenerator
+            topic: The topic/question to generate flashcards for
+            course_name: Name of the course
+            num_flashcards: Flashcards per page
+            student_id: Student the session belongs to, for admission control
+        """
+        self.generator = generator
+        self.student_id = student_id
+        self.topic = topic
+        self.course_name = course_name
+        self.num_flashcards = num_flashcards
+        self.ranked_chunks: List[Dict[str, Any]] = []
+        self.cursor = 0
+        self.used_chunk_ids: Set[str] = set()
+        self.shown_flashcards: List[Dict[str, Any]] = []
+        self.from_bank = False
+        self._prefetched: Optional[Tuple[Tuple[str, ...], Future]] = None
+        self._lock = threading.Lock()
+
+    def start(self, existing_flashcards: List[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Produce the first page of flashcards.
+
+        Args:
+            existing_flashcards: Flashcards already shown in this chat, to avoid repeats
+
+        Returns:
+            Dictionary with flashcards, has_more flag, and message
+        """
+        try:
+            with admission_controller.admit(self.student_id):
+                return self._start(existing_flashcards)
+        except AdmissionRejected as e:
+            logger.warning(f"Flashcards for {self.student_id} not admitted: {e}")
+            return {
+                "flashcards": [],
+                "has_more": False,
+                "message": str(e)
+            }
+
+    def _start(self, existing_flashcards: List[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Produce the first page of flashcards once admitted."""
+        try:
+            self.shown_flashcards = list(existing_flashcards or [])
+            if FLASHCARD_BANK_ENABLED:
+                banked = self.generator.serve_from_bank(
+                    self.topic, self.course_name, self.shown_flashcards, self.num_flashcards
+                )
+                if banked is not None:
+                    self.from_bank = True
+                    self.shown_flashcards.extend(banked['flashcards'])
+                    return banked
+
+            if not self._load_chunks():
+                return {
+                    "flashcards": [],
+                    "has_more": False,
+                    "message": f"No content found for '{self.topic}'. Please try a different topic."
+                }
+            return self._next_page()
+        except Exception as e:
+            logger.error(f"Error generating flashcards: {e}", exc_info=True)
+            return {
+                "flashcards": [],
+                "has_more": False,
+                "message": f"Error generating flashcards: {str(e)}"
+            }
+
+    def more(self) -> Dict[str, Any]:
+        """
+        Produce the next page of flashcards without re-running retrieval.
+
+        Returns:
+            Dictionary with flashcards, has_more flag, and message
+        """
+        try:
+            with admission_controller.admit(self.student_id):
+                return self._more()
+        except AdmissionRejected as e:
+            logger.warning(f"Flashcards for {self.student_id} not admitted: {e}")
+            return {
+                "flashcards": [],
+                "has_more": False,
+                "message": str(e)
+            }
+
+    def _more(self) -> Dict[str, Any]:
+        """Produce the next page of flashcards once admitted."""
+        try:
+            if self.from_bank:
+                banked = self.generator.serve_from_bank(
+                    self.topic, self.course_name, self.shown_flashcards, self.num_flashcards
+                )
+                if banked is not None:
+                    self.shown_flashcards.extend(banked['flashcards'])
+                    return banked
+                # Bank exhausted for this topic, continue with generated cards
+                logger.info(f"Flashcard bank exhausted for '{self.topic}', switching to generation")
+                self.from_bank = False
+                self._load_chunks()
+            return self._next_page()
+        except Exception as e:
+            logger.error(f"Error generating flashcards: {e}", exc_info=True)
+            return {
+                "flashcards": [],
+                "has_more": False,
+                "message": f"Error generating flashcards: {str(e)}"
+            }
+
+    def _load_chunks(self) -> bool:
+        """Retrieve and rank the topic's chunks once, marking those behind shown cards as used."""
+        self.ranked_chunks = self.generator.rank_chunks(self.topic, self.course_name)
+        shown_content_ids = {card['content_id'] for card in self.shown_flashcards if card.get('content_id')}
+        for chunk in self.ranked_chunks:
+            if chunk.get('content', '')[:100] in shown_content_ids:
+                self.used_chunk_ids.add(chunk_key(chunk))
+        self._advance_cursor()
+        return bool(self.ranked_chunks)
+
+    def _advance_cursor(self):
+        """Move the cursor past chunks that have already been used."""
+        while self.cursor < len(self.ranked_chunks) and chunk_key(self.ranked_chunks[self.cursor]) in self.used_chunk_ids:
+            self.cursor += 1
+
+    def _next_window(self) -> List[Dict[str, Any]]:
+        """The next unused chunks, best first."""
+        window = []
+        for chunk in self.ranked_chunks[self.cursor:]:
+            if chunk_key(chunk) not in self.used_chunk_ids:
+                window.append(chunk)
+                if len(window) == CONTEXT_CHUNKS:
+                    break
+        return window
+
+    def _generate(self, window: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Generate one page of flashcards from a chunk window."""
+        return self.generator.generate_cards_from_chunks(
+            topic=self.topic,
+            chunks=window,
+            num_flashcards=self.num_flashcards
+        )
+
+    def _generate_in_background(self, window: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Generate a prefetched page only if a slot is free right now.
+
+        Prefetching does not count against the student's rate limit and never
+        queues; if it is turned away the next page is generated on request.
+        """
+        with admission_controller.admit(self.student_id, rate_limited=False, timeout=0):
+            return self._generate(window)
+
+    def _next_page(self) -> Dict[str, Any]:
+        """Generate (or collect the prefetched) next page and schedule the one after."""
+        with self._lock:
+            window = self._next_window()
+            window_key = tuple(chunk_key(chunk) for chunk in window)
+            prefetched = self._prefetched
+            self._prefetched = None
+
+        if not window:
+            return {
+                "flashcards": [],
+                "has_more": False,
+                "message": "We've covered everything available for this topic! Try asking about a different aspect or topic."
+            }
+
+        flashcards = None
+        if prefetched and prefetched[0] == window_key:
+            try:
+                flashcards = prefetched[1].result()
+                logger.info(f"Using prefetched flashcards for '{self.topic}'")
+            except Exception as e:
+                logger.warning(f"Prefetched flashcard generation failed, regenerating: {e}")
+        if flashcards is None:
+            flashcards = self._generate(window)
+
+        with self._lock:
+            # Card i is attributed to chunk i of the window by generate_cards_from_chunks
+            for chunk in window[:len(flashcards)]:
+                self.used_chunk_ids.add(chunk_key(chunk))
+            self._advance_cursor()
+            self.shown_flashcards.extend(flashcards)
+            has_more = bool(flashcards) and bool(self._next_window())
+
+        if has_more:
+            self._prefetch()
+
+        return {
+            "flashcards": flashcards,
+            "has_more": has_more,
+            "message": None
+        }
+
+    def _prefetch(self):
+        """Start generating the next page in the background."""
+        with self._lock:
+            window = self._next_window()
+            if not window:
+                return
+            window_key = tuple(chunk_key(chunk) for chunk in window)
+            self._prefetched = (window_key, _prefetch_executor.submit(self._generate_in_background, window))
+        logger.debug(f"Prefetching next flashcard page for '{self.topic}'")
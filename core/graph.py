@@ -3,17 +3,28 @@
 import logging
 from typing import Literal
 from langgraph.graph import StateGraph, END
-from langgraph.checkpoint.memory import MemorySaver
 from core.state import AgentState
+from core.checkpoint import ShardedMemorySaver
 from core.nodes.query_refinement import query_refinement_node
 from core.nodes.relevance import relevance_node
 from core.nodes.course_rag import course_rag_node
 from core.nodes.web_search import web_search_node
+from core.nodes.course_and_web import course_and_web_node
 from core.nodes.personalization import personalization_node
+from utils.intent import needs_current_info
+from utils.resilience import with_deadline
+from utils.metrics import timed_node
 
 logger = logging.getLogger(__name__)
 
 
+def route_at_entry(state: AgentState) -> Literal["query_refinement", "course_rag", "course_and_web", "end"]:
+    """Route at entry - skip triage when it was already done before the graph ran."""
+    if state.get("triage_complete", False):
+        return route_after_relevance(state)
+    return "query_refinement"
+
+
 def route_after_query_refinement(state: AgentState) -> Literal["relevance", "end"]:
     """Route after query refinement - check if vague."""
     if state.get("is_vague", False):
@@ -24,12 +35,14 @@ def route_after_query_refinement(state: AgentState) -> Literal["relevance", "end
         return "relevance"
 
 
-def route_after_relevance(state: AgentState) -> Literal["course_rag", "end"]:
+def route_after_relevance(state: AgentState) -> Literal["course_rag", "course_and_web", "end"]:
     """Route after relevance check."""
-    if state.get("is_relevant", False):
-        return "course_rag"
-    else:
+    if not state.get("is_relevant", False):
         return "end"
+    if needs_current_info(state.get("refined_query") or state["query"]):
+        # Current-info questions search the course and the web at the same time
+        return "course_and_web"
+    return "course_rag"
 
 
 def route_after_course_rag(state: AgentState) -> Literal["personalization", "web_search"]:
@@ -49,14 +62,23 @@ def create_agent_graph():
     workflow = StateGraph(AgentState)
     
     # Add nodes
-    workflow.add_node("query_refinement", query_refinement_node)
-    workflow.add_node("relevance", relevance_node)
-    workflow.add_node("course_rag", course_rag_node)
-    workflow.add_node("web_search", web_search_node)
-    workflow.add_node("personalization", personalization_node)
+    workflow.add_node("query_refinement", timed_node("query_refinement", with_deadline(query_refinement_node)))
+    workflow.add_node("relevance", timed_node("relevance", with_deadline(relevance_node)))
+    workflow.add_node("course_rag", timed_node("course_rag", with_deadline(course_rag_node)))
+    workflow.add_node("web_search", timed_node("web_search", with_deadline(web_search_node)))
+    workflow.add_node("course_and_web", timed_node("course_and_web", with_deadline(course_and_web_node)))
+    workflow.add_node("personalization", timed_node("personalization", with_deadline(personalization_node)))
     
-    # Set entry point
-    workflow.set_entry_point("query_refinement")
+    # Set entry point (clarified follow-ups go straight to retrieval)
+    workflow.set_conditional_entry_point(
+        route_at_entry,
+        {
+            "query_refinement": "query_refinement",
+            "course_rag": "course_rag",
+            "course_and_web": "course_and_web",
+            "end": END
+        }
+    )
     
     # Add conditional edges
     workflow.add_conditional_edges(
@@ -73,6 +95,7 @@ def create_agent_graph():
         route_after_relevance,
         {
             "course_rag": "course_rag",
+            "course_and_web": "course_and_web",
             "end": END
         }
     )
@@ -88,12 +111,13 @@ def create_agent_graph():
     
     # Web search always goes to personalization
     workflow.add_edge("web_search", "personalization")
+    workflow.add_edge("course_and_web", "personalization")
     
     # Personalization is the end
     workflow.add_edge("personalization", END)
     
-    # Compile with memory
-    checkpointer = MemorySaver()
+    # Compile with memory, sharded by conversation thread
+    checkpointer = ShardedMemorySaver()
     app = workflow.compile(checkpointer=checkpointer)
     
     logger.info("LangGraph agent flow created successfully")
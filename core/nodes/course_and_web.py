@@ -0,0 +1,70 @@
+"""Course and Web Agent - Searches course materials and the web together for current-info questions."""
+
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any
+from core.nodes.course_rag import CourseRAGAgent, course_rag_top_k
+from core.nodes.web_search import run_web_search
+
+logger = logging.getLogger(__name__)
+
+
+def course_and_web_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    LangGraph node that runs course retrieval and web search concurrently.
+
+    Current-info questions usually end up needing the web, so waiting for course
+    retrieval to fail first only adds its latency. Both run in one node because
+    the state has no reducers for parallel branches writing to it.
+
+    Args:
+        state: Current agent state
+
+    Returns:
+        Updated state with both course and web search results
+    """
+    query = state.get("refined_query", state["query"])
+    course_name = state["course_name"]
+
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="course-and-web") as executor:
+        # Each task runs in a copy of this context so it keeps the request deadline
+        course_future = executor.submit(
+            contextvars.copy_context().run,
+            CourseRAGAgent().retrieve_and_check,
+            query=query,
+            course_name=course_name,
+            top_k=course_rag_top_k(),
+            defer_current_info_to_web=False
+        )
+        web_future = executor.submit(contextvars.copy_context().run, run_web_search, query, course_name)
+
+        try:
+            course_result = course_future.result()
+        except Exception as e:
+            logger.error(f"Error in course retrieval: {e}")
+            course_result = {"found": False, "context": None, "citations": []}
+
+        try:
+            web_result = web_future.result()
+        except Exception as e:
+            logger.error(f"Error in web search: {e}")
+            web_result = {"results": f"Error performing web search: {str(e)}", "citations": []}
+
+    state["course_content_found"] = course_result["found"]
+    state["course_context"] = course_result["context"]
+    state["course_citations"] = course_result["citations"]
+    state["retrieved_chunks"] = course_result.get("retrieved_chunks", [])
+    state["web_search_results"] = web_result["results"]
+    state["web_search_citations"] = web_result["citations"]
+
+    logger.info(
+        f"Course and web search finished (course found: {course_result['found']}, "
+        f"web sources: {len(web_result['citations'])})"
+    )
+
+    state["current_node"] = "course_and_web"
+    state["should_continue"] = True
+    state["next_node"] = "personalization"
+
+    return state
@@ -3,22 +3,47 @@
 import logging
 from typing import Dict, Any
 from retrieval.retriever import CourseRetriever
+from retrieval.reranker import get_reranker, rerank_with_stats
+from retrieval.reference_filter import asks_about_references
+from retrieval.adaptive_retrieval import AdaptiveRetrievalPolicy
+from retrieval.metadata_index import parse_structured_query
+from utils.intent import needs_current_info
+from config.settings import RERANK_CANDIDATES, ADAPTIVE_RETRIEVAL_ENABLED
 
 logger = logging.getLogger(__name__)
 
 
+def course_rag_top_k() -> int:
+    """Chunks retrieved per query: more for context, or a wider candidate set when the reranker will trim it."""
+    return RERANK_CANDIDATES if get_reranker() is not None else 10
+
+
+def use_adaptive_retrieval() -> bool:
+    """Adaptive depth is skipped when a reranker needs the full candidate set."""
+    return ADAPTIVE_RETRIEVAL_ENABLED and get_reranker() is None
+
+
+def initial_retrieval_k(course_name: str) -> int:
+    """Chunks requested by the first retrieval pass for a question."""
+    if use_adaptive_retrieval():
+        return AdaptiveRetrievalPolicy.for_course(course_name, course_rag_top_k()).initial_k
+    return course_rag_top_k()
+
+
 class CourseRAGAgent:
     """Agent that retrieves course content and checks if it answers the question."""
     
     def __init__(self):
         """Initialize the course RAG agent."""
         self.retriever = CourseRetriever()
+        self.reranker = get_reranker()
     
     def retrieve_and_check(
         self,
         query: str,
         course_name: str,
-        top_k: int = 5
+        top_k: int = 5,
+        defer_current_info_to_web: bool = True
     ) -> Dict[str, Any]:
         """
         Retrieve course content and check if it answers the question.
@@ -27,6 +52,8 @@ class CourseRAGAgent:
             query: User's question
             course_name: Name of the course
             top_k: Number of chunks to retrieve
+            defer_current_info_to_web: Mark current-info questions as not found so the
+                sequential flow falls through to web search
             
         Returns:
             Dictionary with content, citations, and found flag
@@ -34,20 +61,60 @@ class CourseRAGAgent:
         try:
             logger.info(f"Retrieving content for query: '{query}' in course: '{course_name}'")
             
-            # Retrieve relevant chunks - try with original query first
-            retrieved_chunks = self.retriever.retrieve(
+            # Bibliography chunks are only useful when the question is about the references
+            exclude_references = not asks_about_references(query)
+            
+            query_lower = query.lower()
+            # For queries about lists, counts, or "all" items, try additional queries to get comprehensive results
+            needs_comprehensive = any(keyword in query_lower for keyword in [
+                "all", "different", "various", "list", "what are", "how many", "name", "types", "kinds"
+            ])
+            
+            # Start with a small k and widen only when the scores are weak or flat;
+            # comprehensive questions need the full depth from the start
+            # Questions naming a module, table or figure retrieve a wider candidate set,
+            # from which the referenced chunks are kept first
+            structured_reference = any(kind in parse_structured_query(query) for kind in ("module", "table", "figure"))
+            candidate_k = top_k * 2 if structured_reference else top_k
+            
+            policy = AdaptiveRetrievalPolicy.for_course(course_name, max_k=top_k)
+            adaptive = use_adaptive_retrieval() and not needs_comprehensive and not structured_reference
+            
+            # Plain requests for a module, table or figure ("show table 2") are answered
+            # from the metadata index directly, without any embedding calls
+            retrieved_chunks = self.retriever.lookup_structured(
                 query=query,
                 course_name=course_name,
-                top_k=top_k
+                top_k=top_k * 2,
+                exclude_references=exclude_references
             )
+            structured_hit = bool(retrieved_chunks)
             
-            logger.info(f"Retrieved {len(retrieved_chunks)} chunks from vector store for query: '{query}'")
+            if structured_hit:
+                logger.info(f"Answered query from metadata index with {len(retrieved_chunks)} chunks")
+            else:
+                # Retrieve relevant chunks - try with original query first
+                retrieved_chunks = self.retriever.retrieve(
+                    query=query,
+                    course_name=course_name,
+                    top_k=policy.initial_k if adaptive else candidate_k,
+                    exclude_references=exclude_references
+                )
+                if adaptive and policy.should_widen(retrieved_chunks):
+                    retrieved_chunks = self.retriever.retrieve(
+                        query=query,
+                        course_name=course_name,
+                        top_k=top_k,
+                        exclude_references=exclude_references
+                    )
+                
+                logger.info(f"Retrieved {len(retrieved_chunks)} chunks from vector store for query: '{query}'")
             
             # Check if query is about a specific module and enhance it
             import re
-            query_lower = query.lower()
             module_match = re.search(r'module\s+(\d+|[a-z]+)', query_lower, re.IGNORECASE)
-            if module_match:
+            # With a lexical index the module identifier already matches on the first round trip
+            if module_match and not structured_hit and not self.retriever.has_lexical_index(course_name):
                 module_ref = module_match.group(1)
                 logger.info(f"Query mentions module {module_ref}. Enhancing query with module context...")
                 # Add module-related terms to improve retrieval
@@ -57,18 +124,23 @@ class CourseRAGAgent:
                 enhanced_chunks = self.retriever.retrieve(
                     query=enhanced_query,
                     course_name=course_name,
-                    top_k=top_k
+                    top_k=candidate_k,
+                    exclude_references=exclude_references
                 )
                 if enhanced_chunks:
                     retrieved_chunks = enhanced_chunks
                     logger.info(f"Found {len(retrieved_chunks)} chunks with module-enhanced query")
             
-            # For queries about lists, counts, or "all" items, try additional queries to get comprehensive results
-            needs_comprehensive = any(keyword in query_lower for keyword in [
-                "all", "different", "various", "list", "what are", "how many", "name", "types", "kinds"
-            ])
+            if structured_reference and not structured_hit:
+                retrieved_chunks = self.retriever.prefer_structured(
+                    query=query,
+                    course_name=course_name,
+                    results=retrieved_chunks,
+                    top_k=top_k,
+                    exclude_references=exclude_references
+                )
             
-            if needs_comprehensive and retrieved_chunks:
+            if needs_comprehensive and retrieved_chunks and not structured_hit:
                 logger.info("Query requires comprehensive results. Retrieving additional chunks...")
                 # Extract the main topic/keyword from the query (generic approach)
                 # Remove common question words and get the core topic
@@ -98,7 +170,8 @@ class CourseRAGAgent:
                         alt_chunks = self.retriever.retrieve(
                             query=alt_query,
                             course_name=course_name,
-                            top_k=top_k
+                            top_k=top_k,
+                            exclude_references=exclude_references
                         )
                         # Add unique chunks
                         for chunk in alt_chunks:
@@ -136,11 +209,7 @@ class CourseRAGAgent:
                 logger.warning(f"No chunks retrieved for query: '{query}' in course: '{course_name}' after trying alternatives")
                 # Even if no chunks found, check if query asks for current/updated information
                 # Such queries should go to web search even if course mentions the topic
-                query_lower = query.lower()
-                needs_current_info = any(keyword in query_lower for keyword in [
-                    "latest", "current", "recent", "new", "updated", "now", "today", "2024", "2025"
-                ])
-                if needs_current_info:
+                if needs_current_info(query):
                     logger.info(f"Query asks for current/updated information. Marking as not found to trigger web search.")
                 return {
                     "found": False,
@@ -152,34 +221,42 @@ class CourseRAGAgent:
             scores = [chunk.get("score", 0) for chunk in retrieved_chunks]
             logger.info(f"Retrieval scores: {scores}")
             
-            # Format context
-            context = self.retriever.format_context(retrieved_chunks)
-            citations = self.retriever.get_citations(retrieved_chunks)
+            # Keep only the most useful candidates within the context token budget
+            if self.reranker is not None and len(retrieved_chunks) > 1:
+                retrieved_chunks = rerank_with_stats(
+                    self.reranker,
+                    query,
+                    retrieved_chunks,
+                    self.retriever.format_context
+                )
+            
+            # Format context, labelling each source with a chunk ID the answer can cite
+            context, citations = self.retriever.build_context(retrieved_chunks)
             
             logger.info(f"Formatted context length: {len(context)} characters")
             logger.info(f"Found {len(citations)} citations")
             
             # Check if content is relevant - if we got results, they're relevant
             # However, if query asks for current/updated info, we should still check web search
-            query_lower = query.lower()
-            needs_current_info = any(keyword in query_lower for keyword in [
-                "latest", "current", "recent", "new", "updated", "now", "today", "2024", "2025"
-            ])
+            current_info_query = needs_current_info(query) and defer_current_info_to_web
             
             # If query asks for current info and we have chunks, check if chunks actually answer the question
             # For "latest" type questions, course materials might be outdated, so prefer web search
-            if needs_current_info and retrieved_chunks:
+            if current_info_query and retrieved_chunks:
                 logger.info(f"Query asks for current/updated information. Even though chunks found, will check web search for latest info.")
                 # Mark as not found to trigger web search for current information
                 found = False
             else:
-                found = len(retrieved_chunks) > 0
+                # Route on the score distribution with the course's calibrated thresholds
+                found = policy.is_found(retrieved_chunks) if ADAPTIVE_RETRIEVAL_ENABLED else len(retrieved_chunks) > 0
             
             if found:
                 logger.info(f"Content found! Using {len(retrieved_chunks)} chunks with context length {len(context)} chars")
             else:
-                if needs_current_info:
+                if current_info_query:
                     logger.info(f"Query asks for current info - routing to web search for latest information")
+                elif retrieved_chunks:
+                    logger.info(f"Top retrieval score below {policy.min_score} for course '{course_name}' - routing to web search")
                 else:
                     logger.warning(f"No content found for query: '{query}'")
             
@@ -213,11 +290,11 @@ def course_rag_node(state: Dict[str, Any]) -> Dict[str, Any]:
     
     query = state.get("refined_query", state["query"])
     
-    # Retrieve and check course content - use more chunks for better context
+    # Retrieve and check course content
     result = agent.retrieve_and_check(
         query=query,
         course_name=state["course_name"],
-        top_k=10  # Increased from 5 to get more context
+        top_k=course_rag_top_k()
     )
     
     state["course_content_found"] = result["found"]
@@ -1,11 +1,14 @@
 """Personalization Agent - Tailors response to student's background."""
 
 import logging
-import yaml
+from datetime import datetime
 from typing import Dict, Any, Optional, List
-from pathlib import Path
-from openai import OpenAI
-from config.settings import OPENAI_API_KEY, OPENAI_MODEL
+from config.prompts import get_prompt_config, get_template, get_node_model
+from utils.http_clients import get_openai_client
+from utils.resilience import call_upstream
+from utils.intent import needs_current_info
+from utils.metrics import prompt_cache_metrics
+from retrieval.citation_resolver import resolve_citations
 
 logger = logging.getLogger(__name__)
 
@@ -15,12 +18,134 @@ class PersonalizationAgent:
     
     def __init__(self):
         """Initialize the personalization agent."""
-        self.client = OpenAI(api_key=OPENAI_API_KEY)
+        self.client = get_openai_client()
         
         # Load prompts
-        config_path = Path(__file__).parent.parent.parent / "config" / "prompts.yaml"
-        with open(config_path, 'r') as f:
-            self.config = yaml.safe_load(f)
+        self.config = get_prompt_config()
+    
+    def _filter_web_citations(self, answer: str, citations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Keep the web search citations whose source name or URL the answer references.
+        
+        Args:
+            answer: Generated answer
+            citations: Web search citations with source and url
+            
+        Returns:
+            Referenced citations, or all of them deduplicated by URL if none match
+        """
+        import re
+        # Match inline citation format: (Source_Name, URL) or (Source_Name, text)
+        inline_citation_pattern = r'\(([^,)]+),\s*(?:Page\s+)?(\d+|[^)]+)\)'
+        referenced_citations = []
+        for match in re.finditer(inline_citation_pattern, answer, re.IGNORECASE):
+            doc_name = match.group(1).strip()
+            page_or_url = match.group(2).strip()
+            if page_or_url.isdigit() or re.match(r'\d{2}:\d{2}:\d{2}', page_or_url):
+                referenced_citations.append({"document": doc_name})
+            else:
+                referenced_citations.append({"document": doc_name, "url": page_or_url})
+        
+        # Extract source names from inline citations in the response
+        # Look for patterns like (Source_Name, Page X) or (Source_Name, URL)
+        referenced_source_names = set()
+        referenced_urls = set()
+
+        # Extract from inline citations
+        for ref_citation in referenced_citations:
+            doc_name = ref_citation.get("document", "").strip()
+            url = ref_citation.get("url", "")
+            if doc_name:
+                # Normalize source name for matching
+                referenced_source_names.add(doc_name.lower().strip())
+            if url:
+                referenced_urls.add(url.lower().strip())
+
+        # Also check if source names from citations are mentioned in the response
+        for citation in citations:
+            source = citation.get('source', '').strip()
+            url = citation.get('url', '').strip()
+
+            # Check if source name appears in answer (case-insensitive)
+            if source:
+                source_lower = source.lower()
+                # Check if source name or part of it is in the answer
+                if source_lower in answer.lower() or any(word in answer.lower() for word in source_lower.split() if len(word) > 3):
+                    referenced_source_names.add(source_lower)
+
+            # Check if URL is mentioned
+            if url and url in answer:
+                referenced_urls.add(url.lower())
+
+        # Filter citations to only those referenced
+        filtered_citations = []
+        seen_urls = set()
+
+        for citation in citations:
+            source = citation.get('source', '').strip()
+            url = citation.get('url', '').strip()
+
+            # Check if this citation is referenced
+            is_referenced = False
+
+            # Match by source name (fuzzy matching)
+            if source:
+                source_lower = source.lower()
+                # Check exact match or if source name contains referenced name or vice versa
+                for ref_name in referenced_source_names:
+                    if ref_name in source_lower or source_lower in ref_name:
+                        is_referenced = True
+                        break
+
+            # Match by URL
+            if url and (url.lower() in referenced_urls or url in answer):
+                is_referenced = True
+
+            # If referenced, add to filtered citations
+            if is_referenced:
+                # Deduplicate by URL
+                if url and url not in seen_urls:
+                    filtered_citations.append(citation)
+                    seen_urls.add(url)
+                elif not url:  # Include citations without URLs
+                    filtered_citations.append(citation)
+
+        # If no citations matched but we have inline citations, try to match by extracting source names from answer
+        if not filtered_citations and referenced_citations:
+            logger.info("No direct matches found, trying to match by source name patterns")
+            # Extract all source names from citations and check if they appear in inline citations
+            for citation in citations:
+                source = citation.get('source', '').strip()
+                url = citation.get('url', '').strip()
+
+                # Check if any part of the source name matches referenced names
+                if source:
+                    source_words = source.lower().split()
+                    for ref_name in referenced_source_names:
+                        ref_words = ref_name.split()
+                        # Check if any significant word matches
+                        if any(word in source_words for word in ref_words if len(word) > 3):
+                            if url and url not in seen_urls:
+                                filtered_citations.append(citation)
+                                seen_urls.add(url)
+                            break
+
+        # Final fallback: if still no matches, use all citations (they were used in search)
+        if not filtered_citations:
+            logger.info("No explicit source references matched. Using all search result citations.")
+            # Deduplicate by URL
+            seen_urls = set()
+            for citation in citations:
+                url = citation.get('url', '')
+                if url and url not in seen_urls:
+                    filtered_citations.append(citation)
+                    seen_urls.add(url)
+                elif not url:
+                    filtered_citations.append(citation)
+        else:
+            logger.info(f"Filtered web citations: {len(referenced_source_names)} source names referenced, {len(filtered_citations)} matching citations (from {len(citations)} total)")
+        
+        return filtered_citations
     
     def personalize_response(
         self,
@@ -61,167 +186,90 @@ class PersonalizationAgent:
                 complexity = "introductory"
                 explanation_style = "simple and accessible"
             
-            # Adapt to major
-            major_adaptation = ""
-            if major.lower() not in ["computer science", "cs", "engineering"]:
-                major_adaptation = (
-                    f"Since you're a {major} student, I'll explain this in terms you'll find familiar. "
-                    "I'll use simpler language and provide examples that relate to your field of study."
-                )
+            # Course chunks are labelled with IDs like [C1] in the context; the
+            # model cites those and resolve_citations maps them back to sources
+            chunk_citations = [c for c in citations if c.get("id")]
             
-            system_prompt = f"""You are an expert teaching assistant for {course_name}.
-You help students understand course material by providing clear, personalized answers.
-
-Student Background:
-- Degree Level: {degree} ({complexity} level)
-- Major: {major}
-{major_adaptation}
-
-Adapt your explanation to be {explanation_style}. Use examples and analogies that a {major} student would understand.
-
-CRITICAL CITATION FORMAT:
-- Use INLINE citations within your response text, NOT at the end
-- Format: (Document_Name, Page X) for PDFs or (Document_Name, Timestamp) for transcripts
-- Use the ACTUAL document name (PDF/PPT/transcript name) from the context, NOT "Source"
-- Place citations immediately after the information you're citing
-- Examples: 
-  * PDF: "The authors are John Doe and Jane Smith (NeuroQuest_Paper, Page 2)."
-  * Transcript: "As mentioned in the lecture (lecture_transcript, 00:15:30)."
-- Use the exact document name as shown in the context (e.g., "NeuroQuest_Paper", "Course_Slides", "lecture_transcript", etc.)
-- Do NOT use generic terms like "Source 1" or "Source 2" - use the actual document name
-- Do NOT create a separate citations section at the end
-- Integrate citations naturally into your response"""
-            
-            context_source = "Internet search results" if is_from_web else "Course materials"
+            if is_from_web and retrieved_chunks:
+                context_source = "Course materials and internet search results"
+            else:
+                context_source = "Internet search results" if is_from_web else "Course materials"
             
-            # Add special instruction for current info queries from web search
-            current_info_instruction = ""
-            if is_from_web:
-                query_lower = query.lower()
-                needs_current_info = any(keyword in query_lower for keyword in [
-                    "latest", "current", "recent", "new", "updated", "now", "today", "2024", "2025"
-                ])
-                if needs_current_info:
-                    from datetime import datetime
-                    current_date = datetime.now().strftime("%B %d, %Y")
-                    current_year = datetime.now().year
-                    current_info_instruction = f"""
-CRITICAL: This question asks for CURRENT/LATEST information as of {current_date}. 
-- TODAY'S DATE IS: {current_date} ({current_year})
-- You MUST prioritize the MOST RECENT information from the search results
-- Look for dates, years, version numbers, and timestamps in the search results
-- If multiple results mention different dates/years, use the one with the LATEST date/year
-- AI-generated answers from Tavily are typically the most current - prioritize those
-- If search results mention "latest", "newest", "recent", or specific dates, use that information
-- Do NOT use information that is clearly outdated (e.g., if it says "as of 2023" and today is {current_year}, look for {current_year} information)
-- If the search results contain conflicting dates, use the most recent one
-- Extract and mention the date/year of the information you're using in your response"""
+            # The system prompt is the same static prefix on every call so the
+            # provider can cache it; all per-request values go in the user prompt
+            system_prompt = get_template("personalization", "system_prefix").render()
+            request_values = {
+                "course_name": course_name,
+                "degree": degree,
+                "major": major,
+                "complexity": complexity,
+                "explanation_style": explanation_style,
+                "context": context,
+                "query": query
+            }
             
             # Handle case where context might indicate no results or errors
             context_lower = context.lower() if context else ""
             if "couldn't find" in context_lower or "no specific" in context_lower or "not available" in context_lower or "error" in context_lower:
-                user_prompt = f"""Student Question: {query}
-
-Student Background: {degree} student in {major}
-
-{context}
-
-Please provide a helpful, personalized response that:
-1. Acknowledges that specific information wasn't found
-2. Provides a general answer appropriate for a {degree} student studying {major}
-3. Suggests how they might find more information
-4. Uses language and examples relevant to their background"""
+                user_prompt = get_template("personalization", "missing_information_request").render(**request_values)
             else:
+                notes = []
+                
+                # Add special instruction for current info queries from web search
+                if is_from_web and needs_current_info(query):
+                    now = datetime.now()
+                    notes.append(get_template("personalization", "current_info_note").render(
+                        current_date=now.strftime("%B %d, %Y"),
+                        current_year=now.year
+                    ))
+                
                 # Detect if query requires comprehensive extraction
                 query_lower = query.lower()
                 needs_all_items = any(keyword in query_lower for keyword in [
                     "all", "different", "various", "list", "what are", "how many", "name all", "types", "kinds"
                 ])
-                
-                comprehensive_instruction = ""
                 if needs_all_items:
                     # Extract the main topic from the query (generic approach)
                     question_words = ["what", "are", "the", "different", "various", "all", "how", "many", "list", "name", "in", "it"]
                     topic_words = [w for w in query_lower.split() if w not in question_words and len(w) > 2]
                     main_topic = topic_words[0] if topic_words else "items"
-                    
-                    comprehensive_instruction = f"""
-CRITICAL: This question asks for ALL {main_topic.upper()}. You MUST:
-- Extract and list EVERY SINGLE {main_topic} mentioned in the context by its exact name or identifier
-- Do NOT use generic terms - you MUST list each {main_topic} by its SPECIFIC NAME/IDENTIFIER
-- Scan the ENTIRE context word-by-word for any mention of {main_topic} names/identifiers
-- Look for patterns like: "[Name] {main_topic}", "the [Name] {main_topic}", "{main_topic}: [Name]", or any capitalized {main_topic} names
-- If the context mentions multiple {main_topic}s, you MUST list ALL of them
-- For each {main_topic} found, provide: 1) The exact name/identifier, 2) What it is/does (if described)
-- Do not say "not detailed" or "not mentioned" if {main_topic} names are in the context
-- Review ALL sources carefully - {main_topic}s may be mentioned in different pages or sections
-- Your response MUST start with a clear numbered or bulleted list format like:
-  1. [{main_topic.capitalize()} Name/Identifier]: [Description]
-  2. [{main_topic.capitalize()} Name/Identifier]: [Description]
-  3. [{main_topic.capitalize()} Name/Identifier]: [Description]
-- If you only find one {main_topic}, you MUST still search the entire context for others - do not stop after finding one"""
+                    notes.append(get_template("personalization", "all_items_note").render(
+                        main_topic=main_topic,
+                        main_topic_upper=main_topic.upper(),
+                        main_topic_title=main_topic.capitalize()
+                    ))
                 
-                user_prompt = f"""{context_source}:
-{context}
-
-Student Question: {query}
-
-Student Background: {degree} student in {major}
-{comprehensive_instruction}
-{current_info_instruction}
-
-Based on the {context_source.lower()} provided above, please provide a comprehensive, personalized answer to the student's question that:
-1. Directly answers the question using information from the {context_source.lower()} - USE THE INFORMATION PROVIDED
-2. Is appropriate for a {degree} student studying {major}
-3. Uses language and examples relevant to their background
-4. Explains concepts in a way they'll understand
-5. If the question asks for specific information (like counts, lists, names, agents, figures, tables), extract and provide ALL of that information from the context - be thorough and complete
-6. Review ALL sources provided to ensure you don't miss any information
-7. Uses INLINE citations in the format (Document_Name, Page X) immediately after cited information
-   - Use the ACTUAL document name from the context (e.g., "NeuroQuest_Paper", "Course_Slides")
-   - Do NOT use generic terms like "Source 1" - use the real document name
-   - For course content: do NOT create a separate citations section
-   - For web search: you may reference source names in your response
-
-CRITICAL INSTRUCTIONS:
-- The {context_source.lower()} above contains REAL information - USE IT to answer the question
-- Do NOT say "I don't have access" or "I'm unable to access" - you HAVE the information in the context above
-- If the context contains search results or answers, USE THEM - they are real and current
-- Extract information directly from the context provided
-- If the question asks for "latest" or "current" information, look for the MOST RECENT dates, years, or version numbers in the context
-- Prioritize information with the latest dates/years mentioned in the search results
-- If you see multiple dates or versions, use the one with the most recent date/year
-- If asked for a list or "all" items, you MUST extract and list EVERY item mentioned across all sources
-- Do not omit information that is present in the context
-- If asked for a list of items (e.g., "what are the different X", "list all Y", "how many Z"), you MUST:
-  * Identify the main topic (X, Y, or Z) from the question
-  * Scan the ENTIRE context word-by-word for every mention of that topic
-  * List each item by its exact name/identifier - do NOT use vague generic terms
-  * Look for patterns like "[Name] [Topic]", "[Topic]: [Name]", "the [Name] [topic]", or any capitalized names
-  * Continue searching the entire context even after finding one item - do not stop early
-  * Provide a clear numbered or bulleted list format starting your response with ALL items found
-  * Extract what you can find from the context - if information is present, use it completely"""
+                user_prompt = get_template("personalization", "request").render(
+                    **request_values,
+                    context_source=context_source,
+                    context_source_lower=context_source.lower(),
+                    notes="\n" + "".join(notes) if notes else ""
+                )
             
             response_settings = self.config.get('response_settings', {})
             temperature = response_settings.get('temperature', 0.7)
             max_tokens = response_settings.get('max_tokens', 2000)
             
-            logger.info(f"Calling OpenAI API with model: {OPENAI_MODEL}, temperature: {temperature}, max_tokens: {max_tokens}")
+            model = get_node_model("personalization")
+            logger.info(f"Calling OpenAI API with model: {model}, temperature: {temperature}, max_tokens: {max_tokens}")
             logger.debug(f"System prompt length: {len(system_prompt)}, User prompt length: {len(user_prompt)}")
             
             try:
-                response = self.client.chat.completions.create(
-                    model=OPENAI_MODEL,
+                response = call_upstream("openai", lambda timeout: self.client.chat.completions.create(
+                    model=model,
                     messages=[
                         {"role": "system", "content": system_prompt},
                         {"role": "user", "content": user_prompt}
                     ],
                     temperature=temperature,
-                    max_tokens=max_tokens
-                )
+                    max_tokens=max_tokens,
+                    timeout=timeout
+                ))
                 
                 answer = response.choices[0].message.content
                 logger.info(f"OpenAI API call successful. Response length: {len(answer) if answer else 0}")
+                cached_share = prompt_cache_metrics.record("personalization", getattr(response, "usage", None))
+                logger.info(f"Personalization prompt cached-token share: {cached_share:.1%}")
             except Exception as api_error:
                 logger.error(f"OpenAI API error: {api_error}", exc_info=True)
                 raise  # Re-raise to be caught by outer exception handler
@@ -230,258 +278,29 @@ CRITICAL INSTRUCTIONS:
             if not answer:
                 answer = "I apologize, but I couldn't generate a response. Please try rephrasing your question."
             
-            # Filter citations to only include sources actually referenced in the response
-            # Extract inline citations from the answer in format (Document_Name, Page X)
-            import re
-            # Match inline citation format: (Document_Name, Page X) or (Document_Name, Timestamp) or (Source_Name, URL)
-            # Pattern matches: (text, Page number) or (text, Timestamp) or (text, URL)
-            inline_citation_pattern = r'\(([^,)]+),\s*(?:Page\s+)?(\d+|[^)]+)\)'
-            referenced_citations = []
-            
-            for match in re.finditer(inline_citation_pattern, answer, re.IGNORECASE):
-                doc_name = match.group(1).strip()
-                page_timestamp_or_url = match.group(2).strip()
-                
-                # Check if it's a page number (digits)
-                if page_timestamp_or_url.isdigit():
-                    page_num = int(page_timestamp_or_url)
-                    referenced_citations.append({
-                        "document": doc_name,
-                        "page": page_num
-                    })
-                # Check if it's a timestamp (HH:MM:SS format)
-                elif re.match(r'\d{2}:\d{2}:\d{2}', page_timestamp_or_url):
-                    referenced_citations.append({
-                        "document": doc_name,
-                        "timestamp": page_timestamp_or_url
-                    })
-                else:
-                    # It's a URL or other format
-                    referenced_citations.append({
-                        "document": doc_name,
-                        "url": page_timestamp_or_url
-                    })
-            
-            logger.info(f"Found {len(referenced_citations)} inline citations in response")
-            if referenced_citations:
-                logger.info(f"Inline citations found: {referenced_citations[:3]}...")  # Log first 3
-            
-            # If inline citations are found, filter to match them
-            # Otherwise, use all citations (for web search or when no explicit citations)
+            # Resolve cited chunk IDs back to sources in one pass over the answer
             filtered_citations = citations
-            if referenced_citations and not is_from_web and retrieved_chunks:
-                logger.info(f"Filtering citations: {len(referenced_citations)} inline citations found, {len(retrieved_chunks)} chunks available, {len(citations)} total citations")
-                
-                # Create a set of (document, page/timestamp) tuples from referenced citations for matching
-                referenced_keys = set()
-                for ref_citation in referenced_citations:
-                    doc = ref_citation.get("document", "").strip()
-                    page = ref_citation.get("page")
-                    timestamp = ref_citation.get("timestamp")
-                    if doc and (page is not None or timestamp):
-                        # Normalize document name (remove spaces, handle variations)
-                        doc_normalized = doc.replace(" ", "_").replace("-", "_").lower()
-                        if page is not None:
-                            referenced_keys.add((doc_normalized, page, "page"))
-                        elif timestamp:
-                            referenced_keys.add((doc_normalized, timestamp, "timestamp"))
-                
-                # Match referenced citations against actual citations
-                filtered_citations = []
-                seen_citations = set()
-                
-                for citation in citations:
-                    doc = citation.get("document", "").strip()
-                    page = citation.get("page")
-                    timestamp = citation.get("timestamp")
-                    
-                    # Handle both page-based and timestamp-based citations
-                    if doc and (page is not None or timestamp):
-                        # Normalize document name for comparison
-                        doc_normalized = doc.replace(" ", "_").replace("-", "_").lower()
-                        
-                        # Check if this citation matches any referenced citation
-                        # Use fuzzy matching to handle variations in document names
-                        matches = False
-                        for ref_key in referenced_keys:
-                            ref_doc, ref_value, ref_type = ref_key
-                            
-                            # Match by type (page or timestamp) and value
-                            if ref_type == "page" and page is not None:
-                                # Exact match on page and document name contains the reference or vice versa
-                                if ref_value == page and (ref_doc in doc_normalized or doc_normalized in ref_doc):
-                                    matches = True
-                                    break
-                            elif ref_type == "timestamp" and timestamp:
-                                # Match timestamp (can be partial match for ranges)
-                                if ref_value in timestamp or timestamp in ref_value or (ref_value == timestamp):
-                                    if ref_doc in doc_normalized or doc_normalized in ref_doc:
-                                        matches = True
-                                        break
-                        
-                        if matches:
-                            # Create unique key for deduplication
-                            if page is not None:
-                                citation_unique_key = (doc, page, "page")
-                            else:
-                                citation_unique_key = (doc, timestamp, "timestamp")
-                            
-                            if citation_unique_key not in seen_citations:
-                                filtered_citations.append(citation)
-                                seen_citations.add(citation_unique_key)
-                
-                logger.info(f"Filtered citations: {len(referenced_citations)} inline citations found, {len(filtered_citations)} matching citations after filtering (from {len(citations)} total)")
-                logger.info(f"Filtered citation details: {filtered_citations}")
-                
-                # If no citations matched, fall back to all citations
+            web_citations = [c for c in citations if not c.get("id")]
+            if chunk_citations:
+                answer, filtered_citations = resolve_citations(answer, chunk_citations)
+                logger.info(f"Resolved {len(filtered_citations)} cited chunks (from {len(chunk_citations)} in context)")
                 if not filtered_citations:
-                    logger.warning("No matching citations found for inline citations, using all citations")
-                    filtered_citations = citations
-                else:
-                    logger.info(f"Successfully filtered to {len(filtered_citations)} citations from {len(citations)} total")
+                    # No sources referenced in response - use only the top sources by score
+                    filtered_citations = chunk_citations[:5]
+                    logger.info(f"No chunk IDs cited in response. Limiting to top {len(filtered_citations)} citations.")
+            
+            if is_from_web and web_citations:
+                cited_web = self._filter_web_citations(answer, web_citations)
+                filtered_citations = (filtered_citations if chunk_citations else []) + cited_web
             else:
-                # For web search, filter to only citations that are actually referenced in the response
-                if is_from_web and citations:
-                    # Extract source names from inline citations in the response
-                    # Look for patterns like (Source_Name, Page X) or (Source_Name, URL)
-                    referenced_source_names = set()
-                    referenced_urls = set()
-                    
-                    # Extract from inline citations
-                    for ref_citation in referenced_citations:
-                        doc_name = ref_citation.get("document", "").strip()
-                        url = ref_citation.get("url", "")
-                        if doc_name:
-                            # Normalize source name for matching
-                            referenced_source_names.add(doc_name.lower().strip())
-                        if url:
-                            referenced_urls.add(url.lower().strip())
-                    
-                    # Also check if source names from citations are mentioned in the response
-                    for citation in citations:
-                        source = citation.get('source', '').strip()
-                        url = citation.get('url', '').strip()
-                        
-                        # Check if source name appears in answer (case-insensitive)
-                        if source:
-                            source_lower = source.lower()
-                            # Check if source name or part of it is in the answer
-                            if source_lower in answer.lower() or any(word in answer.lower() for word in source_lower.split() if len(word) > 3):
-                                referenced_source_names.add(source_lower)
-                        
-                        # Check if URL is mentioned
-                        if url and url in answer:
-                            referenced_urls.add(url.lower())
-                    
-                    # Filter citations to only those referenced
-                    filtered_citations = []
-                    seen_urls = set()
-                    
-                    for citation in citations:
-                        source = citation.get('source', '').strip()
-                        url = citation.get('url', '').strip()
-                        
-                        # Check if this citation is referenced
-                        is_referenced = False
-                        
-                        # Match by source name (fuzzy matching)
-                        if source:
-                            source_lower = source.lower()
-                            # Check exact match or if source name contains referenced name or vice versa
-                            for ref_name in referenced_source_names:
-                                if ref_name in source_lower or source_lower in ref_name:
-                                    is_referenced = True
-                                    break
-                        
-                        # Match by URL
-                        if url and (url.lower() in referenced_urls or url in answer):
-                            is_referenced = True
-                        
-                        # If referenced, add to filtered citations
-                        if is_referenced:
-                            # Deduplicate by URL
-                            if url and url not in seen_urls:
-                                filtered_citations.append(citation)
-                                seen_urls.add(url)
-                            elif not url:  # Include citations without URLs
-                                filtered_citations.append(citation)
-                    
-                    # If no citations matched but we have inline citations, try to match by extracting source names from answer
-                    if not filtered_citations and referenced_citations:
-                        logger.info("No direct matches found, trying to match by source name patterns")
-                        # Extract all source names from citations and check if they appear in inline citations
-                        for citation in citations:
-                            source = citation.get('source', '').strip()
-                            url = citation.get('url', '').strip()
-                            
-                            # Check if any part of the source name matches referenced names
-                            if source:
-                                source_words = source.lower().split()
-                                for ref_name in referenced_source_names:
-                                    ref_words = ref_name.split()
-                                    # Check if any significant word matches
-                                    if any(word in source_words for word in ref_words if len(word) > 3):
-                                        if url and url not in seen_urls:
-                                            filtered_citations.append(citation)
-                                            seen_urls.add(url)
-                                        break
-                    
-                    # Final fallback: if still no matches, use all citations (they were used in search)
-                    if not filtered_citations:
-                        logger.info("No explicit source references matched. Using all search result citations.")
-                        # Deduplicate by URL
-                        seen_urls = set()
-                        for citation in citations:
-                            url = citation.get('url', '')
-                            if url and url not in seen_urls:
-                                filtered_citations.append(citation)
-                                seen_urls.add(url)
-                            elif not url:
-                                filtered_citations.append(citation)
-                    else:
-                        logger.info(f"Filtered web citations: {len(referenced_source_names)} source names referenced, {len(filtered_citations)} matching citations (from {len(citations)} total)")
-                elif not is_from_web and not referenced_citations and citations and retrieved_chunks:
-                    # No sources referenced in response - use only top citations by score
-                    # Limit to top 3-5 citations to avoid showing too many
-                    logger.info(f"No source references found in response. Limiting to top citations.")
-                    # Get unique citations and limit to top 5
-                    seen_citations = set()
-                    unique_citations = []
-                    for chunk in retrieved_chunks[:5]:  # Only use top 5 chunks
-                        # Handle both page-based and timestamp-based citations
-                        if chunk.get('page_number'):
-                            citation_key = (chunk.get('document_name'), chunk.get('page_number'), 'page')
-                            if citation_key not in seen_citations:
-                                unique_citations.append({
-                                    "document": chunk.get('document_name', 'Unknown'),
-                                    "page": chunk.get('page_number', 'Unknown')
-                                })
-                                seen_citations.add(citation_key)
-                        elif chunk.get('timestamp'):
-                            citation_key = (chunk.get('document_name'), chunk.get('timestamp'), 'timestamp')
-                            if citation_key not in seen_citations:
-                                unique_citations.append({
-                                    "document": chunk.get('document_name', 'Unknown'),
-                                    "timestamp": chunk.get('timestamp', 'Unknown')
-                                })
-                                seen_citations.add(citation_key)
-                        else:
-                            # Fallback for chunks without page or timestamp
-                            citation_key = (chunk.get('document_name'), None, 'none')
-                            if citation_key not in seen_citations:
-                                unique_citations.append({
-                                    "document": chunk.get('document_name', 'Unknown')
-                                })
-                                seen_citations.add(citation_key)
-                    filtered_citations = unique_citations
-                    logger.info(f"Limited to top {len(filtered_citations)} citations (from {len(citations)} total) when no sources referenced")
+                cited_web = []
             
             # For web search, ALWAYS add citations section with clickable links
             # For course content, citations are inline only (no separate section)
             if is_from_web:
-                if filtered_citations:
+                if cited_web:
                     citations_text = "\n\n**Sources:**\n"
-                    for i, citation in enumerate(filtered_citations, 1):
+                    for i, citation in enumerate(cited_web, 1):
                         url = citation.get('url', '')
                         source = citation.get('source', citation.get('document', 'Unknown'))
                         if url:
@@ -489,11 +308,11 @@ CRITICAL INSTRUCTIONS:
                         else:
                             citations_text += f"{i}. {source}\n"
                     final_response = answer + citations_text
-                elif citations:
-                    # Fallback: if filtered_citations is empty but we have citations, use all
+                elif web_citations:
+                    # Fallback: if no web citations matched, list the top search results
                     logger.warning("No filtered citations but citations exist. Using all citations for Sources section.")
                     citations_text = "\n\n**Sources:**\n"
-                    for i, citation in enumerate(citations[:5], 1):  # Limit to top 5
+                    for i, citation in enumerate(web_citations[:5], 1):  # Limit to top 5
                         url = citation.get('url', '')
                         source = citation.get('source', citation.get('document', 'Unknown'))
                         if url:
@@ -529,6 +348,17 @@ CRITICAL INSTRUCTIONS:
                 }
 
 
+def _is_web_search_error(results: str) -> bool:
+    """Whether web search results text is one of the search agent's error messages."""
+    results_lower = results.lower()
+    return (
+        "not available" in results_lower
+        or "error performing" in results_lower
+        or "configure" in results_lower
+        or "no search results found" in results_lower
+    )
+
+
 def personalization_node(state: Dict[str, Any]) -> Dict[str, Any]:
     """
     LangGraph node for personalization.
@@ -547,23 +377,49 @@ def personalization_node(state: Dict[str, Any]) -> Dict[str, Any]:
     course_content_found = state.get("course_content_found", False)
     logger.info(f"Personalization node - course_content_found: {course_content_found}")
     
-    if course_content_found:
+    # Check the web search results alone, before any course context is merged in
+    web_results = state.get("web_search_results") or ""
+    web_failed = _is_web_search_error(web_results)
+    if web_failed:
+        logger.warning(f"Web search returned error message. Context: {web_results[:200]}")
+    
+    if course_content_found and state.get("web_search_citations") and not web_failed:
+        # Course retrieval and web search ran together for a current-info question
+        context = f"{state.get('course_context') or ''}\n\n{web_results}"
+        citations = state.get("course_citations", []) + state.get("web_search_citations", [])
+        retrieved_chunks = state.get("retrieved_chunks", [])
+        is_from_web = True
+        logger.info(f"Using course and web search context (length: {len(context)} chars, citations: {len(citations)}, chunks: {len(retrieved_chunks)})")
+    elif course_content_found:
+        # Also used when a combined course and web search lost its web part
         context = state.get("course_context")
         citations = state.get("course_citations", [])
         retrieved_chunks = state.get("retrieved_chunks", [])
         is_from_web = False
         logger.info(f"Using course context (length: {len(context) if context else 0} chars, citations: {len(citations)}, chunks: {len(retrieved_chunks)})")
     else:
-        context = state.get("web_search_results")
+        context = web_results
         citations = state.get("web_search_citations", [])
         retrieved_chunks = None
         is_from_web = True
-        logger.info(f"Using web search context (length: {len(context) if context else 0} chars, citations: {len(citations)})")
+        if web_failed:
+            # Try to provide a helpful response even if web search failed
+            context = (
+                f"I attempted to search the internet for current information about '{query}', but encountered an issue. "
+                "This might be due to API configuration. However, based on general knowledge: "
+                f"{query} is a topic that requires up-to-date information. "
+                "I recommend checking official sources or recent publications for the most current details."
+            )
+            citations = []
+        elif "internet search results" in context.lower() or "[ai answer]" in context.lower() or "[1]" in context:
+            # Valid search results - log success
+            logger.info(f"Web search returned valid results. Context length: {len(context)} chars")
+        logger.info(f"Using web search context (length: {len(context)} chars, citations: {len(citations)})")
     
     # Ensure we have context
     if not context or context.strip() == "":
         # Fallback: try to get any available context
-        context = state.get("course_context") or state.get("web_search_results")
+        context = state.get("course_context") or ("" if web_failed else web_results)
         if not context or context.strip() == "":
             # If still no context, provide a helpful message
             context = (
@@ -571,22 +427,6 @@ def personalization_node(state: Dict[str, Any]) -> Dict[str, Any]:
                 "However, I'll do my best to provide a helpful answer based on general knowledge about the topic."
             )
     
-    # Check if web search returned an error message
-    if is_from_web and context:
-        context_lower = context.lower()
-        if "not available" in context_lower or "error performing" in context_lower or "configure" in context_lower or "no search results found" in context_lower:
-            logger.warning(f"Web search returned error message. Context: {context[:200]}")
-            # Try to provide a helpful response even if web search failed
-            context = (
-                f"I attempted to search the internet for current information about '{query}', but encountered an issue. "
-                "This might be due to API configuration. However, based on general knowledge: "
-                f"{query} is a topic that requires up-to-date information. "
-                "I recommend checking official sources or recent publications for the most current details."
-            )
-        elif "internet search results" in context_lower or "[ai answer]" in context_lower or "[1]" in context:
-            # Valid search results - log success
-            logger.info(f"Web search returned valid results. Context length: {len(context)} chars")
-    
     # Get conversation history for context (for resolving references like "the paper")
     messages = state.get("messages", [])
     conversation_context = ""
@@ -610,7 +450,7 @@ def personalization_node(state: Dict[str, Any]) -> Dict[str, Any]:
         course_name=state["course_name"],
         citations=citations,
         is_from_web=is_from_web,
-        retrieved_chunks=retrieved_chunks if not is_from_web else None
+        retrieved_chunks=retrieved_chunks
     )
     
     # Ensure we have a valid response
@@ -636,5 +476,13 @@ def personalization_node(state: Dict[str, Any]) -> Dict[str, Any]:
     
     logger.info("Personalized response generated.")
     
+    # Warm caches for the likely next question while the student reads the answer
+    from core.prefetch import schedule_prefetch
+    schedule_prefetch(
+        course_name=state["course_name"],
+        query=query,
+        answer=final_response
+    )
+    
     return state
 
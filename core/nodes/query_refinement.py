@@ -1,12 +1,9 @@
 """Query Refinement Agent - Detects vague queries and asks follow-up questions."""
 
-import json
 import logging
 from typing import Dict, Any
-from openai import OpenAI
-from config.settings import OPENAI_API_KEY, OPENAI_MODEL
-import yaml
-from pathlib import Path
+from config.prompts import get_prompt_config
+from utils.model_tiering import json_completion
 
 logger = logging.getLogger(__name__)
 
@@ -16,12 +13,8 @@ class QueryRefinementAgent:
     
     def __init__(self):
         """Initialize the query refinement agent."""
-        self.client = OpenAI(api_key=OPENAI_API_KEY)
-        
         # Load prompts
-        config_path = Path(__file__).parent.parent.parent / "config" / "prompts.yaml"
-        with open(config_path, 'r') as f:
-            self.config = yaml.safe_load(f)
+        self.config = get_prompt_config()
     
     def check_vagueness(
         self,
@@ -64,7 +57,8 @@ CRITICAL:
 - If the conversation history provides context that clarifies pronouns/references, the question is NOT vague
 - Be lenient - only mark as vague if the question is truly unanswerable even with conversation context
 
-Respond with valid JSON only: {"is_vague": true/false, "follow_up_questions": ["question1", "question2"]}"""
+Respond with valid JSON only: {"is_vague": true/false, "follow_up_questions": ["question1", "question2"], "confidence": 0.0-1.0}
+"confidence" is how sure you are of the is_vague decision."""
             
             user_prompt = f"""Conversation History:
 {conversation_history if conversation_history else "No previous conversation"}
@@ -94,17 +88,7 @@ EXAMPLES:
 
 If it is vague, provide ONLY ONE follow-up question at a time that will help clarify the query. Ask the most important question first. If not vague, set follow_up_questions to an empty array."""
             
-            response = self.client.chat.completions.create(
-                model=OPENAI_MODEL,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.3,
-                response_format={"type": "json_object"}
-            )
-            
-            result = json.loads(response.choices[0].message.content)
+            result = json_completion("query_refinement", system_prompt, user_prompt)
             
             return {
                 "is_vague": result.get("is_vague", False),
@@ -123,7 +107,8 @@ If it is vague, provide ONLY ONE follow-up question at a time that will help cla
         self,
         query: str,
         follow_up_answer: str = "",
-        conversation_history: str = ""
+        conversation_history: str = "",
+        course_name: str = None
     ) -> Dict[str, Any]:
         """
         Refine a query based on follow-up answer and check if it's now clear.
@@ -132,9 +117,11 @@ If it is vague, provide ONLY ONE follow-up question at a time that will help cla
             query: Original query
             follow_up_answer: User's answer to follow-up question
             conversation_history: Previous conversation context
+            course_name: Course to also judge relevance against (skipped if not given)
             
         Returns:
-            Dictionary with refined_query and is_clear flag
+            Dictionary with refined_query and is_clear flag, plus is_relevant and
+            relevance_reason when a course was given
         """
         if not follow_up_answer:
             return {"refined_query": query, "is_clear": True}
@@ -143,44 +130,61 @@ If it is vague, provide ONLY ONE follow-up question at a time that will help cla
             # Combine original query with follow-up answer
             combined_query = f"{query} {follow_up_answer}"
             
-            # Check if the combined query is now clear
-            vagueness_check = self.check_vagueness(
-                query=combined_query,
-                conversation_history=conversation_history
-            )
+            # One call judges clarity (and course relevance) and rewrites the question
+            system_prompt = """You are a query refinement agent. A student asked a vague question and then answered a clarifying question.
+
+Decide whether the original question together with the answer is now clear enough to answer, using the conversation history to resolve references (e.g., "the paper", "it", "they"). Be lenient - only treat it as unclear if it is still truly ambiguous.
+
+If it is clear, combine both into a single refined, specific question.
+If it is still unclear, ask ONLY ONE follow-up question, the most important one."""
+            
+            user_prompt = f"""Conversation History:
+{conversation_history if conversation_history else "No previous conversation"}
+
+Original Question: {query}
+Follow-up Answer: {follow_up_answer}"""
+            
+            if course_name:
+                course_description = self.config.get('course_descriptions', {}).get(
+                    course_name,
+                    f"This course covers topics related to {course_name}."
+                )
+                system_prompt += """
+
+Also decide whether the refined question is relevant to the course. Be VERY lenient: questions about course topics, concepts, materials, technologies mentioned in the course, or current information about them are RELEVANT. Only questions about completely unrelated topics (weather, sports, cooking, etc.) are NOT relevant.
+
+Respond with valid JSON only: {"is_clear": true/false, "refined_query": "...", "follow_up_question": "..." or null, "is_relevant": true/false, "relevance_reason": "brief explanation", "confidence": 0.0-1.0}
+"confidence" is how sure you are of the is_clear and is_relevant decisions."""
+                user_prompt = f"""Course: {course_name}
+Course Description: {course_description}
+
+{user_prompt}"""
+            else:
+                system_prompt += """
+
+Respond with valid JSON only: {"is_clear": true/false, "refined_query": "...", "follow_up_question": "..." or null, "confidence": 0.0-1.0}
+"confidence" is how sure you are of the is_clear decision."""
+            
+            result = json_completion("query_refinement", system_prompt, user_prompt)
+            is_clear = result.get("is_clear", True)
             
             # If still vague, return the combined query but mark as not clear
-            if vagueness_check["is_vague"]:
+            if not is_clear:
                 return {
                     "refined_query": combined_query,
                     "is_clear": False,
-                    "follow_up_question": vagueness_check["follow_up_questions"][0] if vagueness_check["follow_up_questions"] else None
+                    "follow_up_question": result.get("follow_up_question")
                 }
             
-            # Query is now clear, refine it properly
-            system_prompt = """You are a query refinement agent. Combine the original question with the follow-up answer to create a more specific, clear question."""
-            
-            user_prompt = f"""Original Question: {query}
-Follow-up Answer: {follow_up_answer}
-
-Create a refined, more specific question that incorporates both pieces of information. Make it clear and specific."""
-            
-            response = self.client.chat.completions.create(
-                model=OPENAI_MODEL,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.3
-            )
-            
-            refined = response.choices[0].message.content.strip()
-            
-            return {
-                "refined_query": refined,
+            refinement = {
+                "refined_query": (result.get("refined_query") or combined_query).strip(),
                 "is_clear": True,
                 "follow_up_question": None
             }
+            if course_name:
+                refinement["is_relevant"] = result.get("is_relevant", True)
+                refinement["relevance_reason"] = result.get("relevance_reason", "")
+            return refinement
             
         except Exception as e:
             logger.error(f"Error refining query: {e}")
@@ -1,12 +1,9 @@
 """Relevance Agent - Determines if a question is relevant to the course."""
 
-import json
 import logging
 from typing import Dict, Any
-from openai import OpenAI
-from config.settings import OPENAI_API_KEY, OPENAI_MODEL
-import yaml
-from pathlib import Path
+from config.prompts import get_prompt_config
+from utils.model_tiering import json_completion
 
 logger = logging.getLogger(__name__)
 
@@ -16,12 +13,8 @@ class RelevanceAgent:
     
     def __init__(self):
         """Initialize the relevance agent."""
-        self.client = OpenAI(api_key=OPENAI_API_KEY)
-        
         # Load prompts and course descriptions
-        config_path = Path(__file__).parent.parent.parent / "config" / "prompts.yaml"
-        with open(config_path, 'r') as f:
-            self.config = yaml.safe_load(f)
+        self.config = get_prompt_config()
     
     def check_relevance(
         self,
@@ -69,7 +62,7 @@ Questions about:
 - Questions that build on course topics even if asking for current/outside information = RELEVANT
 - Completely unrelated topics (weather, cooking, etc.) = NOT RELEVANT
 
-Respond with valid JSON only: {"relevant": true/false, "reason": "brief explanation"}"""
+Respond with valid JSON only: {"relevant": true/false, "reason": "brief explanation", "confidence": 0.0-1.0}"""
             )
             
             user_prompt = f"""Course: {course_name}
@@ -88,17 +81,7 @@ Is this question relevant to the course? Be VERY lenient:
 
 Remember: Questions asking for current/updated information about course-related topics are still RELEVANT."""
             
-            response = self.client.chat.completions.create(
-                model=OPENAI_MODEL,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.3,
-                response_format={"type": "json_object"}
-            )
-            
-            result = json.loads(response.choices[0].message.content)
+            result = json_completion("relevance", system_prompt, user_prompt)
             
             return {
                 "relevant": result.get("relevant", False),
@@ -0,0 +1,113 @@
+"""Background warming of caches for likely follow-up questions."""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import List, Optional
+from config.settings import PREFETCH_ENABLED, PREFETCH_FOLLOW_UPS
+
+logger = logging.getLogger(__name__)
+
+# Small pool so prefetching never competes with the request path for long
+_prefetch_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="follow-up-prefetch")
+
+_retriever = None
+_retriever_lock = threading.Lock()
+
+
+def _get_retriever():
+    """Get the retriever used for prefetching, connecting on first use."""
+    global _retriever
+    with _retriever_lock:
+        if _retriever is None:
+            from retrieval.retriever import CourseRetriever
+            _retriever = CourseRetriever()
+        return _retriever
+
+
+def predict_follow_up_questions(query: str, answer: str, course_name: str, limit: int = PREFETCH_FOLLOW_UPS) -> List[str]:
+    """
+    Predict the questions a student is likely to ask after an answer.
+    
+    Args:
+        query: Question that was answered
+        answer: The answer shown to the student
+        course_name: Name of the course
+        limit: Maximum number of questions
+        
+    Returns:
+        Predicted follow-up questions, phrased as the student would ask them
+    """
+    from utils.model_tiering import json_completion
+
+    system_prompt = f"""You predict what a student in the {course_name} course will ask next.
+Write the follow-up questions the student is most likely to type after reading the answer, phrased the way the student would ask them, each standalone (no pronouns referring to the answer).
+
+Respond with valid JSON only: {{"questions": ["question1", "question2"], "confidence": 0.0-1.0}}"""
+    user_prompt = f"""Student's question: "{query}"
+
+Answer they received:
+{answer[:2000]}
+
+Predict up to {limit} follow-up questions."""
+
+    result = json_completion("follow_up_prediction", system_prompt, user_prompt)
+    questions = [str(question).strip() for question in result.get("questions") or [] if str(question).strip()]
+    return questions[:limit]
+
+
+def warm_follow_up_retrievals(course_name: str, queries: List[str]) -> int:
+    """
+    Run retrieval for predicted follow-up questions so the results are cached.
+
+    Uses the same parameters as the course RAG node, so a matching question
+    on the next turn is served from the retrieval cache.
+
+    Args:
+        course_name: Name of the course
+        queries: Predicted follow-up questions
+
+    Returns:
+        Number of queries warmed
+    """
+    from core.nodes.course_rag import initial_retrieval_k
+    from retrieval.reference_filter import asks_about_references
+
+    retriever = _get_retriever()
+    for query in queries:
+        retriever.retrieve(
+            query=query,
+            course_name=course_name,
+            top_k=initial_retrieval_k(course_name),
+            exclude_references=not asks_about_references(query),
+            prefetch=True
+        )
+    return len(queries)
+
+
+def _prefetch(course_name: str, query: str, answer: str):
+    """Predict follow-up questions and warm their retrievals, logging rather than raising on failure."""
+    try:
+        queries = predict_follow_up_questions(query, answer, course_name)
+        warmed_queries = warm_follow_up_retrievals(course_name, queries)
+        logger.info(f"Prefetched {warmed_queries} follow-up retrievals for '{course_name}': {queries}")
+    except Exception as e:
+        logger.warning(f"Follow-up prefetch failed: {e}")
+
+
+def schedule_prefetch(course_name: str, query: str, answer: Optional[str]) -> Optional[Future]:
+    """
+    Warm caches for the next turn in the background.
+    
+    Args:
+        course_name: Name of the course
+        query: Question that was answered
+        answer: The answer shown to the student
+        
+    Returns:
+        The background task, or None if prefetching is disabled or there is no answer
+    """
+    if not PREFETCH_ENABLED or not query or not answer:
+        return None
+
+    return _prefetch_executor.submit(_prefetch, course_name, query, answer)
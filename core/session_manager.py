@@ -0,0 +1,126 @@
+"""Conversation thread IDs for browser sessions."""
+
+import re
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+from config.settings import SESSION_IDLE_TTL, SESSION_MAX_THREADS
+
+logger = logging.getLogger(__name__)
+
+
+class SessionManager:
+    """
+    Issues a unique thread ID per chat session and frees its checkpoints when it ends.
+
+    Browser sessions are often abandoned without "End Session", so threads
+    idle for longer than idle_ttl are freed too, as are the least recently
+    used threads beyond max_threads.
+    """
+
+    def __init__(self, checkpointer, idle_ttl: float = SESSION_IDLE_TTL, max_threads: int = SESSION_MAX_THREADS):
+        """
+        Initialize the session manager.
+
+        Args:
+            checkpointer: The graph's checkpoint saver
+            idle_ttl: Seconds without activity after which a thread is freed
+            max_threads: Threads kept at most; the least recently used are freed first
+        """
+        self.checkpointer = checkpointer
+        self.idle_ttl = idle_ttl
+        self.max_threads = max(1, max_threads)
+        # Thread ID to last activity time, least recently used first
+        self._active: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def new_thread_id(self, student_id: Optional[str] = None) -> str:
+        """
+        Issue a thread ID for a new chat session.
+
+        The student ID is kept as a readable prefix only; two sessions with the
+        same (or no) student ID still get separate threads.
+
+        Args:
+            student_id: Student identifier entered in the sidebar
+
+        Returns:
+            A new thread ID
+        """
+        prefix = re.sub(r'[^A-Za-z0-9_-]', '', str(student_id or ""))[:32] or "anonymous"
+        thread_id = f"{prefix}-{uuid.uuid4().hex}"
+        self.touch(thread_id)
+        logger.info(f"Started conversation thread {thread_id}")
+        return thread_id
+
+    def touch(self, thread_id: str) -> bool:
+        """
+        Record activity on a thread, then free idle and excess threads.
+
+        Args:
+            thread_id: Thread that was just used
+
+        Returns:
+            False if the thread had been freed (or was never issued), so its
+            checkpoints are gone and its memory starts empty
+        """
+        with self._lock:
+            was_active = thread_id in self._active
+            self._active[thread_id] = time.monotonic()
+            self._active.move_to_end(thread_id)
+        self.evict_idle()
+        return was_active
+
+    def is_active(self, thread_id: str) -> bool:
+        """Whether a thread still holds its conversation memory (not ended or freed)."""
+        with self._lock:
+            return thread_id in self._active
+
+    def evict_idle(self) -> List[str]:
+        """
+        Free threads idle for longer than the TTL, and the oldest beyond the thread limit.
+
+        Returns:
+            IDs of the freed threads
+        """
+        cutoff = time.monotonic() - self.idle_ttl
+        evicted = []
+        with self._lock:
+            while self._active:
+                thread_id, last_used = next(iter(self._active.items()))
+                if last_used >= cutoff and len(self._active) <= self.max_threads:
+                    break
+                del self._active[thread_id]
+                evicted.append(thread_id)
+
+        for thread_id in evicted:
+            self._delete_checkpoints(thread_id)
+        if evicted:
+            logger.info(f"Freed {len(evicted)} idle conversation threads ({self.active_threads()} active)")
+        return evicted
+
+    def _delete_checkpoints(self, thread_id: str):
+        try:
+            self.checkpointer.delete_thread(thread_id)
+        except Exception as e:
+            logger.warning(f"Could not delete checkpoints for thread {thread_id}: {e}")
+
+    def end_thread(self, thread_id: str):
+        """
+        Drop a finished session's checkpoints.
+
+        Args:
+            thread_id: Thread ID issued by new_thread_id
+        """
+        self._delete_checkpoints(thread_id)
+        with self._lock:
+            self._active.pop(thread_id, None)
+        logger.info(f"Ended conversation thread {thread_id}")
+
+    def active_threads(self) -> int:
+        """Number of sessions that have not been ended or freed."""
+        with self._lock:
+            return len(self._active)
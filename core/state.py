@@ -34,6 +34,8 @@ class AgentState(TypedDict):
     course_name: str
     
     # Flow control
+    triage_complete: bool  # Clarity and relevance already decided before the graph ran
+    deadline: Optional[float]  # Wall-clock time (time.time()) by which external calls must finish
     current_node: str
     next_node: Optional[str]
     should_continue: bool
@@ -47,7 +49,8 @@ def create_initial_state(
     query: str,
     course_name: str,
     user_context: Dict[str, Any],
-    conversation_history: Optional[List[Dict[str, str]]] = None
+    conversation_history: Optional[List[Dict[str, str]]] = None,
+    deadline: Optional[float] = None
 ) -> AgentState:
     """Create initial state for the agentic flow."""
     # Convert conversation history to LangChain messages
@@ -83,6 +86,8 @@ def create_initial_state(
         web_search_citations=[],
         user_context=user_context,
         course_name=course_name,
+        triage_complete=False,
+        deadline=deadline,
         current_node="start",
         next_node=None,
         should_continue=True,
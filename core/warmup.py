@@ -0,0 +1,155 @@
+"""Background warm-up of shared clients, indexes and the agent graph at app start."""
+
+import os
+import time
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Any, Callable, List, Tuple
+from config.settings import COURSES_PATH, WARMUP_ENABLED, WARMUP_EMBEDDING_CALL, RERANKER_ENABLED
+
+logger = logging.getLogger(__name__)
+
+_status: Dict[str, Any] = {
+    "state": "not_started",  # not_started, warming, ready, failed
+    "steps": {},  # Step name to seconds taken, or the error message
+    "seconds": None
+}
+_status_lock = threading.Lock()
+_thread = None
+
+
+def _load_prompts():
+    from config.prompts import get_prompt_config
+    get_prompt_config()
+
+
+def _build_clients():
+    from utils.http_clients import get_openai_client, get_pinecone_client, get_tavily_client
+    get_openai_client()
+    get_pinecone_client()
+    tavily_api_key = os.getenv("TAVILY_API_KEY")
+    if tavily_api_key:
+        get_tavily_client(tavily_api_key)
+
+
+def _connect_index():
+    from retrieval.vector_store import PineconeVectorStore
+    PineconeVectorStore()
+
+
+def _load_course_indexes():
+    from retrieval.bm25_index import load_course_bm25_index
+    from retrieval.metadata_index import load_course_metadata_index
+    courses_dir = Path(COURSES_PATH)
+    if not courses_dir.exists():
+        return
+    for course_folder in courses_dir.iterdir():
+        if course_folder.is_dir():
+            load_course_bm25_index(course_folder.name)
+            load_course_metadata_index(course_folder.name)
+
+
+def _load_reranker():
+    from retrieval.reranker import get_reranker
+    get_reranker()
+
+
+def _compile_graph():
+    from core.agent import get_prism_agent
+    get_prism_agent()
+
+
+def _embed_probe():
+    from config.settings import EMBEDDING_MODEL
+    from utils.http_clients import get_openai_client
+    from utils.resilience import call_upstream
+    client = get_openai_client()
+    call_upstream("openai", lambda timeout: client.embeddings.create(
+        model=EMBEDDING_MODEL,
+        input=["warm-up"],
+        timeout=timeout
+    ), max_attempts=1)
+
+
+def _warmup_steps() -> List[Tuple[str, Callable[[], None]]]:
+    """Ordered warm-up steps; each is independent of the others failing."""
+    steps = [
+        ("prompts", _load_prompts),
+        ("clients", _build_clients),
+        ("pinecone_index", _connect_index),
+        ("course_indexes", _load_course_indexes),
+        ("agent_graph", _compile_graph),
+    ]
+    if RERANKER_ENABLED:
+        steps.append(("reranker", _load_reranker))
+    if WARMUP_EMBEDDING_CALL:
+        steps.append(("embedding_probe", _embed_probe))
+    return steps
+
+
+def run_warmup() -> Dict[str, Any]:
+    """
+    Run every warm-up step in the calling thread.
+
+    A failing step is logged and recorded, and the remaining steps still run.
+
+    Returns:
+        The readiness status
+    """
+    with _status_lock:
+        _status["state"] = "warming"
+    start = time.perf_counter()
+    failed = False
+
+    for name, step in _warmup_steps():
+        step_start = time.perf_counter()
+        try:
+            step()
+            result = round(time.perf_counter() - step_start, 3)
+        except Exception as e:
+            logger.warning(f"Warm-up step '{name}' failed: {e}")
+            result = f"error: {e}"
+            failed = True
+        with _status_lock:
+            _status["steps"][name] = result
+
+    with _status_lock:
+        _status["state"] = "failed" if failed else "ready"
+        _status["seconds"] = round(time.perf_counter() - start, 3)
+    logger.info(f"Warm-up {_status['state']} in {_status['seconds']}s: {_status['steps']}")
+    return warmup_status()
+
+
+def start_warmup() -> bool:
+    """
+    Start the warm-up in a background thread, once per process.
+
+    Returns:
+        True if this call started it
+    """
+    global _thread
+    if not WARMUP_ENABLED:
+        return False
+    with _status_lock:
+        if _thread is not None:
+            return False
+        _thread = threading.Thread(target=run_warmup, name="prism-warmup", daemon=True)
+    _thread.start()
+    return True
+
+
+def warmup_status() -> Dict[str, Any]:
+    """
+    Get the current readiness status.
+
+    Returns:
+        Dictionary with state, per-step timings or errors, and total seconds
+    """
+    with _status_lock:
+        return {**_status, "steps": dict(_status["steps"])}
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    print(run_warmup())
@@ -1,11 +1,10 @@
 """Response generator using GPT-4o with RAG."""
 
 import logging
-import yaml
-from pathlib import Path
 from typing import Dict, Any
-from openai import OpenAI
-from config.settings import OPENAI_API_KEY, OPENAI_MODEL
+from config.prompts import get_prompt_config, get_node_model
+from utils.http_clients import get_openai_client
+from utils.resilience import call_upstream
 from retrieval.retriever import CourseRetriever
 
 logger = logging.getLogger(__name__)
@@ -16,13 +15,11 @@ class ResponseGenerator:
     
     def __init__(self):
         """Initialize the response generator."""
-        self.client = OpenAI(api_key=OPENAI_API_KEY)
+        self.client = get_openai_client()
         self.retriever = CourseRetriever()
         
         # Load prompts from YAML
-        config_path = Path(__file__).parent.parent / "config" / "prompts.yaml"
-        with open(config_path, 'r') as f:
-            self.config = yaml.safe_load(f)
+        self.config = get_prompt_config()
     
     def _is_analysis_query(self, query: str) -> bool:
         """Check if query is asking for document analysis (tables, figures, etc.)."""
@@ -101,15 +98,17 @@ class ResponseGenerator:
             max_tokens = response_settings.get('max_tokens', 2000)
             
             # Generate response
-            response = self.client.chat.completions.create(
-                model=OPENAI_MODEL,
+            model = get_node_model("response_generator")
+            response = call_upstream("openai", lambda timeout: self.client.chat.completions.create(
+                model=model,
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_prompt}
                 ],
                 temperature=temperature,
-                max_tokens=max_tokens
-            )
+                max_tokens=max_tokens,
+                timeout=timeout
+            ))
             
             answer = response.choices[0].message.content
             
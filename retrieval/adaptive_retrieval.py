@@ -0,0 +1,107 @@
+"""Adaptive retrieval depth and course-vs-web routing from the score distribution."""
+
+import logging
+from typing import List, Dict, Any
+from config.settings import (
+    ADAPTIVE_INITIAL_K,
+    ADAPTIVE_MIN_SCORE,
+    ADAPTIVE_CONFIDENT_SCORE,
+    ADAPTIVE_FLAT_SPREAD
+)
+from config.prompts import get_prompt_config
+
+logger = logging.getLogger(__name__)
+
+
+def _load_threshold_config() -> Dict[str, Dict[str, float]]:
+    """Per-course retrieval thresholds from prompts.yaml."""
+    try:
+        return get_prompt_config().get('retrieval_thresholds', {}) or {}
+    except Exception as e:
+        logger.warning(f"Could not load retrieval thresholds: {e}")
+        return {}
+
+
+def dense_scores(chunks: List[Dict[str, Any]]) -> List[float]:
+    """
+    Dense similarity scores of retrieved chunks, highest first.
+
+    Lexical-only hybrid hits carry a dense score of 0.0 and are left out.
+    """
+    return sorted((chunk.get("score") or 0.0 for chunk in chunks if (chunk.get("score") or 0.0) > 0), reverse=True)
+
+
+class AdaptiveRetrievalPolicy:
+    """Decides how many chunks to retrieve and whether they answer the question."""
+
+    def __init__(
+        self,
+        max_k: int,
+        initial_k: int = ADAPTIVE_INITIAL_K,
+        min_score: float = ADAPTIVE_MIN_SCORE,
+        confident_score: float = ADAPTIVE_CONFIDENT_SCORE,
+        flat_spread: float = ADAPTIVE_FLAT_SPREAD
+    ):
+        """
+        Initialize the policy.
+
+        Args:
+            max_k: Chunks retrieved when widening
+            initial_k: Chunks retrieved on the first pass
+            min_score: Top score needed to treat the course content as found
+            confident_score: Top score below which retrieval is widened
+            flat_spread: Top-to-last score gap below which retrieval is widened
+        """
+        self.max_k = max_k
+        self.initial_k = min(initial_k, max_k)
+        self.min_score = min_score
+        self.confident_score = confident_score
+        self.flat_spread = flat_spread
+
+    @classmethod
+    def for_course(cls, course_name: str, max_k: int) -> "AdaptiveRetrievalPolicy":
+        """Build the policy with the course's calibrated thresholds (or the defaults)."""
+        config = _load_threshold_config()
+        thresholds = {**config.get('default', {}), **config.get(course_name.strip(), {})}
+        return cls(
+            max_k=max_k,
+            min_score=thresholds.get('min_score', ADAPTIVE_MIN_SCORE),
+            confident_score=thresholds.get('confident_score', ADAPTIVE_CONFIDENT_SCORE),
+            flat_spread=thresholds.get('flat_spread', ADAPTIVE_FLAT_SPREAD)
+        )
+
+    def should_widen(self, chunks: List[Dict[str, Any]]) -> bool:
+        """
+        Check whether the first pass should be widened to max_k chunks.
+
+        Widens when the best match is weak, or when the scores are so flat that
+        more equally relevant chunks are likely just past the cutoff.
+        """
+        if self.initial_k >= self.max_k or len(chunks) < self.initial_k:
+            # Nothing more to fetch
+            return False
+
+        scores = dense_scores(chunks)
+        if not scores:
+            return True
+        if scores[0] < self.confident_score:
+            logger.info(f"Top score {scores[0]:.3f} below {self.confident_score}, widening retrieval to {self.max_k}")
+            return True
+        if len(scores) >= self.initial_k and scores[0] - scores[-1] < self.flat_spread:
+            logger.info(f"Flat score curve ({scores[0]:.3f} to {scores[-1]:.3f}), widening retrieval to {self.max_k}")
+            return True
+        return False
+
+    def is_found(self, chunks: List[Dict[str, Any]]) -> bool:
+        """
+        Check whether the retrieved chunks are strong enough to answer from the course.
+
+        When no dense scores are available (e.g. lexical-only results after a
+        dense search failure) any result counts as found.
+        """
+        if not chunks:
+            return False
+        scores = dense_scores(chunks)
+        if not scores:
+            return True
+        return scores[0] >= self.min_score
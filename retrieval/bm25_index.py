@@ -0,0 +1,210 @@
+"""Local BM25 inverted index for lexical course retrieval."""
+
+import json
+import math
+import re
+import logging
+from collections import Counter
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Iterable
+from config.settings import BM25_K1, BM25_B
+from utils.paths import course_index_dir
+from utils.artifact_cache import load_cached_artifact
+
+logger = logging.getLogger(__name__)
+
+BM25_INDEX_FILENAME = "bm25.json"
+
+# Metadata fields copied from ingested chunks into the index records
+RECORD_FIELDS = [
+    "course_name", "module_name", "document_name", "type",
+    "chunk_index", "page_number", "timestamp", "is_reference", "citation_density"
+]
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+class BM25Index:
+    """In-memory BM25 index over course chunks, keyed by vector ID."""
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        """
+        Initialize an empty index.
+
+        Args:
+            k1: Term frequency saturation parameter
+            b: Document length normalization parameter
+        """
+        self.k1 = k1
+        self.b = b
+        self.doc_ids: List[str] = []
+        self.records: Dict[str, Dict[str, Any]] = {}
+        self.doc_lengths: List[int] = []
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.avg_doc_length = 0.0
+
+    @staticmethod
+    def tokenize(text: str) -> List[str]:
+        """Lowercase and split text into alphanumeric tokens."""
+        return _TOKEN_PATTERN.findall(text.lower()) if text else []
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def add_documents(self, documents: List[Dict[str, Any]]):
+        """
+        Add ingested chunks to the index.
+
+        Chunks are keyed by the same vector ID used in Pinecone, so a chunk
+        that Pinecone would overwrite replaces the existing entry here too.
+
+        Args:
+            documents: Chunks produced by the document loaders
+        """
+        from retrieval.vector_store import build_vector_id
+
+        by_id = {doc_id: self.records[doc_id] for doc_id in self.doc_ids}
+        for doc in documents:
+            if not doc.get("content"):
+                continue
+            vector_id = build_vector_id(doc)
+            record = {field: doc.get(field) for field in RECORD_FIELDS if doc.get(field) is not None}
+            record["id"] = vector_id
+            record["content"] = doc["content"]
+            by_id[vector_id] = record
+
+        self._build(by_id)
+
+    def _build(self, records: Dict[str, Dict[str, Any]]):
+        """Rebuild postings and length statistics from records."""
+        self.doc_ids = list(records.keys())
+        self.records = records
+        self.doc_lengths = []
+        self.postings = {}
+
+        for doc_idx, doc_id in enumerate(self.doc_ids):
+            record = records[doc_id]
+            # Index the module and document names alongside the content so that
+            # identifiers such as "Module 4" match even when the text omits them
+            indexed_text = " ".join([
+                record.get("module_name") or "",
+                record.get("document_name") or "",
+                record["content"]
+            ])
+            term_counts = Counter(self.tokenize(indexed_text))
+            self.doc_lengths.append(sum(term_counts.values()))
+            for term, tf in term_counts.items():
+                self.postings.setdefault(term, {})[doc_idx] = tf
+
+        self.avg_doc_length = (sum(self.doc_lengths) / len(self.doc_lengths)) if self.doc_lengths else 0.0
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 5,
+        candidate_ids: Optional[Iterable[str]] = None,
+        exclude_references: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Score indexed chunks against a query with BM25.
+
+        Args:
+            query: The query text
+            top_k: Number of results to return
+            candidate_ids: Optional vector IDs to restrict scoring to
+            exclude_references: Skip chunks flagged as reference/bibliography sections
+
+        Returns:
+            List of matching chunks in the same shape as vector store results
+        """
+        if not self.doc_ids:
+            return []
+
+        num_docs = len(self.doc_ids)
+        scores: Dict[int, float] = {}
+        allowed = None
+        if candidate_ids is not None:
+            candidate_ids = set(candidate_ids)
+            allowed = {idx for idx, doc_id in enumerate(self.doc_ids) if doc_id in candidate_ids}
+        if exclude_references:
+            allowed = {
+                idx for idx, doc_id in enumerate(self.doc_ids)
+                if not self.records[doc_id].get("is_reference") and (allowed is None or idx in allowed)
+            }
+
+        for term in set(self.tokenize(query)):
+            term_postings = self.postings.get(term)
+            if not term_postings:
+                continue
+            idf = math.log(1 + (num_docs - len(term_postings) + 0.5) / (len(term_postings) + 0.5))
+            for doc_idx, tf in term_postings.items():
+                if allowed is not None and doc_idx not in allowed:
+                    continue
+                length_norm = 1 - self.b + self.b * self.doc_lengths[doc_idx] / (self.avg_doc_length or 1)
+                scores[doc_idx] = scores.get(doc_idx, 0.0) + idf * tf * (self.k1 + 1) / (tf + self.k1 * length_norm)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+
+        results = []
+        for doc_idx, score in ranked:
+            result = dict(self.records[self.doc_ids[doc_idx]])
+            result["lexical_score"] = score
+            results.append(result)
+        return results
+
+    def save(self, path: Path):
+        """Persist the index records to a JSON file."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {
+            "k1": self.k1,
+            "b": self.b,
+            "records": [self.records[doc_id] for doc_id in self.doc_ids]
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(payload, f)
+        logger.info(f"Saved BM25 index with {len(self.doc_ids)} chunks to {path}")
+
+    @classmethod
+    def load(cls, path: Path) -> "BM25Index":
+        """Load an index saved with save() and rebuild its postings."""
+        with open(path, 'r', encoding='utf-8') as f:
+            payload = json.load(f)
+        index = cls(k1=payload.get("k1", BM25_K1), b=payload.get("b", BM25_B))
+        index._build({record["id"]: record for record in payload.get("records", [])})
+        return index
+
+
+def bm25_index_path(course_name: str) -> Path:
+    """Get the on-disk location of a course's BM25 index."""
+    return course_index_dir(course_name) / BM25_INDEX_FILENAME
+
+
+def build_course_bm25_index(course_name: str, documents: List[Dict[str, Any]]) -> BM25Index:
+    """
+    Build and save the BM25 index for a course from its ingested chunks.
+
+    Args:
+        course_name: Name of the course
+        documents: All chunks ingested for the course
+
+    Returns:
+        The built index
+    """
+    index = BM25Index()
+    index.add_documents(documents)
+    index.save(bm25_index_path(course_name))
+    return index
+
+
+def load_course_bm25_index(course_name: str) -> Optional[BM25Index]:
+    """
+    Load a course's BM25 index, reusing the cached copy when unchanged.
+
+    Args:
+        course_name: Name of the course
+
+    Returns:
+        The index, or None if it has not been built for this course
+    """
+    return load_cached_artifact(bm25_index_path(course_name.strip()), BM25Index.load)
@@ -0,0 +1,88 @@
+"""Resolve chunk-ID citations in generated answers back to their sources."""
+
+import re
+from typing import Dict, Any, List, Optional, Tuple
+
+# One or more chunk IDs in a single bracket, e.g. [C2] or [C1, C4], with the space before it
+CHUNK_ID_PATTERN = re.compile(r'([ \t]*)\[\s*(C\d+(?:\s*[,;]\s*C\d+)*)\s*\]', re.IGNORECASE)
+
+_ID_SPLIT = re.compile(r'\s*[,;]\s*')
+
+
+def citation_key(result: Dict[str, Any]) -> Tuple[Any, Any, Any]:
+    """Key identifying a chunk's source: document, module, and page or timestamp."""
+    if result.get('page_number'):
+        return (result['document_name'], result.get('module_name'), result['page_number'])
+    if result.get('timestamp'):
+        return (result['document_name'], result.get('module_name'), result['timestamp'])
+    return (result['document_name'], result.get('module_name'), None)
+
+
+def make_citation(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the citation dictionary for a chunk."""
+    citation = {
+        "document": result['document_name']
+    }
+
+    # Add module if present
+    if result.get('module_name'):
+        citation["module"] = result['module_name']
+
+    # Add page or timestamp
+    if result.get('page_number'):
+        citation["page"] = result['page_number']
+    elif result.get('timestamp'):
+        citation["timestamp"] = result['timestamp']
+
+    return citation
+
+
+def format_inline_citation(citation: Dict[str, Any]) -> str:
+    """Render a citation in the inline form shown to students, without parentheses."""
+    document = citation.get("document", "Unknown")
+    if citation.get("page") is not None:
+        return f"{document}, Page {citation['page']}"
+    if citation.get("timestamp"):
+        return f"{document}, {citation['timestamp']}"
+    return document
+
+
+def resolve_citations(
+    answer: str,
+    citations: List[Dict[str, Any]]
+) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Replace chunk-ID citations in an answer with readable inline citations.
+
+    The answer is scanned once and each ID is looked up in a dict, so the cost
+    is linear in the answer length plus the number of citations. IDs that were
+    not in the context are dropped from the text.
+
+    Args:
+        answer: Generated answer citing chunk IDs such as [C1] or [C2, C3]
+        citations: Citations from build_context, each with an "id"
+
+    Returns:
+        Tuple of (answer with inline citations, cited citations in first-use order)
+    """
+    by_id = {citation["id"].upper(): citation for citation in citations if citation.get("id")}
+    cited: Dict[str, Dict[str, Any]] = {}
+
+    def _replace(match: "re.Match") -> str:
+        labels = []
+        for chunk_id in _ID_SPLIT.split(match.group(2)):
+            citation: Optional[Dict[str, Any]] = by_id.get(chunk_id.upper())
+            if citation is None:
+                continue
+            if citation["id"] not in cited:
+                cited[citation["id"]] = citation
+            label = format_inline_citation(citation)
+            if label not in labels:
+                labels.append(label)
+        if not labels:
+            return ""
+        return f"{' ' if match.group(1) else ''}({'; '.join(labels)})"
+
+    resolved = CHUNK_ID_PATTERN.sub(_replace, answer)
+
+    return resolved, list(cited.values())
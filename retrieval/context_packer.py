@@ -0,0 +1,176 @@
+"""Token-budgeted packing of retrieved chunks into LLM context."""
+
+import re
+import logging
+from typing import List, Dict, Any, Optional, Set, Tuple
+from config.settings import OPENAI_MODEL, CONTEXT_TOKEN_BUDGET
+from utils.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+SHINGLE_SIZE = 8  # Words per shingle used to detect repeated text
+MIN_DUPLICATE_RUN = 20  # Repeated runs shorter than this are kept (common phrases)
+MIN_NEW_WORDS = 10  # Chunks adding fewer new words than this are dropped as duplicates
+
+_WORD_PATTERN = re.compile(r"\S+")
+
+
+def rank_score(result: Dict[str, Any]) -> float:
+    """Get the best available ranking score for a retrieved chunk."""
+    for field in ("rerank_score", "fusion_score", "score"):
+        if result.get(field) is not None:
+            return result[field]
+    return 0.0
+
+
+def source_label(result: Dict[str, Any]) -> str:
+    """Build the source identifier shown to the model for a chunk."""
+    source_parts = []
+    if result.get('module_name'):
+        source_parts.append(f"Module: {result['module_name']}")
+    source_parts.append(f"Document: {result['document_name']}")
+
+    # Add page number or timestamp
+    if result.get('page_number'):
+        source_parts.append(f"Page {result['page_number']}")
+    elif result.get('timestamp'):
+        source_parts.append(f"Timestamp: {result['timestamp']}")
+
+    return ", ".join(source_parts)
+
+
+def format_source(chunk_id: str, result: Dict[str, Any]) -> str:
+    """Format one packed source as it appears in the prompt context."""
+    return f"[{chunk_id}] {source_label(result)}:\n{result['content']}\n"
+
+
+class ContextPacker:
+    """Selects, deduplicates and merges chunks to fit a prompt token budget."""
+
+    def __init__(self, token_budget: Optional[int] = CONTEXT_TOKEN_BUDGET, model: str = OPENAI_MODEL):
+        """
+        Initialize the packer.
+
+        Args:
+            token_budget: Maximum context tokens, or None for no cap
+            model: Model whose tokenizer is used to count tokens
+        """
+        self.token_budget = token_budget
+        self.model = model
+
+    def _remove_seen_text(self, text: str, seen_shingles: Set[Tuple[str, ...]]) -> Tuple[str, int, int]:
+        """
+        Cut runs of words already present in previously packed chunks.
+
+        Returns:
+            The remaining text, the number of words kept and the original word count
+        """
+        matches = list(_WORD_PATTERN.finditer(text))
+        words = [m.group().lower() for m in matches]
+        covered = [False] * len(words)
+
+        for i in range(len(words) - SHINGLE_SIZE + 1):
+            if tuple(words[i:i + SHINGLE_SIZE]) in seen_shingles:
+                for j in range(i, i + SHINGLE_SIZE):
+                    covered[j] = True
+
+        parts = []
+        kept_words = 0
+        cursor = 0
+        i = 0
+        while i < len(words):
+            if not covered[i]:
+                kept_words += 1
+                i += 1
+                continue
+            run_end = i
+            while run_end < len(words) and covered[run_end]:
+                run_end += 1
+            if run_end - i >= MIN_DUPLICATE_RUN:
+                parts.append(text[cursor:matches[i].start()])
+                parts.append("... ")
+                cursor = matches[run_end - 1].end()
+            else:
+                kept_words += run_end - i
+            i = run_end
+        parts.append(text[cursor:])
+
+        return "".join(parts).strip(), kept_words, len(words)
+
+    @staticmethod
+    def _add_shingles(text: str, seen_shingles: Set[Tuple[str, ...]]):
+        """Record the shingles of packed text."""
+        words = [w.lower() for w in _WORD_PATTERN.findall(text)]
+        for i in range(len(words) - SHINGLE_SIZE + 1):
+            seen_shingles.add(tuple(words[i:i + SHINGLE_SIZE]))
+
+    @staticmethod
+    def _merge_key(result: Dict[str, Any]) -> Optional[Tuple]:
+        """Key of the page whose adjacent chunks are merged."""
+        if result.get('page_number') and result.get('chunk_index') is not None:
+            return (result.get('module_name'), result.get('document_name'), result['page_number'])
+        return None
+
+    @staticmethod
+    def _adjacent_entry(entries: List[Dict[str, Any]], chunk_index: int) -> Optional[Dict[str, Any]]:
+        """Find a packed source on the same page whose chunks directly precede or follow chunk_index."""
+        for entry in entries:
+            indices = entry['_parts'].keys()
+            if chunk_index - 1 in indices or chunk_index + 1 in indices:
+                return entry
+        return None
+
+    def pack(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Greedily fill the token budget with the highest-scoring chunks.
+
+        Text already included from an overlapping chunk is cut, and
+        consecutive chunks from the same page are merged into a single source
+        with their text in page order.
+
+        Args:
+            results: Retrieved chunks
+
+        Returns:
+            Packed sources in score order, each with "content" and source metadata
+        """
+        ranked = sorted(results, key=rank_score, reverse=True)
+        seen_shingles: Set[Tuple[str, ...]] = set()
+        packed: List[Dict[str, Any]] = []
+        by_key: Dict[Tuple, List[Dict[str, Any]]] = {}
+        used_tokens = 0
+
+        for result in ranked:
+            text, new_words, total_words = self._remove_seen_text(result.get('content', ''), seen_shingles)
+            if new_words == 0 or (new_words < MIN_NEW_WORDS and new_words < total_words):
+                continue
+
+            merge_key = self._merge_key(result)
+            merged_into = self._adjacent_entry(by_key.get(merge_key, []), result['chunk_index']) if merge_key else None
+            # A merged chunk only adds its text; a new source is priced as build_context
+            # formats it (an upper bound on its chunk ID), plus the separating newline
+            if merged_into:
+                cost_text = f"\n{text}"
+            else:
+                cost_text = format_source(f"C{len(packed) + 1}", {**result, 'content': text}) + "\n"
+            cost = count_tokens(cost_text, self.model)
+            if self.token_budget is not None and packed and used_tokens + cost > self.token_budget:
+                continue
+
+            if merged_into:
+                merged_into['_parts'][result['chunk_index']] = text
+                merged_into['content'] = "\n".join(part for _, part in sorted(merged_into['_parts'].items()))
+            else:
+                entry = {**result, 'content': text}
+                packed.append(entry)
+                if merge_key:
+                    entry['_parts'] = {result['chunk_index']: text}
+                    by_key.setdefault(merge_key, []).append(entry)
+
+            used_tokens += cost
+            self._add_shingles(text, seen_shingles)
+
+        for entry in packed:
+            entry.pop('_parts', None)
+        logger.info(f"Packed {len(results)} chunks into {len(packed)} sources using ~{used_tokens} tokens (budget: {self.token_budget})")
+        return packed
@@ -3,10 +3,8 @@
 import os
 from typing import List, Dict, Any
 from pathlib import Path
-import pdfplumber
-from unstructured.partition.pdf import partition_pdf
 import logging
-import yaml
+from config.prompts import get_prompt_config
 
 logger = logging.getLogger(__name__)
 
@@ -32,12 +30,12 @@ class MultimodalPDFLoader:
             raise FileNotFoundError(f"Document not found: {document_path}")
         
         # Load config
-        config_path = Path(__file__).parent.parent / "config" / "prompts.yaml"
-        with open(config_path, 'r') as f:
-            self.config = yaml.safe_load(f)
+        self.config = get_prompt_config()
     
     def extract_tables_with_pdfplumber(self) -> List[Dict[str, Any]]:
         """Extract tables using pdfplumber (more reliable for tables)."""
+        import pdfplumber
+        
         table_chunks = []
         
         try:
@@ -120,6 +118,8 @@ class MultimodalPDFLoader:
     
     def extract_text_with_pages(self) -> List[Dict[str, Any]]:
         """Extract text with page numbers using pdfplumber - captures ALL text including figure/table references."""
+        import pdfplumber
+        
         chunks = []
         
         try:
@@ -234,6 +234,7 @@ class MultimodalPDFLoader:
         # Also try unstructured for additional content (but don't rely on it)
         try:
             logger.info("Trying unstructured for additional content...")
+            from unstructured.partition.pdf import partition_pdf
             elements = partition_pdf(
                 filename=self.document_path,
                 strategy="hi_res",
@@ -290,6 +291,8 @@ class MultimodalPDFLoader:
     ) -> List[Dict]:
         """Chunk documents with overlap, preserving tables and figures."""
         chunked_docs = []
+        # Tables and figures are numbered per page and type so their vector IDs stay unique
+        element_counts: Dict[tuple, int] = {}
         
         doc_config = self.config.get('document_processing', {})
         table_chunk_size = doc_config.get('table_chunk_size', 2000)
@@ -302,17 +305,23 @@ class MultimodalPDFLoader:
             # Don't chunk tables or figures - keep them intact
             if chunk_type == "table":
                 # Tables can be from pdfplumber extraction or text references
+                element_key = (chunk.get("page_number"), chunk_type)
+                element_counts[element_key] = element_counts.get(element_key, 0) + 1
                 chunked_docs.append({
                     **chunk,
-                    "chunk_index": 0
+                    "chunk_index": 0,
+                    "element_index": element_counts[element_key]
                 })
                 continue
             
             if chunk_type in ["figure", "image", "figure_context"]:
                 # Don't chunk figures - keep them intact
+                element_key = (chunk.get("page_number"), chunk_type)
+                element_counts[element_key] = element_counts.get(element_key, 0) + 1
                 chunked_docs.append({
                     **chunk,
-                    "chunk_index": 0
+                    "chunk_index": 0,
+                    "element_index": element_counts[element_key]
                 })
                 continue
             
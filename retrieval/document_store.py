@@ -0,0 +1,108 @@
+"""Local SQLite store for full chunk text, keyed by vector ID."""
+
+import json
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import List, Dict, Any, Iterable, Tuple
+from config.settings import DOCUMENT_STORE_PATH
+
+logger = logging.getLogger(__name__)
+
+# SQLite limits the number of bound parameters per statement
+_MAX_IDS_PER_QUERY = 500
+
+
+class DocumentStore:
+    """Stores chunk text and metadata outside Pinecone so queries only ship IDs and scores."""
+
+    def __init__(self, path: Path = DOCUMENT_STORE_PATH):
+        """
+        Open (and create if needed) the document store.
+
+        Args:
+            path: SQLite database file
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS chunks (
+                id TEXT PRIMARY KEY,
+                course_name TEXT NOT NULL,
+                metadata TEXT NOT NULL,
+                content TEXT NOT NULL
+            )"""
+        )
+        self._conn.commit()
+
+    def put_many(self, rows: Iterable[Tuple[str, str, Dict[str, Any], str]]):
+        """
+        Insert or replace chunks.
+
+        Args:
+            rows: (vector_id, course_name, metadata, content) tuples
+        """
+        params = [
+            (vector_id, course_name, json.dumps(metadata), content)
+            for vector_id, course_name, metadata, content in rows
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (id, course_name, metadata, content) VALUES (?, ?, ?, ?)",
+                params
+            )
+            self._conn.commit()
+        logger.info(f"Stored {len(params)} chunks in local document store")
+
+    def get_many(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Fetch chunks by vector ID in batched reads.
+
+        Args:
+            ids: Vector IDs to fetch
+
+        Returns:
+            Mapping of vector ID to its metadata with the full "content"
+        """
+        found = {}
+        ids = list(dict.fromkeys(ids))
+        with self._lock:
+            for start in range(0, len(ids), _MAX_IDS_PER_QUERY):
+                batch = ids[start:start + _MAX_IDS_PER_QUERY]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT id, metadata, content FROM chunks WHERE id IN ({placeholders})",
+                    batch
+                ).fetchall()
+                for vector_id, metadata, content in rows:
+                    found[vector_id] = {**json.loads(metadata), "content": content}
+        return found
+
+    def delete_course(self, course_name: str):
+        """Remove every chunk stored for a course."""
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks WHERE course_name = ?", (course_name,))
+            self._conn.commit()
+
+    def clear(self):
+        """Remove every stored chunk."""
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks")
+            self._conn.commit()
+
+
+_document_store = None
+_document_store_lock = threading.Lock()
+
+
+def get_document_store() -> DocumentStore:
+    """Get the process-wide document store, opening it on first use."""
+    global _document_store
+    with _document_store_lock:
+        if _document_store is None:
+            _document_store = DocumentStore()
+        return _document_store
@@ -0,0 +1,235 @@
+"""Exact metadata index for module, document, table, figure and page lookups."""
+
+import json
+import re
+import logging
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Set
+from utils.paths import course_index_dir
+from utils.artifact_cache import load_cached_artifact
+
+logger = logging.getLogger(__name__)
+
+METADATA_INDEX_FILENAME = "metadata.json"
+
+# Metadata fields copied from ingested chunks into the index records
+RECORD_FIELDS = [
+    "course_name", "module_name", "document_name", "type",
+    "chunk_index", "page_number", "timestamp", "is_reference", "citation_density"
+]
+
+_MODULE_NAME_PATTERN = re.compile(r'module\s*(\d+)', re.IGNORECASE)
+
+# Structured references a student can make in a question
+_QUERY_PATTERNS = {
+    "module": re.compile(r'\bmodule\s*(\d+)\b', re.IGNORECASE),
+    "table": re.compile(r'\b(?:table|tab\.)\s*(\d+)\b', re.IGNORECASE),
+    "figure": re.compile(r'\b(?:figure|fig\.)\s*(\d+)\b', re.IGNORECASE),
+    "page": re.compile(r'\bpage\s*(\d+)\b', re.IGNORECASE),
+}
+
+
+def parse_structured_query(query: str) -> Dict[str, str]:
+    """
+    Extract module, table, figure and page numbers referenced in a query.
+
+    Args:
+        query: User's question
+
+    Returns:
+        Mapping of reference kind to number, e.g. {"module": "3"}
+    """
+    references = {}
+    for kind, pattern in _QUERY_PATTERNS.items():
+        match = pattern.search(query)
+        if match:
+            references[kind] = match.group(1)
+    return references
+
+
+# Words that leave a question a plain request for a module's, table's or figure's contents
+_LISTING_WORDS = {
+    "what", "whats", "what's", "is", "are", "was", "in", "inside", "the", "of", "on", "from", "for",
+    "a", "an", "this", "that", "there", "me", "please", "can", "you", "i", "see", "show", "display",
+    "list", "give", "get", "find", "open", "which", "all", "does", "do", "cover", "covers", "covered",
+    "contain", "contains", "content", "contents", "topic", "topics", "overview", "summary", "summarize",
+    "about", "and", "course",
+}
+_WORD_PATTERN = re.compile(r"[a-z']+")
+
+
+def is_pure_structured_query(query: str) -> bool:
+    """
+    Check whether a query only asks for referenced modules, tables or figures as a whole.
+
+    "show table 2" or "what's in module 3" qualify; "explain attention in
+    module 2" does not, since it asks about a topic within the module.
+
+    Args:
+        query: User's question
+
+    Returns:
+        True if the query references a module, table or figure and nothing else of substance
+    """
+    references = parse_structured_query(query)
+    if not any(kind in references for kind in ("module", "table", "figure")):
+        return False
+    remainder = query
+    for pattern in _QUERY_PATTERNS.values():
+        remainder = pattern.sub(" ", remainder)
+    return all(word in _LISTING_WORDS for word in _WORD_PATTERN.findall(remainder.lower()))
+
+
+class MetadataIndex:
+    """Maps (module, document, table, figure, page) keys to chunk IDs for a course."""
+
+    def __init__(self):
+        """Initialize an empty index."""
+        self.records: Dict[str, Dict[str, Any]] = {}
+        self.by_module: Dict[str, Set[str]] = {}
+        self.by_document: Dict[str, Set[str]] = {}
+        self.by_table: Dict[str, Set[str]] = {}
+        self.by_figure: Dict[str, Set[str]] = {}
+        self.by_page: Dict[str, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def add_documents(self, documents: List[Dict[str, Any]]):
+        """
+        Add ingested chunks to the index.
+
+        Table and figure numbers come from the reference chunks produced by
+        extract_table_references_from_text and extract_figures_from_text.
+
+        Args:
+            documents: Chunks produced by the document loaders
+        """
+        from retrieval.vector_store import build_vector_id
+
+        for doc in documents:
+            if not doc.get("content"):
+                continue
+            record = {field: doc.get(field) for field in RECORD_FIELDS if doc.get(field) is not None}
+            record["id"] = build_vector_id(doc)
+            record["content"] = doc["content"]
+            record["table_numbers"] = [str(n) for n in doc.get("table_numbers", [])]
+            record["figure_numbers"] = [str(n) for n in doc.get("figure_numbers", [])]
+            self._add_record(record)
+
+    def _add_record(self, record: Dict[str, Any]):
+        """Register a record under each of its lookup keys."""
+        vector_id = record["id"]
+        self.records[vector_id] = record
+
+        module_match = _MODULE_NAME_PATTERN.search(record.get("module_name") or "")
+        if module_match:
+            self.by_module.setdefault(module_match.group(1), set()).add(vector_id)
+        if record.get("document_name"):
+            self.by_document.setdefault(record["document_name"].lower(), set()).add(vector_id)
+        if record.get("page_number"):
+            self.by_page.setdefault(str(record["page_number"]), set()).add(vector_id)
+        for table_num in record.get("table_numbers", []):
+            self.by_table.setdefault(table_num, set()).add(vector_id)
+        for figure_num in record.get("figure_numbers", []):
+            self.by_figure.setdefault(figure_num, set()).add(vector_id)
+
+    def lookup(
+        self,
+        module: Optional[str] = None,
+        document: Optional[str] = None,
+        table: Optional[str] = None,
+        figure: Optional[str] = None,
+        page: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Find chunks matching every given key.
+
+        Args:
+            module: Module number
+            document: Document name (case-insensitive)
+            table: Table number
+            figure: Figure number
+            page: Page number
+
+        Returns:
+            Matching chunk records ordered by module, document, page and chunk index
+        """
+        key_sets = []
+        if module is not None:
+            key_sets.append(self.by_module.get(str(module), set()))
+        if document is not None:
+            key_sets.append(self.by_document.get(document.lower(), set()))
+        if table is not None:
+            key_sets.append(self.by_table.get(str(table), set()))
+        if figure is not None:
+            key_sets.append(self.by_figure.get(str(figure), set()))
+        if page is not None:
+            key_sets.append(self.by_page.get(str(page), set()))
+
+        if not key_sets:
+            return []
+
+        matching_ids = set.intersection(*key_sets)
+        records = [self.records[vector_id] for vector_id in matching_ids]
+        records.sort(key=lambda r: (
+            r.get("module_name") or "",
+            r.get("document_name") or "",
+            r.get("page_number") or 0,
+            r.get("timestamp") or "",
+            r.get("chunk_index") or 0
+        ))
+        return records
+
+    def save(self, path: Path):
+        """Persist the index records to a JSON file."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"records": list(self.records.values())}, f)
+        logger.info(f"Saved metadata index with {len(self.records)} chunks to {path}")
+
+    @classmethod
+    def load(cls, path: Path) -> "MetadataIndex":
+        """Load an index saved with save() and rebuild its lookup keys."""
+        with open(path, 'r', encoding='utf-8') as f:
+            payload = json.load(f)
+        index = cls()
+        for record in payload.get("records", []):
+            index._add_record(record)
+        return index
+
+
+def metadata_index_path(course_name: str) -> Path:
+    """Get the on-disk location of a course's metadata index."""
+    return course_index_dir(course_name) / METADATA_INDEX_FILENAME
+
+
+def build_course_metadata_index(course_name: str, documents: List[Dict[str, Any]]) -> MetadataIndex:
+    """
+    Build and save the metadata index for a course from its ingested chunks.
+
+    Args:
+        course_name: Name of the course
+        documents: All chunks ingested for the course
+
+    Returns:
+        The built index
+    """
+    index = MetadataIndex()
+    index.add_documents(documents)
+    index.save(metadata_index_path(course_name))
+    return index
+
+
+def load_course_metadata_index(course_name: str) -> Optional[MetadataIndex]:
+    """
+    Load a course's metadata index, reusing the cached copy when unchanged.
+
+    Args:
+        course_name: Name of the course
+
+    Returns:
+        The index, or None if it has not been built for this course
+    """
+    return load_cached_artifact(metadata_index_path(course_name.strip()), MetadataIndex.load)
@@ -0,0 +1,144 @@
+"""Local cross-encoder reranking of retrieved course chunks."""
+
+import logging
+import threading
+import time
+from typing import List, Dict, Any, Optional
+from config.settings import (
+    RERANKER_ENABLED,
+    RERANKER_MODEL,
+    RERANK_BATCH_SIZE,
+    RERANK_TOKEN_BUDGET
+)
+from utils.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class CrossEncoderReranker:
+    """Scores (query, chunk) pairs with a small CPU cross-encoder and keeps the best chunks."""
+
+    def __init__(self, model_name: str = RERANKER_MODEL, batch_size: int = RERANK_BATCH_SIZE):
+        """
+        Initialize the reranker.
+
+        Args:
+            model_name: Cross-encoder model to load
+            batch_size: Number of pairs scored per forward pass
+        """
+        # Imported here so torch is only loaded when reranking is enabled
+        from sentence_transformers import CrossEncoder
+        
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.model = CrossEncoder(model_name, device="cpu")
+        logger.info(f"Loaded cross-encoder reranker: {model_name}")
+
+    def rerank(
+        self,
+        query: str,
+        chunks: List[Dict[str, Any]],
+        token_budget: int = RERANK_TOKEN_BUDGET
+    ) -> List[Dict[str, Any]]:
+        """
+        Reorder chunks by cross-encoder score and keep the best within a token budget.
+
+        Args:
+            query: User's question
+            chunks: Candidate chunks
+            token_budget: Maximum total content tokens to keep
+
+        Returns:
+            Best chunks in descending score order, each with a "rerank_score"
+        """
+        if not chunks:
+            return []
+
+        pairs = [(query, chunk.get("content", "")) for chunk in chunks]
+        scores = self.model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+
+        ranked = sorted(
+            ({**chunk, "rerank_score": float(score)} for chunk, score in zip(chunks, scores)),
+            key=lambda c: c["rerank_score"],
+            reverse=True
+        )
+
+        kept = []
+        used_tokens = 0
+        for chunk in ranked:
+            chunk_tokens = count_tokens(chunk.get("content", ""))
+            # Always keep the best chunk, even if it alone exceeds the budget
+            if kept and used_tokens + chunk_tokens > token_budget:
+                continue
+            kept.append(chunk)
+            used_tokens += chunk_tokens
+
+        return kept
+
+
+_reranker: Optional[CrossEncoderReranker] = None
+_reranker_failed = False
+_reranker_lock = threading.Lock()
+
+
+def get_reranker() -> Optional[CrossEncoderReranker]:
+    """
+    Get the shared reranker, loading the model on first use.
+
+    Returns:
+        The reranker, or None if reranking is disabled or unavailable
+    """
+    global _reranker, _reranker_failed
+    if not RERANKER_ENABLED or _reranker_failed:
+        return None
+
+    with _reranker_lock:
+        if _reranker is None:
+            try:
+                _reranker = CrossEncoderReranker()
+            except ImportError:
+                logger.warning("sentence-transformers not installed. Reranking will be disabled. Install with: pip install sentence-transformers")
+                _reranker_failed = True
+                return None
+            except Exception as e:
+                logger.error(f"Error loading reranker model {RERANKER_MODEL}: {e}")
+                _reranker_failed = True
+                return None
+        return _reranker
+
+
+def rerank_with_stats(
+    reranker: CrossEncoderReranker,
+    query: str,
+    chunks: List[Dict[str, Any]],
+    format_context
+) -> List[Dict[str, Any]]:
+    """
+    Rerank chunks and log the prompt context size before and after, with timing.
+
+    Args:
+        reranker: Reranker to use
+        query: User's question
+        chunks: Candidate chunks
+        format_context: Function that formats chunks into the prompt context
+            (called with token_budget=None for the size without reranking)
+
+    Returns:
+        Reranked chunks, or the original chunks if reranking fails
+    """
+    # Size of the full candidate set; with the default budget it would already be truncated
+    before_tokens = count_tokens(format_context(chunks, token_budget=None))
+    start = time.perf_counter()
+    try:
+        reranked = reranker.rerank(query, chunks)
+    except Exception as e:
+        logger.error(f"Error reranking chunks: {e}")
+        return chunks
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    after_tokens = count_tokens(format_context(reranked))
+
+    logger.info(
+        f"Reranked {len(chunks)} -> {len(reranked)} chunks in {elapsed_ms:.0f} ms; "
+        f"context tokens {before_tokens} -> {after_tokens}"
+    )
+    return reranked
@@ -1,25 +1,96 @@
 """Course-specific content retriever from vector store."""
 
 import logging
-from typing import List, Dict, Any
-from retrieval.vector_store import PineconeVectorStore
-from config.settings import TOP_K_RESULTS
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+from retrieval.vector_store import PineconeVectorStore, embed_texts
+from retrieval.bm25_index import load_course_bm25_index
+from retrieval.metadata_index import load_course_metadata_index, parse_structured_query, is_pure_structured_query
+from retrieval.context_packer import ContextPacker, format_source
+from retrieval.citation_resolver import citation_key, make_citation
+from config.settings import (
+    TOP_K_RESULTS,
+    HYBRID_SEARCH_ENABLED,
+    HYBRID_RRF_K,
+    CONTEXT_TOKEN_BUDGET,
+    RETRIEVAL_CACHE_SIZE,
+    RETRIEVAL_CACHE_TTL,
+    PREFETCH_MATCH_SIMILARITY
+)
+from utils.lru_cache import LRUCache
 
 logger = logging.getLogger(__name__)
 
+# Shared pool so dense and lexical searches run side by side
+_search_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="hybrid-search")
+
+# Recent retrievals shared across turns, warmed by the follow-up prefetcher
+_retrieval_cache = LRUCache(RETRIEVAL_CACHE_SIZE, ttl=RETRIEVAL_CACHE_TTL)
+
+# Embeddings of prefetched follow-up questions, keyed like the retrieval cache, so
+# a differently worded question can reuse a prefetched retrieval
+_prefetched_queries = LRUCache(RETRIEVAL_CACHE_SIZE, ttl=RETRIEVAL_CACHE_TTL)
+
+
+def reciprocal_rank_fusion(
+    result_lists: List[List[Dict[str, Any]]],
+    k: int = HYBRID_RRF_K
+) -> List[Dict[str, Any]]:
+    """
+    Fuse ranked result lists with reciprocal rank fusion.
+    
+    Results are matched by vector ID. The dense similarity is kept as "score"
+    (0.0 for lexical-only hits) and the fused value is stored as "fusion_score".
+    
+    Args:
+        result_lists: Ranked result lists from each retriever
+        k: RRF constant; larger values flatten the contribution of top ranks
+        
+    Returns:
+        Fused results ordered by fusion score
+    """
+    fused: Dict[str, Dict[str, Any]] = {}
+    for results in result_lists:
+        for rank, result in enumerate(results, 1):
+            key = result.get("id") or result.get("content", "")[:100]
+            if key not in fused:
+                fused[key] = {**result, "fusion_score": 0.0}
+                fused[key].setdefault("score", 0.0)
+            else:
+                # Keep the dense score and fill in any fields the other list lacks
+                for field, value in result.items():
+                    fused[key].setdefault(field, value)
+            fused[key]["fusion_score"] += 1.0 / (k + rank)
+    
+    return sorted(fused.values(), key=lambda r: r["fusion_score"], reverse=True)
+
 
 class CourseRetriever:
     """Retrieves course-specific content from vector store."""
     
-    def __init__(self):
-        """Initialize the retriever with vector store."""
+    def __init__(self, hybrid: bool = HYBRID_SEARCH_ENABLED):
+        """
+        Initialize the retriever with vector store.
+        
+        Args:
+            hybrid: Fuse dense results with the course's local BM25 index when available
+        """
         self.vector_store = PineconeVectorStore()
+        self.hybrid = hybrid
+    
+    def has_lexical_index(self, course_name: str) -> bool:
+        """Check whether hybrid retrieval is active for a course."""
+        return self.hybrid and load_course_bm25_index(course_name) is not None
     
     def retrieve(
         self,
         query: str,
         course_name: str,
-        top_k: int = None
+        top_k: int = None,
+        exclude_references: bool = False,
+        prefetch: bool = False
     ) -> List[Dict[str, Any]]:
         """
         Retrieve relevant chunks for a course-specific query.
@@ -28,6 +99,8 @@ class CourseRetriever:
             query: The user's query
             course_name: Name of the course to filter by
             top_k: Number of results to return (defaults to config setting)
+            exclude_references: Skip chunks flagged as reference/bibliography sections at ingestion
+            prefetch: The query is a predicted follow-up; let similar questions reuse its results
             
         Returns:
             List of relevant document chunks
@@ -35,51 +108,270 @@ class CourseRetriever:
         if top_k is None:
             top_k = TOP_K_RESULTS
         
+        cache_key = (course_name.strip(), query.strip().lower(), top_k, exclude_references, self.hybrid)
+        cached = _retrieval_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"Retrieval cache hit for query: '{query}' in course: '{course_name}'")
+            return [dict(result) for result in cached]
+        
+        if not prefetch:
+            cached = self._match_prefetched(query, cache_key)
+            if cached is not None:
+                return [dict(result) for result in cached]
+        
         try:
+            lexical_index = load_course_bm25_index(course_name) if self.hybrid else None
+            
             logger.info(f"Querying vector store with course filter: '{course_name}', query: '{query}'")
-            results = self.vector_store.query(
-                query_text=query,
-                course_name=course_name,
-                top_k=top_k
-            )
+            if lexical_index is not None:
+                # Run dense and lexical searches concurrently and fuse the rankings;
+                # each runs in a copy of this context so it keeps the request deadline
+                dense_future = _search_executor.submit(
+                    contextvars.copy_context().run,
+                    self.vector_store.query,
+                    query_text=query,
+                    course_name=course_name,
+                    top_k=top_k,
+                    exclude_references=exclude_references
+                )
+                lexical_future = _search_executor.submit(
+                    contextvars.copy_context().run,
+                    lexical_index.search, query, top_k, exclude_references=exclude_references
+                )
+                try:
+                    lexical_results = lexical_future.result()
+                except Exception as e:
+                    logger.warning(f"Lexical search failed, using dense results only: {e}")
+                    lexical_results = []
+                try:
+                    dense_results = dense_future.result()
+                except Exception as e:
+                    logger.warning(f"Dense search failed, using lexical results only: {e}")
+                    dense_results = []
+                results = reciprocal_rank_fusion([dense_results, lexical_results])[:top_k]
+                logger.info(f"Hybrid search: {len(dense_results)} dense + {len(lexical_results)} lexical results fused to {len(results)}")
+            else:
+                results = self.vector_store.query(
+                    query_text=query,
+                    course_name=course_name,
+                    top_k=top_k,
+                    exclude_references=exclude_references
+                )
             logger.info(f"Vector store returned {len(results)} results")
             if results:
                 logger.info(f"Top result: score={results[0].get('score', 'N/A'):.4f}, doc={results[0].get('document_name', 'N/A')}, page={results[0].get('page_number', 'N/A')}")
                 logger.info(f"Top result content preview: {results[0].get('content', '')[:150]}...")
             else:
                 logger.warning(f"No results found for query: '{query}' in course: '{course_name}'")
+            if results:
+                _retrieval_cache.put(cache_key, [dict(result) for result in results])
+                if prefetch:
+                    _prefetched_queries.put(cache_key, embed_texts([query])[0])
             return results
         except Exception as e:
             logger.error(f"Error retrieving documents: {e}", exc_info=True)
             return []
     
-    def format_context(self, results: List[Dict[str, Any]]) -> str:
-        """Format retrieved chunks as context for LLM."""
-        if not results:
-            return ""
+    def _match_prefetched(self, query: str, cache_key: Tuple) -> Optional[List[Dict[str, Any]]]:
+        """
+        Find a prefetched retrieval for a question worded like the query.
         
-        context_parts = []
+        The query embedding computed here is cached, so the dense search
+        reuses it when there is no match.
+        
+        Args:
+            query: The user's query
+            cache_key: The query's retrieval cache key
+            
+        Returns:
+            The prefetched results, or None if no prefetched question is similar enough
+        """
+        candidates = [
+            (key, embedding) for key, embedding in _prefetched_queries.items()
+            if key[0] == cache_key[0] and key[2:] == cache_key[2:]
+        ]
+        if not candidates:
+            return None
+        
+        try:
+            query_embedding = np.asarray(embed_texts([query])[0], dtype=float)
+        except Exception as e:
+            logger.warning(f"Could not embed query to match prefetched retrievals: {e}")
+            return None
+        
+        embeddings = np.asarray([embedding for _, embedding in candidates], dtype=float)
+        norms = np.linalg.norm(embeddings, axis=1) * np.linalg.norm(query_embedding)
+        similarity = embeddings @ query_embedding / np.where(norms == 0, 1.0, norms)
+        best = int(np.argmax(similarity))
+        if similarity[best] < PREFETCH_MATCH_SIMILARITY:
+            return None
+        
+        cached = _retrieval_cache.get(candidates[best][0])
+        if cached is not None:
+            logger.info(f"Prefetched retrieval hit for query: '{query}' (matched '{candidates[best][0][1]}', similarity {similarity[best]:.3f})")
+        return cached
+    
+    def lookup_structured(
+        self,
+        query: str,
+        course_name: str,
+        top_k: int = None,
+        exclude_references: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Answer plain module, table and figure requests by direct metadata lookup.
+        
+        Makes no embedding calls. Only queries that ask for the referenced
+        items as a whole ("show table 2", "what's in module 3") are answered
+        this way; questions about a topic within a module go through
+        retrieval and prefer_structured instead. Page numbers narrow the
+        lookup but are not used on their own since they are ambiguous across
+        documents.
+        
+        Args:
+            query: The user's query
+            course_name: Name of the course
+            top_k: Maximum number of chunks to return (defaults to config setting)
+            exclude_references: Skip chunks flagged as reference/bibliography sections at ingestion
+            
+        Returns:
+            Matching chunks, or an empty list if the query is not a plain structured request
+        """
+        if top_k is None:
+            top_k = TOP_K_RESULTS
+        
+        if not is_pure_structured_query(query):
+            return []
+        records = self._structured_records(query, course_name, exclude_references)
+        if not records:
+            return []
+        
+        # Rank within the exact matches lexically when there are more than requested
+        lexical_index = load_course_bm25_index(course_name) if self.hybrid else None
+        if lexical_index is not None and len(records) > top_k:
+            ranked_ids = [r["id"] for r in lexical_index.search(
+                query, top_k=top_k, candidate_ids=[r["id"] for r in records]
+            )]
+            by_id = {r["id"]: r for r in records}
+            records = [by_id[i] for i in ranked_ids] + [r for r in records if r["id"] not in ranked_ids]
+        
+        # Exact matches have no similarity score (dense_scores ignores 0.0)
+        results = [{**record, "score": 0.0, "match_type": "metadata"} for record in records[:top_k]]
+        logger.info(f"Metadata index lookup returned {len(results)} of {len(records)} matching chunks")
+        return results
+    
+    def prefer_structured(
+        self,
+        query: str,
+        course_name: str,
+        results: List[Dict[str, Any]],
+        top_k: int,
+        exclude_references: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Keep retrieved chunks from the modules, tables or figures a query names ahead of the rest.
+        
+        Results keep their retrieval scores; chunks matching the metadata index
+        are kept first when the candidates are cut to top_k.
+        
+        Args:
+            query: The user's query
+            course_name: Name of the course
+            results: Dense or hybrid retrieval results, best first
+            top_k: Number of results to keep
+            exclude_references: Skip chunks flagged as reference/bibliography sections at ingestion
+            
+        Returns:
+            Up to top_k results, metadata matches first
+        """
+        records = self._structured_records(query, course_name, exclude_references)
+        if not records:
+            return results[:top_k]
+        matching_ids = {record["id"] for record in records}
+        matching = [result for result in results if result.get("id") in matching_ids]
+        others = [result for result in results if result.get("id") not in matching_ids]
+        logger.info(f"{len(matching)} of {len(results)} retrieved chunks match the referenced module, table or figure")
+        return (matching + others)[:top_k]
+    
+    def _structured_records(self, query: str, course_name: str, exclude_references: bool) -> List[Dict[str, Any]]:
+        """Metadata index records for the modules, tables and figures a query references."""
+        references = parse_structured_query(query)
+        if not any(kind in references for kind in ("module", "table", "figure")):
+            return []
+        
+        metadata_index = load_course_metadata_index(course_name)
+        if metadata_index is None:
+            return []
+        
+        records = metadata_index.lookup(**references)
+        if not records and "page" in references:
+            references.pop("page")
+            records = metadata_index.lookup(**references)
+        if exclude_references:
+            records = [r for r in records if not r.get("is_reference")]
+        if not records:
+            logger.info(f"No metadata index entries for {references} in course '{course_name}'")
+        return records
+    
+    def format_context(
+        self,
+        results: List[Dict[str, Any]],
+        token_budget: Optional[int] = CONTEXT_TOKEN_BUDGET
+    ) -> str:
+        """
+        Format retrieved chunks as context for LLM.
+        
+        Chunks are packed into the token budget by score, with overlapping
+        text removed and consecutive chunks from the same page merged.
+        
+        Args:
+            results: Retrieved chunks
+            token_budget: Maximum context tokens, or None for no cap
+            
+        Returns:
+            Formatted context string
+        """
+        context, _ = self.build_context(results, token_budget)
+        return context
+    
+    def build_context(
+        self,
+        results: List[Dict[str, Any]],
+        token_budget: Optional[int] = CONTEXT_TOKEN_BUDGET
+    ) -> Tuple[str, List[Dict[str, Any]]]:
+        """
+        Format retrieved chunks as context, labelling each source with a chunk ID.
         
-        for i, result in enumerate(results, 1):
-            # Build source identifier
-            source_parts = []
-            if result.get('module_name'):
-                source_parts.append(f"Module: {result['module_name']}")
-            source_parts.append(f"Document: {result['document_name']}")
+        Every packed chunk is prefixed with a compact ID such as [C1] that the
+        model can cite; chunks from the same source share an ID. The returned
+        citations carry the same IDs so cited IDs resolve with a dict lookup.
+        
+        Args:
+            results: Retrieved chunks
+            token_budget: Maximum context tokens, or None for no cap
             
-            # Add page number or timestamp
-            if result.get('page_number'):
-                source_parts.append(f"Page {result['page_number']}")
-            elif result.get('timestamp'):
-                source_parts.append(f"Timestamp: {result['timestamp']}")
+        Returns:
+            Tuple of (formatted context string, citations with their chunk IDs)
+        """
+        if not results:
+            return "", []
+        
+        packed = ContextPacker(token_budget=token_budget).pack(results)
+        
+        context_parts = []
+        citations = []
+        ids_by_key = {}
+        for result in packed:
+            key = citation_key(result)
+            chunk_id = ids_by_key.get(key)
+            if chunk_id is None:
+                chunk_id = f"C{len(ids_by_key) + 1}"
+                ids_by_key[key] = chunk_id
+                citations.append({"id": chunk_id, **make_citation(result)})
             
-            source_info = ", ".join(source_parts)
-            context_parts.append(
-                f"[Source {i}] {source_info}:\n"
-                f"{result['content']}\n"
-            )
+            context_parts.append(format_source(chunk_id, result))
         
-        return "\n".join(context_parts)
+        return "\n".join(context_parts), citations
     
     def get_citations(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Extract unique citations from results."""
@@ -87,31 +379,9 @@ class CourseRetriever:
         seen = set()
         
         for result in results:
-            # Create citation key based on document type
-            if result.get('page_number'):
-                citation_key = (result['document_name'], result.get('module_name'), result['page_number'])
-            elif result.get('timestamp'):
-                citation_key = (result['document_name'], result.get('module_name'), result['timestamp'])
-            else:
-                citation_key = (result['document_name'], result.get('module_name'), None)
-            
-            if citation_key not in seen:
-                citation = {
-                    "document": result['document_name']
-                }
-                
-                # Add module if present
-                if result.get('module_name'):
-                    citation["module"] = result['module_name']
-                
-                # Add page or timestamp
-                if result.get('page_number'):
-                    citation["page"] = result['page_number']
-                elif result.get('timestamp'):
-                    citation["timestamp"] = result['timestamp']
-                
-                citations.append(citation)
-                seen.add(citation_key)
+            key = citation_key(result)
+            if key not in seen:
+                citations.append(make_citation(result))
+                seen.add(key)
         
         return citations
-
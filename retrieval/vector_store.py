@@ -1,19 +1,78 @@
 """Pinecone vector store integration for course materials."""
 
 import logging
+import threading
 from typing import List, Dict, Any
-from pinecone import Pinecone, ServerlessSpec
-from openai import OpenAI
 from config.settings import (
-    PINECONE_API_KEY,
     PINECONE_INDEX_NAME,
-    OPENAI_API_KEY,
     EMBEDDING_MODEL,
-    EMBEDDING_DIMENSION
+    EMBEDDING_DIMENSION,
+    DOCUMENT_STORE_ENABLED,
+    EMBEDDING_CACHE_SIZE,
+    CHUNK_CACHE_SIZE
 )
+from retrieval.document_store import get_document_store
+from retrieval.reference_filter import annotate_reference_metadata
+from utils.lru_cache import LRUCache
+from utils.http_clients import get_openai_client, get_pinecone_client
+from utils.resilience import call_upstream
 
 logger = logging.getLogger(__name__)
 
+# Shared across vector store instances so later turns (and the prefetcher) reuse them
+_embedding_cache = LRUCache(EMBEDDING_CACHE_SIZE)
+_chunk_cache = LRUCache(CHUNK_CACHE_SIZE)
+
+# The index handle owns a connection pool, so it is opened once per process
+_index = None
+_index_lock = threading.Lock()
+
+
+def build_vector_id(doc: Dict[str, Any]) -> str:
+    """
+    Build the unique vector ID for an ingested chunk.
+    
+    Handles both PDFs (with page_number) and transcripts (with timestamp).
+    Tables and figures include their type and per-page number, so they never
+    share an ID with the text chunks (or each other) on the same page.
+    Local side indexes use the same IDs so their hits can be matched to Pinecone's.
+    """
+    prefix = f"{doc['course_name']}_{doc.get('module_name', '')}_{doc['document_name']}_"
+    chunk_type = doc.get("type", "text")
+    if chunk_type in ("table", "figure", "image", "figure_context"):
+        element_index = doc.get("element_index") or doc.get("table_index") or doc.get("chunk_index", 0)
+        return f"{prefix}page{doc.get('page_number') or 0}_{chunk_type}{element_index}"
+    if "page_number" in doc and doc["page_number"]:
+        return f"{prefix}page{doc['page_number']}_chunk{doc.get('chunk_index', 0)}"
+    elif "timestamp" in doc:
+        return f"{prefix}ts{doc['timestamp'].replace(':', '').replace('-', '')}_chunk{doc.get('chunk_index', 0)}"
+    return f"{prefix}chunk{doc.get('chunk_index', 0)}"
+
+
+def embed_texts(texts: List[str]) -> List[List[float]]:
+    """
+    Embed texts in one OpenAI request, reusing cached embeddings of repeated texts.
+    
+    Args:
+        texts: Texts to embed
+        
+    Returns:
+        One embedding per text, in order
+    """
+    embeddings = [_embedding_cache.get((EMBEDDING_MODEL, text)) for text in texts]
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    if missing:
+        client = get_openai_client()
+        response = call_upstream("openai", lambda timeout: client.embeddings.create(
+            model=EMBEDDING_MODEL,
+            input=[texts[i] for i in missing],
+            timeout=timeout
+        ))
+        for i, item in zip(missing, response.data):
+            embeddings[i] = item.embedding
+            _embedding_cache.put((EMBEDDING_MODEL, texts[i]), item.embedding)
+    return embeddings
+
 
 class PineconeVectorStore:
     """Manages Pinecone vector store for course materials."""
@@ -21,8 +80,9 @@ class PineconeVectorStore:
     def __init__(self):
         """Initialize Pinecone client and index."""
         try:
-            self.pc = Pinecone(api_key=PINECONE_API_KEY)
-            self.openai_client = OpenAI(api_key=OPENAI_API_KEY)
+            self.pc = get_pinecone_client()
+            self.openai_client = get_openai_client()
+            self.document_store = get_document_store() if DOCUMENT_STORE_ENABLED else None
             self.index = None
             self._initialize_index()
         except Exception as e:
@@ -30,7 +90,20 @@ class PineconeVectorStore:
             raise
     
     def _initialize_index(self):
-        """Initialize or connect to Pinecone index."""
+        """Initialize or connect to Pinecone index, reusing the process-wide handle."""
+        global _index
+        if _index is not None:
+            self.index = _index
+            return
+        with _index_lock:
+            if _index is None:
+                _index = self._open_index()
+        self.index = _index
+    
+    def _open_index(self):
+        """Create the Pinecone index if needed and open a handle to it."""
+        from pinecone import ServerlessSpec
+        
         try:
             existing_indexes = self.pc.list_indexes().names()
             
@@ -50,24 +123,70 @@ class PineconeVectorStore:
             else:
                 logger.info(f"Connecting to existing index: {PINECONE_INDEX_NAME}")
             
-            self.index = self.pc.Index(PINECONE_INDEX_NAME)
+            return self.pc.Index(PINECONE_INDEX_NAME)
             
         except Exception as e:
             logger.error(f"Error initializing index: {e}")
             raise
     
     def create_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Create embeddings using OpenAI."""
+        """Create embeddings using OpenAI, reusing cached embeddings of repeated texts."""
         try:
-            response = self.openai_client.embeddings.create(
-                model=EMBEDDING_MODEL,
-                input=texts
-            )
-            return [item.embedding for item in response.data]
+            return embed_texts(texts)
         except Exception as e:
             logger.error(f"Error creating embeddings: {e}")
             raise
     
+    def hydrate(self, vector_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Look up full chunk text and metadata for vector IDs.
+        
+        Chunks missing from the local store (ingested before it existed, or a
+        host without the store file) fall back to a Pinecone fetch of their
+        stored metadata, whose text is truncated. Chunks with no text at all
+        are left out, and never cached.
+        
+        Args:
+            vector_ids: IDs returned by a query
+            
+        Returns:
+            Mapping of vector ID to metadata including "content"
+        """
+        hydrated = {}
+        for vector_id in vector_ids:
+            cached = _chunk_cache.get(vector_id)
+            if cached is not None:
+                hydrated[vector_id] = cached
+        
+        uncached = [vector_id for vector_id in vector_ids if vector_id not in hydrated]
+        if uncached and self.document_store is not None:
+            hydrated.update(self.document_store.get_many(uncached))
+        missing = [vector_id for vector_id in uncached if vector_id not in hydrated]
+        if missing:
+            logger.warning(f"{len(missing)} chunks not in local document store, fetching metadata from Pinecone")
+            try:
+                fetched = call_upstream("pinecone", lambda timeout: self.index.fetch(ids=missing, timeout=timeout))
+                empty = 0
+                for vector_id, vector in fetched.vectors.items():
+                    metadata = dict(vector.metadata or {})
+                    if metadata.get("content"):
+                        hydrated[vector_id] = metadata
+                    else:
+                        empty += 1
+                if empty:
+                    logger.error(
+                        f"{empty} chunks have no text in the local document store or in Pinecone metadata. "
+                        f"Ship {self.document_store.path} with the deployment or re-run ingestion."
+                    )
+            except Exception as e:
+                logger.error(f"Error fetching metadata from Pinecone: {e}")
+        
+        for vector_id in uncached:
+            if vector_id in hydrated:
+                _chunk_cache.put(vector_id, hydrated[vector_id])
+        logger.info(f"Hydrated {len(hydrated)}/{len(vector_ids)} chunks ({len(vector_ids) - len(uncached)} cached)")
+        return hydrated
+    
     def upsert_documents(self, documents: List[Dict[str, Any]]):
         """Upsert documents to Pinecone with metadata."""
         if not documents:
@@ -75,40 +194,33 @@ class PineconeVectorStore:
             return
         
         try:
+            annotate_reference_metadata(documents)
             texts = [doc["content"] for doc in documents]
             embeddings = self.create_embeddings(texts)
             
             vectors = []
+            stored_rows = []
             for i, (doc, embedding) in enumerate(zip(documents, embeddings)):
                 # Create unique vector ID
-                # Handle both PDFs (with page_number) and transcripts (with timestamp)
+                vector_id = build_vector_id(doc)
                 if "page_number" in doc and doc["page_number"]:
-                    vector_id = (
-                        f"{doc['course_name']}_{doc.get('module_name', '')}_{doc['document_name']}_"
-                        f"page{doc['page_number']}_chunk{doc.get('chunk_index', 0)}"
-                    )
                     page_or_timestamp = doc["page_number"]
                 elif "timestamp" in doc:
-                    vector_id = (
-                        f"{doc['course_name']}_{doc.get('module_name', '')}_{doc['document_name']}_"
-                        f"ts{doc['timestamp'].replace(':', '').replace('-', '')}_chunk{doc.get('chunk_index', 0)}"
-                    )
                     page_or_timestamp = doc["timestamp"]
                 else:
-                    vector_id = (
-                        f"{doc['course_name']}_{doc.get('module_name', '')}_{doc['document_name']}_"
-                        f"chunk{doc.get('chunk_index', 0)}"
-                    )
                     page_or_timestamp = None
                 
                 # Build metadata
                 metadata = {
                     "course_name": doc["course_name"],
                     "document_name": doc["document_name"],
-                    "content": doc["content"][:1000],  # Limit metadata size
                     "type": doc.get("type", "text"),
-                    "chunk_index": doc.get("chunk_index", 0)
+                    "chunk_index": doc.get("chunk_index", 0),
+                    "is_reference": doc["is_reference"],
+                    "citation_density": doc["citation_density"]
                 }
+                # Truncated copy for hosts without the local store (queries leave it out of the payload)
+                metadata["content"] = doc["content"][:1000]  # Limit metadata size
                 
                 # Add optional fields
                 if doc.get("module_name"):
@@ -124,6 +236,12 @@ class PineconeVectorStore:
                     "values": embedding,
                     "metadata": metadata
                 })
+                stored_rows.append((vector_id, doc["course_name"], metadata, doc["content"]))
+            
+            # Full text lives in the local store
+            if self.document_store is not None:
+                self.document_store.put_many(stored_rows)
+            _chunk_cache.clear()
             
             # Batch upsert
             batch_size = 100
@@ -131,7 +249,7 @@ class PineconeVectorStore:
             
             for i in range(0, len(vectors), batch_size):
                 batch = vectors[i:i + batch_size]
-                self.index.upsert(vectors=batch)
+                call_upstream("pinecone", lambda timeout: self.index.upsert(vectors=batch, timeout=timeout))
                 total_upserted += len(batch)
                 logger.info(f"Upserted {total_upserted}/{len(vectors)} vectors")
             
@@ -145,7 +263,8 @@ class PineconeVectorStore:
         self,
         query_text: str,
         course_name: str,
-        top_k: int = 5
+        top_k: int = 5,
+        exclude_references: bool = False
     ) -> List[Dict[str, Any]]:
         """
         Query Pinecone with course filtering.
@@ -154,6 +273,7 @@ class PineconeVectorStore:
             query_text: The query text
             course_name: Course name to filter by
             top_k: Number of results to return
+            exclude_references: Skip chunks flagged as reference/bibliography sections
             
         Returns:
             List of matching documents with metadata
@@ -169,25 +289,40 @@ class PineconeVectorStore:
             
             logger.info(f"Querying Pinecone with filter: course_name='{normalized_course_name}', top_k={top_k}")
             
-            # Query with metadata filter
+            metadata_filter = {"course_name": {"$eq": normalized_course_name}}
+            if exclude_references:
+                metadata_filter["is_reference"] = {"$ne": True}
+            
+            # Query with metadata filter - with a local document store only IDs and
+            # scores are needed from Pinecone
             try:
-                results = self.index.query(
+                results = call_upstream("pinecone", lambda timeout: self.index.query(
                     vector=query_embedding,
                     top_k=top_k,
-                    include_metadata=True,
-                    filter={
-                        "course_name": {"$eq": normalized_course_name}
-                    }
-                )
+                    include_metadata=self.document_store is None,
+                    filter=metadata_filter,
+                    timeout=timeout
+                ))
+                if exclude_references and not results.matches:
+                    # Chunks ingested before reference flagging lack the field
+                    logger.info("No matches with reference filter, retrying with course filter only")
+                    results = call_upstream("pinecone", lambda timeout: self.index.query(
+                        vector=query_embedding,
+                        top_k=top_k,
+                        include_metadata=self.document_store is None,
+                        filter={"course_name": {"$eq": normalized_course_name}},
+                        timeout=timeout
+                    ))
             except Exception as filter_error:
                 logger.warning(f"Error with course filter '{normalized_course_name}': {filter_error}")
                 logger.info("Attempting query without filter and filtering results manually...")
                 # If filter fails, try without filter and filter manually
-                all_results = self.index.query(
+                all_results = call_upstream("pinecone", lambda timeout: self.index.query(
                     vector=query_embedding,
                     top_k=top_k * 3,  # Get more results to filter manually
-                    include_metadata=True
-                )
+                    include_metadata=True,
+                    timeout=timeout
+                ))
                 # Filter manually by course name
                 filtered_matches = []
                 for match in all_results.matches:
@@ -204,30 +339,43 @@ class PineconeVectorStore:
             
             logger.info(f"Pinecone returned {len(results.matches)} matches")
             
+            # Hydrate full chunk text (and metadata) locally in one batched read
+            hydrated = self.hydrate([match.id for match in results.matches]) if self.document_store is not None else {}
+            
             # Format results
             formatted_results = []
             for match in results.matches:
-                match_course = match.metadata.get("course_name", "")
+                if self.document_store is not None and match.id not in hydrated:
+                    # No text anywhere; hydrate() has logged it
+                    continue
+                metadata = hydrated.get(match.id) or match.metadata or {}
+                match_course = metadata.get("course_name", "")
                 logger.debug(f"Match course: '{match_course}', score: {match.score}")
                 result_dict = {
-                    "content": match.metadata.get("content", ""),
-                    "document_name": match.metadata.get("document_name", ""),
-                    "type": match.metadata.get("type", "text"),
+                    "id": match.id,
+                    "content": metadata.get("content", ""),
+                    "document_name": metadata.get("document_name", ""),
+                    "type": metadata.get("type", "text"),
                     "score": match.score,
                     "course_name": match_course
                 }
                 
                 # Add page_number or timestamp based on document type
-                if match.metadata.get("page_number"):
-                    result_dict["page_number"] = match.metadata.get("page_number")
-                elif match.metadata.get("timestamp"):
-                    result_dict["timestamp"] = match.metadata.get("timestamp")
+                if metadata.get("page_number"):
+                    result_dict["page_number"] = metadata.get("page_number")
+                elif metadata.get("timestamp"):
+                    result_dict["timestamp"] = metadata.get("timestamp")
                 else:
                     result_dict["page_number"] = None
                 
                 # Add module_name if present
-                if match.metadata.get("module_name"):
-                    result_dict["module_name"] = match.metadata.get("module_name")
+                if metadata.get("module_name"):
+                    result_dict["module_name"] = metadata.get("module_name")
+                
+                # Reference flags set at ingestion (absent for older chunks)
+                if "is_reference" in metadata:
+                    result_dict["is_reference"] = metadata["is_reference"]
+                    result_dict["citation_density"] = metadata.get("citation_density", 0.0)
                 
                 formatted_results.append(result_dict)
             
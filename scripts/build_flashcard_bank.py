@@ -0,0 +1,101 @@
+"""Script to pre-generate the flashcard bank for already ingested courses.
+Reads chunks from each course's metadata index, so documents are not re-processed."""
+
+import sys
+import logging
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core.flashcard_bank import build_course_flashcard_bank, run_flashcard_batch
+from core.flashcard_generator import FlashcardGenerator
+from retrieval.metadata_index import load_course_metadata_index
+from config.settings import COURSES_PATH, FLASHCARDS_PER_MODULE
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def build_flashcard_banks(
+    course_names: list = None,
+    cards_per_module: int = FLASHCARDS_PER_MODULE,
+    batch: bool = False,
+    backend_name: str = None,
+    wait: bool = True
+):
+    """
+    Build the flashcard bank for each course.
+
+    Args:
+        course_names: Courses to build (defaults to every folder in the courses directory)
+        cards_per_module: Target number of cards per module
+        batch: Generate through a batch job and merge into the existing bank
+        backend_name: Batch backend ("openai" or "local"), defaulting to BATCH_BACKEND
+        wait: Wait for batch jobs to finish; otherwise re-run later to resume them
+    """
+    if not course_names:
+        course_names = [f.name for f in Path(COURSES_PATH).iterdir() if f.is_dir()]
+
+    generator = FlashcardGenerator()
+
+    for course_name in course_names:
+        metadata_index = load_course_metadata_index(course_name)
+        if metadata_index is None:
+            logger.warning(f"No metadata index for {course_name}. Run ingest_documents.py first.")
+            continue
+
+        documents = list(metadata_index.records.values())
+        logger.info(f"Building flashcard bank for {course_name} from {len(documents)} chunks")
+        if batch:
+            backend = None
+            if backend_name:
+                from utils.batch import get_batch_backend
+                from utils.paths import course_index_dir
+                backend = get_batch_backend(backend_name, work_dir=course_index_dir(course_name, create=True))
+            state = run_flashcard_batch(course_name, documents, generator, backend, cards_per_module, wait)
+            logger.info(f"Flashcard batch for {course_name}: {state['status']}")
+            continue
+
+        bank = build_course_flashcard_bank(course_name, documents, generator, cards_per_module)
+        logger.info(f"✓ Built flashcard bank for {course_name} ({len(bank)} cards)")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Pre-generate per-course flashcard banks")
+    parser.add_argument(
+        "courses",
+        nargs="*",
+        help="Course names to build (defaults to all courses)"
+    )
+    parser.add_argument(
+        "--per-module",
+        type=int,
+        default=FLASHCARDS_PER_MODULE,
+        help="Target number of flashcards per module"
+    )
+
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Generate through a batch job (resumable) and merge into the existing bank"
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["openai", "local"],
+        help="Batch backend (defaults to BATCH_BACKEND)"
+    )
+    parser.add_argument(
+        "--no-wait",
+        action="store_true",
+        help="Submit (or check) the batch and exit; re-run later to merge the results"
+    )
+
+    args = parser.parse_args()
+    build_flashcard_banks(args.courses, args.per_module, args.batch, args.backend, not args.no_wait)
@@ -0,0 +1,185 @@
+"""Script to calibrate the per-course retrieval_thresholds in config/prompts.yaml.
+Runs in-course and off-topic questions through dense retrieval and derives the
+thresholds from their score distributions."""
+
+import sys
+import json
+import logging
+import argparse
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from retrieval.vector_store import PineconeVectorStore
+from retrieval.adaptive_retrieval import dense_scores
+from core.flashcard_bank import load_course_flashcard_bank
+from config.settings import COURSES_PATH, ADAPTIVE_INITIAL_K
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Questions no course covers; questions from the other courses' banks are added to these
+OFF_TOPIC_QUESTIONS = [
+    "What is a good recipe for banana bread?",
+    "Who won the FIFA World Cup in 2018?",
+    "How do I change a flat tire on a bicycle?",
+    "What is the capital of Australia?",
+    "How often should I water a cactus?",
+    "What are the rules of cricket?",
+    "How do I file my taxes online?",
+    "What is the best time of year to visit Japan?",
+    "How do I train a puppy to sit?",
+    "What causes the northern lights?",
+    "How long should I boil an egg?",
+    "Who painted the Mona Lisa?",
+]
+
+QUESTIONS_PER_COURSE = 60  # In-course questions sampled from each flashcard bank
+CONFIDENT_PERCENTILE = 25  # In-course questions below this top-score percentile widen retrieval
+FLAT_PERCENTILE = 10  # In-course questions below this spread percentile count as flat
+
+
+def bank_questions(course_name: str, limit: int, seed: int = 0) -> List[str]:
+    """Sample questions from a course's flashcard bank (generated from its own chunks)."""
+    bank = load_course_flashcard_bank(course_name)
+    if bank is None or not len(bank):
+        return []
+    questions = [card["question"] for card in bank.cards]
+    rng = np.random.default_rng(seed)
+    return [questions[i] for i in rng.permutation(len(questions))[:limit]]
+
+
+def score_questions(vector_store: PineconeVectorStore, course_name: str, questions: List[str], top_k: int) -> List[List[float]]:
+    """Dense scores (highest first) of the top_k chunks retrieved for each question."""
+    curves = []
+    for question in questions:
+        results = vector_store.query(question, course_name, top_k=top_k, exclude_references=True)
+        curves.append(dense_scores(results))
+    return curves
+
+
+def best_separating_score(positives: np.ndarray, negatives: np.ndarray) -> float:
+    """Top-score cutoff with the best balanced accuracy between in-course and off-topic questions."""
+    candidates = np.unique(np.concatenate([positives, negatives]))
+    best_score, best_accuracy = float(candidates[0]), -1.0
+    for cutoff in candidates:
+        accuracy = (np.mean(positives >= cutoff) + np.mean(negatives < cutoff)) / 2
+        if accuracy > best_accuracy:
+            best_score, best_accuracy = float(cutoff), accuracy
+    return best_score
+
+
+def calibrate_course(
+    vector_store: PineconeVectorStore,
+    course_name: str,
+    in_course: List[str],
+    off_topic: List[str],
+    top_k: int = ADAPTIVE_INITIAL_K
+) -> Dict[str, float]:
+    """
+    Derive a course's thresholds from the scores of its in-course and off-topic questions.
+
+    Args:
+        vector_store: Vector store to retrieve from
+        course_name: Name of the course
+        in_course: Questions the course materials answer
+        off_topic: Questions they do not
+        top_k: Chunks per question, as on the adaptive first pass
+
+    Returns:
+        min_score, confident_score and flat_spread for the course
+    """
+    positive_curves = [c for c in score_questions(vector_store, course_name, in_course, top_k) if c]
+    negative_curves = [c for c in score_questions(vector_store, course_name, off_topic, top_k) if c]
+    if not positive_curves or not negative_curves:
+        raise ValueError(f"No dense scores retrieved for {course_name}")
+
+    positives = np.array([curve[0] for curve in positive_curves])
+    negatives = np.array([curve[0] for curve in negative_curves])
+    spreads = np.array([curve[0] - curve[-1] for curve in positive_curves if len(curve) >= top_k])
+
+    min_score = best_separating_score(positives, negatives)
+    confident_score = max(min_score, float(np.percentile(positives, CONFIDENT_PERCENTILE)))
+    flat_spread = float(np.percentile(spreads, FLAT_PERCENTILE)) if len(spreads) else 0.0
+
+    logger.info(
+        f"{course_name}: top scores in-course {np.median(positives):.3f} median "
+        f"({len(positives)} questions), off-topic {np.median(negatives):.3f} median "
+        f"({len(negatives)} questions); {np.mean(positives >= min_score):.0%} in-course and "
+        f"{np.mean(negatives < min_score):.0%} off-topic routed correctly at min_score {min_score:.3f}"
+    )
+    return {
+        "min_score": round(min_score, 3),
+        "confident_score": round(confident_score, 3),
+        "flat_spread": round(flat_spread, 3),
+    }
+
+
+def calibrate(course_names: list = None, questions_path: str = None, per_course: int = QUESTIONS_PER_COURSE):
+    """
+    Calibrate thresholds for each course and print them as a retrieval_thresholds block.
+
+    Args:
+        course_names: Courses to calibrate (defaults to every folder in the courses directory)
+        questions_path: Optional JSON file mapping course name to {"in_course": [...], "off_topic": [...]}
+            (defaults to flashcard bank questions and OFF_TOPIC_QUESTIONS)
+        per_course: In-course questions sampled per course from its flashcard bank
+    """
+    if not course_names:
+        course_names = [f.name for f in Path(COURSES_PATH).iterdir() if f.is_dir()]
+
+    provided = {}
+    if questions_path:
+        with open(questions_path, 'r', encoding='utf-8') as f:
+            provided = json.load(f)
+
+    in_course = {
+        name: provided.get(name, {}).get("in_course") or bank_questions(name, per_course)
+        for name in course_names
+    }
+
+    vector_store = PineconeVectorStore()
+    thresholds = {}
+    for course_name in course_names:
+        if not in_course[course_name]:
+            logger.warning(f"No questions for {course_name}. Build its flashcard bank or pass --questions.")
+            continue
+        # Questions from the other courses are realistic near misses
+        off_topic = provided.get(course_name, {}).get("off_topic") or OFF_TOPIC_QUESTIONS + [
+            question for name, questions in in_course.items() if name != course_name for question in questions[:10]
+        ]
+        try:
+            thresholds[course_name] = calibrate_course(vector_store, course_name, in_course[course_name], off_topic)
+        except Exception as e:
+            logger.error(f"Could not calibrate {course_name}: {e}")
+
+    if not thresholds:
+        return
+    # Fallback for courses added later: the most conservative (highest) cutoffs seen
+    thresholds = {
+        "default": {key: max(values[key] for values in thresholds.values()) for key in ("min_score", "confident_score", "flat_spread")},
+        **thresholds
+    }
+    print("retrieval_thresholds:")
+    for course_name, values in thresholds.items():
+        print(f"  {json.dumps(course_name) if ' ' in course_name else course_name}:")
+        for key, value in values.items():
+            print(f"    {key}: {value}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calibrate per-course retrieval score thresholds")
+    parser.add_argument("courses", nargs="*", help="Course names (defaults to all courses)")
+    parser.add_argument("--questions", help="JSON file with in_course/off_topic questions per course")
+    parser.add_argument("--per-course", type=int, default=QUESTIONS_PER_COURSE, help="Flashcard questions sampled per course")
+    args = parser.parse_args()
+
+    calibrate(args.courses, args.questions, args.per_course)
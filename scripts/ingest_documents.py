@@ -4,6 +4,7 @@ Supports PDF files and VTT transcript files, with optional module structure."""
 import os
 import sys
 import logging
+import argparse
 from pathlib import Path
 
 # Add parent directory to path
@@ -12,6 +13,10 @@ sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 from retrieval.document_loader import MultimodalPDFLoader
 from retrieval.vtt_loader import VTTLoader
 from retrieval.vector_store import PineconeVectorStore
+from retrieval.bm25_index import build_course_bm25_index
+from retrieval.metadata_index import build_course_metadata_index
+from retrieval.reference_filter import annotate_reference_metadata
+from core.flashcard_bank import build_course_flashcard_bank
 from config.settings import COURSES_PATH
 
 # Configure logging
@@ -28,7 +33,13 @@ def get_course_name_from_folder(folder_name: str) -> str:
     return folder_name
 
 
-def process_file(file_path: Path, course_name: str, module_name: str, vector_store: PineconeVectorStore):
+def process_file(
+    file_path: Path,
+    course_name: str,
+    module_name: str,
+    vector_store: PineconeVectorStore,
+    course_documents: list = None
+):
     """
     Process a single file (PDF or VTT) and ingest into vector store.
     
@@ -37,6 +48,7 @@ def process_file(file_path: Path, course_name: str, module_name: str, vector_sto
         course_name: Name of the course
         module_name: Optional module name
         vector_store: Vector store instance
+        course_documents: Optional list collecting every ingested chunk for the course
     """
     file_ext = file_path.suffix.lower()
     
@@ -62,7 +74,11 @@ def process_file(file_path: Path, course_name: str, module_name: str, vector_sto
         documents = loader.load()
         
         if documents:
+            # Flag reference/bibliography chunks once so retrieval can filter them by metadata
+            annotate_reference_metadata(documents)
             vector_store.upsert_documents(documents)
+            if course_documents is not None:
+                course_documents.extend(documents)
             logger.info(f"✓ Ingested {len(documents)} chunks from {file_path.name}")
             return 1, len(documents)
         else:
@@ -74,8 +90,13 @@ def process_file(file_path: Path, course_name: str, module_name: str, vector_sto
         return 0, 0
 
 
-def ingest_course_documents():
-    """Ingest all documents from courses directory, supporting modules and multiple file types."""
+def ingest_course_documents(build_flashcards: bool = False):
+    """
+    Ingest all documents from courses directory, supporting modules and multiple file types.
+    
+    Args:
+        build_flashcards: Also pre-generate each course's flashcard bank (uses the LLM)
+    """
     logger.info("Starting document ingestion process...")
     
     courses_dir = Path(COURSES_PATH)
@@ -96,6 +117,7 @@ def ingest_course_documents():
         
         course_name = get_course_name_from_folder(course_folder.name)
         logger.info(f"Processing course: {course_name}")
+        course_documents = []
         
         # Check if course has modules (subfolders) or direct files
         subfolders = [f for f in course_folder.iterdir() if f.is_dir()]
@@ -117,13 +139,13 @@ def ingest_course_documents():
                 
                 # Process PDFs in module
                 for pdf_file in module_pdfs:
-                    docs, chunks = process_file(pdf_file, course_name, module_name, vector_store)
+                    docs, chunks = process_file(pdf_file, course_name, module_name, vector_store, course_documents)
                     total_documents += docs
                     total_chunks += chunks
                 
                 # Process VTT files in module
                 for vtt_file in module_vtts:
-                    docs, chunks = process_file(vtt_file, course_name, module_name, vector_store)
+                    docs, chunks = process_file(vtt_file, course_name, module_name, vector_store, course_documents)
                     total_documents += docs
                     total_chunks += chunks
         
@@ -133,19 +155,29 @@ def ingest_course_documents():
             
             # Process PDFs
             for pdf_file in pdf_files:
-                docs, chunks = process_file(pdf_file, course_name, None, vector_store)
+                docs, chunks = process_file(pdf_file, course_name, None, vector_store, course_documents)
                 total_documents += docs
                 total_chunks += chunks
             
             # Process VTT files
             for vtt_file in vtt_files:
-                docs, chunks = process_file(vtt_file, course_name, None, vector_store)
+                docs, chunks = process_file(vtt_file, course_name, None, vector_store, course_documents)
                 total_documents += docs
                 total_chunks += chunks
         
         # If no files found at all
         if not subfolders and not pdf_files and not vtt_files:
             logger.warning(f"No PDF or VTT files found in {course_folder}")
+        
+        # Build the local side indexes from the same chunks sent to Pinecone
+        if course_documents:
+            build_course_bm25_index(course_name, course_documents)
+            build_course_metadata_index(course_name, course_documents)
+            logger.info(f"✓ Built BM25 and metadata indexes for {course_name} ({len(course_documents)} chunks)")
+            
+            if build_flashcards:
+                bank = build_course_flashcard_bank(course_name, course_documents)
+                logger.info(f"✓ Built flashcard bank for {course_name} ({len(bank)} cards)")
     
     logger.info(
         f"Ingestion complete! Processed {total_documents} documents "
@@ -154,4 +186,8 @@ def ingest_course_documents():
 
 
 if __name__ == "__main__":
-    ingest_course_documents()
+    parser = argparse.ArgumentParser(description="Ingest course documents into the vector store")
+    parser.add_argument("--flashcards", action="store_true", help="Also pre-generate the flashcard bank for each course")
+    args = parser.parse_args()
+    
+    ingest_course_documents(build_flashcards=args.flashcards)
@@ -0,0 +1,100 @@
+"""Script to report import-time cost of the app's entry modules.
+Runs each import in a fresh interpreter with `python -X importtime`."""
+
+import re
+import sys
+import subprocess
+from pathlib import Path
+from typing import List, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+
+DEFAULT_MODULES = [
+    "ui.chat",
+    "core.agent",
+    "retrieval.document_loader",
+    "scripts.ingest_documents",
+]
+
+_IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$')
+
+
+def profile_import(module: str) -> Tuple[float, List[Tuple[str, float, float]], str]:
+    """
+    Import a module in a fresh interpreter and collect -X importtime output.
+
+    Args:
+        module: Dotted module name
+
+    Returns:
+        (total seconds, [(module, self seconds, cumulative seconds)], error output if the import failed)
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True
+    )
+
+    entries = []
+    total = 0.0
+    other_lines = []
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if not match:
+            if not line.startswith("import time:"):
+                other_lines.append(line)
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        entries.append((name, int(self_us) / 1e6, int(cumulative_us) / 1e6))
+        if len(indent) == 1:  # Top-level import
+            total += int(cumulative_us) / 1e6
+
+    error = "\n".join(other_lines[-5:]) if result.returncode != 0 else ""
+    return total, entries, error
+
+
+def print_report(modules: List[str], top: int = 15):
+    """
+    Print the total import time and the slowest packages for each module.
+
+    Args:
+        modules: Dotted module names to profile
+        top: Number of slowest top-level packages to list
+    """
+    for module in modules:
+        total, entries, error = profile_import(module)
+        print(f"\n{module}: {total:.3f}s")
+        if error:
+            print(f"  import failed:\n{error}")
+            continue
+
+        # Aggregate self time by top-level package
+        packages = {}
+        for name, self_seconds, _ in entries:
+            package = name.split(".")[0]
+            packages[package] = packages.get(package, 0.0) + self_seconds
+
+        for package, seconds in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+            print(f"  {seconds:8.3f}s  {package}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Report import-time cost of PRISM modules")
+    parser.add_argument(
+        "modules",
+        nargs="*",
+        default=DEFAULT_MODULES,
+        help="Modules to import (defaults to the app and script entry modules)"
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=15,
+        help="Number of slowest packages to list per module"
+    )
+
+    args = parser.parse_args()
+    print_report(args.modules, args.top)
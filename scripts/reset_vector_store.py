@@ -53,6 +53,11 @@ def reset_vector_store():
         )
         logger.info(f"Index {PINECONE_INDEX_NAME} created successfully")
         
+        # Clear the local chunk text that mirrored the deleted vectors
+        from retrieval.document_store import get_document_store
+        get_document_store().clear()
+        logger.info("Local document store cleared")
+        
         logger.info("Vector store reset complete! You can now run ingest_documents.py to populate it.")
         
     except Exception as e:
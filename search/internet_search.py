@@ -2,15 +2,21 @@
 
 import os
 import logging
+import importlib.util
+from datetime import datetime
 from typing import List, Dict, Any
+from config.prompts import get_prompt_config
+from config.settings import WEB_RANKING_ENABLED, WEB_RESULTS_TO_PROMPT, WEB_FETCH_ENABLED
+from search.result_ranker import ResultRanker, SNIPPET_CHARS, extract_year
+from utils.intent import needs_current_info
+from utils.http_clients import get_tavily_client
+from utils.resilience import call_upstream
 
 logger = logging.getLogger(__name__)
 
-try:
-    from tavily import TavilyClient
-    TAVILY_AVAILABLE = True
-except ImportError:
-    TAVILY_AVAILABLE = False
+# tavily itself is imported when the shared client is first created
+TAVILY_AVAILABLE = importlib.util.find_spec("tavily") is not None
+if not TAVILY_AVAILABLE:
     logger.warning("tavily-python not installed. Install with: pip install tavily-python")
 
 
@@ -33,12 +39,45 @@ class InternetSearchAgent:
             self.client = None
         else:
             try:
-                self.client = TavilyClient(api_key=self.api_key)
-                logger.info("Tavily API client initialized successfully")
+                self.client = get_tavily_client(self.api_key)
             except Exception as e:
                 logger.error(f"Error initializing Tavily client: {e}")
                 self.client = None
     
+    def _rank_results(
+        self,
+        query: str,
+        course_name: str,
+        results: List[Dict[str, Any]],
+        num_results: int,
+        current_info_query: bool
+    ) -> List[Dict[str, Any]]:
+        """
+        Keep the search results most relevant to the question, course and date.
+        
+        Args:
+            query: Student's question (without the search enhancements)
+            course_name: Course name
+            results: Tavily results
+            num_results: Results requested by the caller
+            current_info_query: Whether the question asks for current information
+            
+        Returns:
+            Up to WEB_RESULTS_TO_PROMPT results, best first, with "year" set
+        """
+        top_n = min(num_results, WEB_RESULTS_TO_PROMPT) if WEB_RANKING_ENABLED else num_results
+        if WEB_RANKING_ENABLED and results:
+            course_description = get_prompt_config().get('course_descriptions', {}).get(course_name, course_name)
+            try:
+                return ResultRanker().rank(query, course_description, results, top_n, prefer_recent=current_info_query)
+            except Exception as e:
+                logger.warning(f"Could not rank web results, using search order: {e}")
+        
+        # Fall back to the search API's own relevance score
+        current_year = datetime.now().year
+        ordered = sorted(results, key=lambda result: result.get("score", 0), reverse=True)[:top_n]
+        return [dict(result, year=extract_year(result, current_year)) for result in ordered]
+    
     def search(
         self,
         query: str,
@@ -64,14 +103,11 @@ class InternetSearchAgent:
         
         try:
             # Check if query asks for current/latest information
-            query_lower = query.lower()
-            needs_current_info = any(keyword in query_lower for keyword in [
-                "latest", "current", "recent", "new", "updated", "now", "today", "2024", "2025"
-            ])
+            current_info_query = needs_current_info(query)
             
             # For current info queries, don't add course name (it dilutes results)
             # For general queries, add course context if helpful
-            if needs_current_info:
+            if current_info_query:
                 enhanced_query = query  # Use original query for current info
                 logger.info(f"Current info query detected - using original query without course context")
             else:
@@ -82,17 +118,16 @@ class InternetSearchAgent:
             # For current info queries, use advanced search and get more results
             search_params = {
                 "query": enhanced_query,
-                "max_results": num_results * 2 if needs_current_info else num_results,
-                "search_depth": "advanced" if needs_current_info else "basic",
+                "max_results": num_results * 2 if current_info_query else num_results,
+                "search_depth": "advanced" if current_info_query else "basic",
                 "include_answer": True,  # Get AI-generated answer if available
                 "include_raw_content": False,
                 "include_domains": [],  # Don't restrict domains
             }
             
             # Add date context for current info queries
-            if needs_current_info:
+            if current_info_query:
                 # Add current year/month to query to get most recent results
-                from datetime import datetime
                 current_year = datetime.now().year
                 current_month = datetime.now().strftime("%B")
                 # Enhance query with date context
@@ -103,7 +138,7 @@ class InternetSearchAgent:
             logger.info(f"Searching Tavily with query: '{enhanced_query}'")
             logger.info(f"Search params: max_results={search_params['max_results']}, search_depth={search_params['search_depth']}")
             
-            search_response = self.client.search(**search_params)
+            search_response = call_upstream("tavily", lambda timeout: self.client.search(**search_params, timeout=timeout))
             
             logger.info(f"Tavily search response keys: {list(search_response.keys()) if isinstance(search_response, dict) else 'Not a dict'}")
             
@@ -122,45 +157,27 @@ class InternetSearchAgent:
                 })
                 logger.info("Found AI-generated answer from Tavily")
             
-            # Extract search results
+            # Extract search results and keep only the best for the prompt
             results_list = search_response.get("results", [])
-            
-            # For current info queries, try to extract dates and prioritize recent ones
-            if needs_current_info:
-                from datetime import datetime
-                current_year = datetime.now().year
-                
-                # Try to extract year from content and prioritize recent results
-                def extract_year_from_text(text):
-                    """Extract year from text (look for 4-digit years like 2024, 2025)"""
-                    import re
-                    years = re.findall(r'\b(20\d{2})\b', str(text))
-                    if years:
-                        return max([int(y) for y in years if 2020 <= int(y) <= current_year + 1])
-                    return None
-                
-                # Add year information to results for sorting
-                for result in results_list:
-                    content = result.get("content", "")
-                    title = result.get("title", "")
-                    combined_text = f"{title} {content}"
-                    year = extract_year_from_text(combined_text)
-                    result['_extracted_year'] = year if year else 0
-                
-                # Sort by extracted year (most recent first), then by score
-                results_list.sort(key=lambda x: (x.get('_extracted_year', 0), x.get('score', 0)), reverse=True)
-                logger.info(f"Sorted results by date relevance for current info query")
-            
-            for i, result in enumerate(results_list[:num_results], 1):
+            ranked_results = self._rank_results(query, course_name, results_list, num_results, current_info_query)
+            if WEB_FETCH_ENABLED and ranked_results:
+                # Replace thin snippets with the most relevant passages of each page
+                from search.page_fetcher import PageFetcher
+                try:
+                    ranked_results = PageFetcher().enrich(query, ranked_results)
+                except Exception as e:
+                    logger.warning(f"Could not fetch web pages, using search snippets: {e}")
+            
+            for i, result in enumerate(ranked_results, 1):
                 title = result.get("title", "No title")
                 content = result.get("content", "")
                 url = result.get("url", "")
                 score = result.get("score", 0)
-                extracted_year = result.get("_extracted_year")
+                extracted_year = result.get("year")
                 
                 # Add year info to snippet if available
-                snippet = content[:500] if content else ""
-                if extracted_year and needs_current_info:
+                snippet = result.get("excerpt") or (content[:SNIPPET_CHARS] if content else "")
+                if extracted_year and current_info_query:
                     snippet = f"[Year: {extracted_year}] {snippet}"
                 
                 formatted_results.append({
@@ -169,6 +186,7 @@ class InternetSearchAgent:
                     "link": url,
                     "position": i,
                     "score": score,
+                    "rank_score": result.get("rank_score"),
                     "year": extracted_year
                 })
                 
@@ -177,16 +195,6 @@ class InternetSearchAgent:
                     "url": url
                 })
             
-            # Sort results: answer first, then by year (if current info), then by score
-            if needs_current_info:
-                formatted_results.sort(key=lambda x: (
-                    x.get('position', 0) == 0,  # Answer first
-                    -x.get('year', 0),  # Most recent year first
-                    -x.get('score', 0)  # Then by score
-                ))
-            else:
-                formatted_results.sort(key=lambda x: (x.get('position', 0) == 0, -x.get('score', 0)))
-            
             # Format as text
             results_text = "Internet Search Results:\n\n"
             for result in formatted_results:
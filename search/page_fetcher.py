@@ -0,0 +1,375 @@
+"""Fetch the pages behind top web results and keep their most query-relevant passages."""
+
+import re
+import time
+import socket
+import logging
+import ipaddress
+from concurrent.futures import ThreadPoolExecutor, wait
+from html.parser import HTMLParser
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import httpx
+import numpy as np
+from config.settings import (
+    WEB_FETCH_CONCURRENCY,
+    WEB_FETCH_TIMEOUT,
+    WEB_FETCH_MAX_BYTES,
+    WEB_PAGE_CHUNK_WORDS,
+    WEB_PAGE_MAX_CHUNKS,
+    WEB_PAGE_CHUNKS_SELECTED
+)
+from utils.resilience import MIN_CALL_TIMEOUT, remaining_budget
+
+logger = logging.getLogger(__name__)
+
+_fetch_executor = ThreadPoolExecutor(max_workers=max(1, WEB_FETCH_CONCURRENCY), thread_name_prefix="page-fetch")
+
+# Elements whose text is page furniture rather than content
+SKIPPED_TAGS = {"script", "style", "noscript", "template", "svg", "nav", "header", "footer", "aside", "form", "button"}
+BLOCK_TAGS = {
+    "p", "div", "section", "article", "main", "li", "ul", "ol", "table", "tr", "br", "hr",
+    "h1", "h2", "h3", "h4", "h5", "h6", "pre", "blockquote", "dd", "dt", "figcaption"
+}
+TEXT_CONTENT_TYPES = ("text/html", "application/xhtml+xml", "text/plain")
+
+# Only public pages on the default web ports are fetched; redirects are followed by hand so each hop is checked
+ALLOWED_PORTS = {"http": {80}, "https": {443}}
+REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+MAX_REDIRECTS = 3
+
+_WHITESPACE = re.compile(r'[ \t\r\f\v]+')
+
+
+class _TextExtractor(HTMLParser):
+    """Collects visible text, breaking lines at block elements."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED_TAGS:
+            self._skip_depth += 1
+        elif tag in BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self.parts.append(data)
+
+
+class UnsafeURLError(ValueError):
+    """Raised for URLs that may not be fetched (wrong scheme or port, or a non-public address)."""
+
+
+def _is_public_address(address: str) -> bool:
+    """Whether an IP address is routable on the public internet."""
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+def resolve_url(url: str) -> Tuple[httpx.URL, str]:
+    """
+    Make sure a URL points at a public web server, and pick the address to connect to.
+
+    The request must then go to the returned address rather than the host
+    name; resolving the name again could give a different (private) answer.
+
+    Args:
+        url: URL from a search result or a redirect
+
+    Returns:
+        The parsed URL and one of the checked addresses of its host
+
+    Raises:
+        UnsafeURLError: If the scheme or port is not allowed, or the host
+            resolves to a loopback, private, link-local or reserved address
+    """
+    parsed = httpx.URL(url)
+    scheme = parsed.scheme.lower()
+    if scheme not in ALLOWED_PORTS:
+        raise UnsafeURLError(f"Scheme not allowed: {scheme or 'none'}")
+    port = parsed.port or (443 if scheme == "https" else 80)
+    if port not in ALLOWED_PORTS[scheme]:
+        raise UnsafeURLError(f"Port not allowed: {port}")
+    if not parsed.host:
+        raise UnsafeURLError("URL has no host")
+
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(parsed.host, port, type=socket.SOCK_STREAM)}
+    except socket.gaierror as e:
+        raise UnsafeURLError(f"Could not resolve {parsed.host}: {e}")
+    blocked = [address for address in addresses if not _is_public_address(address)]
+    if blocked or not addresses:
+        raise UnsafeURLError(f"{parsed.host} resolves to a non-public address ({', '.join(sorted(blocked))})")
+    return parsed, sorted(addresses)[0]
+
+
+def check_url(url: str) -> httpx.URL:
+    """
+    Make sure a URL points at a public web server before it is requested.
+
+    Args:
+        url: URL from a search result or a redirect
+
+    Returns:
+        The parsed URL
+
+    Raises:
+        UnsafeURLError: If the scheme or port is not allowed, or the host
+            resolves to a loopback, private, link-local or reserved address
+    """
+    return resolve_url(url)[0]
+
+
+def html_to_text(html: str) -> str:
+    """
+    Extract the readable text of an HTML page.
+
+    Args:
+        html: Page markup
+
+    Returns:
+        Text with one paragraph per line
+    """
+    extractor = _TextExtractor()
+    try:
+        extractor.feed(html)
+        extractor.close()
+    except Exception as e:
+        logger.debug(f"HTML parsing stopped early: {e}")
+    lines = (_WHITESPACE.sub(" ", line).strip() for line in "".join(extractor.parts).split("\n"))
+    return "\n".join(line for line in lines if line)
+
+
+def split_passages(text: str, chunk_words: int = WEB_PAGE_CHUNK_WORDS) -> List[str]:
+    """
+    Split page text into passages of about chunk_words words, keeping paragraphs together where possible.
+
+    Args:
+        text: Page text with one paragraph per line
+        chunk_words: Target words per passage
+
+    Returns:
+        Passages in page order
+    """
+    passages = []
+    current: List[str] = []
+    for paragraph in text.split("\n"):
+        words = paragraph.split()
+        # Very long paragraphs are cut into pieces of their own
+        while len(words) > chunk_words:
+            if current:
+                passages.append(" ".join(current))
+                current = []
+            passages.append(" ".join(words[:chunk_words]))
+            words = words[chunk_words:]
+        if current and len(current) + len(words) > chunk_words:
+            passages.append(" ".join(current))
+            current = []
+        current.extend(words)
+    if current:
+        passages.append(" ".join(current))
+    return passages
+
+
+class PageFetcher:
+    """
+    Reads the pages behind search results and replaces thin snippets with their best passages.
+
+    Pages are fetched concurrently on a bounded pool through the shared web
+    client, each within WEB_FETCH_TIMEOUT (and the request's remaining
+    budget). Every URL, including each redirect target, must be http(s) on
+    the default port and resolve to public addresses only, and the
+    connection goes to the address that was checked. The question and every passage of every page are embedded in one
+    request, and each page keeps its WEB_PAGE_CHUNKS_SELECTED passages most
+    similar to the question. Results whose page cannot be read keep their
+    search snippet.
+    """
+
+    def __init__(
+        self,
+        embed: Optional[Callable[[List[str]], List[List[float]]]] = None,
+        client=None
+    ):
+        """
+        Initialize the fetcher.
+
+        Args:
+            embed: Function embedding a list of texts in one call
+                (defaults to the cached OpenAI embeddings used for retrieval)
+            client: httpx client for the page requests (defaults to the shared web client)
+        """
+        if embed is None:
+            from retrieval.vector_store import embed_texts
+            embed = embed_texts
+        if client is None:
+            from utils.http_clients import get_web_client
+            client = get_web_client()
+        self.embed = embed
+        self.client = client
+
+    def fetch_page(self, url: str, timeout: float) -> Optional[str]:
+        """
+        Download a page's text.
+
+        Args:
+            url: Page URL
+            timeout: Seconds allowed for the whole download
+
+        Returns:
+            The page text, or None if it is not a readable text page
+        """
+        started = time.monotonic()
+        try:
+            current, address = resolve_url(url)
+            for _ in range(MAX_REDIRECTS + 1):
+                remaining = timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    logger.info(f"Ran out of time fetching {url}")
+                    return None
+                # Connect to the checked address, keeping the real host name for the
+                # Host header and TLS (SNI and certificate checks), so a DNS answer
+                # that changes after the check cannot redirect the connection
+                with self.client.stream(
+                    "GET",
+                    current.copy_with(host=address),
+                    timeout=remaining,
+                    follow_redirects=False,
+                    headers={"Accept": "text/html,text/plain;q=0.9", "Host": current.netloc.decode("ascii")},
+                    extensions={"sni_hostname": current.host}
+                ) as response:
+                    location = response.headers.get("location")
+                    if response.status_code in REDIRECT_STATUSES and location:
+                        current, address = resolve_url(str(current.join(location)))
+                        continue
+
+                    content_type = response.headers.get("content-type", "").lower()
+                    if response.status_code != 200 or not content_type.startswith(TEXT_CONTENT_TYPES):
+                        logger.info(f"Skipping {url} (status {response.status_code}, {content_type or 'no content type'})")
+                        return None
+
+                    body = bytearray()
+                    for data in response.iter_bytes():
+                        body.extend(data)
+                        if len(body) >= WEB_FETCH_MAX_BYTES or time.monotonic() - started > timeout:
+                            break
+                    text = bytes(body[:WEB_FETCH_MAX_BYTES]).decode(response.encoding or "utf-8", errors="replace")
+                    break
+            else:
+                logger.info(f"Skipping {url} (more than {MAX_REDIRECTS} redirects)")
+                return None
+        except UnsafeURLError as e:
+            logger.warning(f"Refusing to fetch {url}: {e}")
+            return None
+        except Exception as e:
+            logger.info(f"Could not fetch {url}: {e}")
+            return None
+
+        if content_type.startswith("text/plain"):
+            return text
+        return html_to_text(text)
+
+    def fetch_all(self, urls: List[str]) -> Dict[str, str]:
+        """
+        Fetch pages concurrently.
+
+        Args:
+            urls: Page URLs
+
+        Returns:
+            Mapping of URL to page text for the pages that could be read in time
+        """
+        timeout = WEB_FETCH_TIMEOUT
+        remaining = remaining_budget()
+        if remaining is not None:
+            if remaining < MIN_CALL_TIMEOUT:
+                logger.info("No time left in the request budget to fetch web pages")
+                return {}
+            timeout = min(timeout, remaining)
+
+        futures = {_fetch_executor.submit(self.fetch_page, url, timeout): url for url in dict.fromkeys(urls)}
+        done, not_done = wait(futures, timeout=timeout + 0.5)
+        for future in not_done:
+            future.cancel()
+            logger.info(f"Gave up waiting for {futures[future]}")
+
+        pages = {}
+        for future in done:
+            text = future.result()
+            if text:
+                pages[futures[future]] = text
+        return pages
+
+    def select_passages(self, query: str, pages: Dict[str, str]) -> Dict[str, List[str]]:
+        """
+        Keep the passages of each page most similar to the question.
+
+        Args:
+            query: Student's question
+            pages: Mapping of URL to page text
+
+        Returns:
+            Mapping of URL to its selected passages, in page order
+        """
+        passages = {url: split_passages(text)[:WEB_PAGE_MAX_CHUNKS] for url, text in pages.items()}
+        passages = {url: chunks for url, chunks in passages.items() if chunks}
+        if not passages:
+            return {}
+
+        owners = [url for url, chunks in passages.items() for _ in chunks]
+        texts = [chunk for chunks in passages.values() for chunk in chunks]
+        embeddings = np.asarray(self.embed([query] + texts), dtype=float)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings = embeddings / np.where(norms == 0, 1.0, norms)
+        similarity = embeddings[1:] @ embeddings[0]
+
+        owners = np.array(owners)
+        selected = {}
+        for url in passages:
+            indices = np.flatnonzero(owners == url)
+            best = indices[np.argsort(-similarity[indices], kind="stable")[:WEB_PAGE_CHUNKS_SELECTED]]
+            selected[url] = [texts[i] for i in sorted(best)]
+        return selected
+
+    def enrich(self, query: str, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Add an "excerpt" of the best page passages to each search result.
+
+        Args:
+            query: Student's question
+            results: Search results with "url"
+
+        Returns:
+            The same results; those whose page was read gain an "excerpt"
+        """
+        urls = [result.get("url") for result in results if str(result.get("url", "")).startswith(("http://", "https://"))]
+        if not urls:
+            return results
+
+        start = time.perf_counter()
+        pages = self.fetch_all(urls)
+        try:
+            selected = self.select_passages(query, pages)
+        except Exception as e:
+            logger.warning(f"Could not select web page passages, keeping snippets: {e}")
+            return results
+
+        for result in results:
+            chunks = selected.get(result.get("url"))
+            if chunks:
+                result["excerpt"] = " ... ".join(chunks)
+        logger.info(
+            f"Fetched {len(pages)}/{len(urls)} web pages and selected passages "
+            f"for {len(selected)} in {time.perf_counter() - start:.2f}s"
+        )
+        return results
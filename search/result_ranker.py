@@ -0,0 +1,135 @@
+"""Rerank web search results by similarity to the question and course, and by recency."""
+
+import re
+import logging
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+from config.settings import (
+    WEB_RANK_QUERY_WEIGHT,
+    WEB_RANK_COURSE_WEIGHT,
+    WEB_RANK_RECENCY_WEIGHT,
+    WEB_RANK_CURRENT_RECENCY_WEIGHT,
+    WEB_RANK_RECENCY_YEARS
+)
+
+logger = logging.getLogger(__name__)
+
+YEAR_PATTERN = re.compile(r'\b(20\d{2})\b')
+
+SNIPPET_CHARS = 500
+
+
+def result_text(result: Dict[str, Any]) -> str:
+    """Title and leading content of a search result, as embedded for ranking."""
+    return f"{result.get('title', '')}\n{(result.get('content') or '')[:SNIPPET_CHARS]}".strip()
+
+
+def extract_year(result: Dict[str, Any], current_year: int) -> int:
+    """
+    Find the year a search result is from.
+
+    Uses the published date when the search API provides one, otherwise the
+    latest plausible year mentioned in the title or snippet.
+
+    Args:
+        result: Search result with title, content and optionally published_date
+        current_year: This year; later years are ignored
+
+    Returns:
+        The year, or 0 if none was found
+    """
+    published = str(result.get("published_date") or "")
+    match = YEAR_PATTERN.search(published)
+    if match:
+        return int(match.group(1))
+    years = [int(y) for y in YEAR_PATTERN.findall(f"{result.get('title', '')} {result.get('content', '')}")]
+    years = [y for y in years if 2000 <= y <= current_year + 1]
+    return max(years) if years else 0
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    """Scale rows to unit length (zero rows stay zero)."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+class ResultRanker:
+    """
+    Scores search results in one embedding request and one matrix product.
+
+    The question, the course description and every result snippet are
+    embedded together; cosine similarities to the question and to the course
+    are weighted and added to a recency credit that falls linearly to zero
+    over WEB_RANK_RECENCY_YEARS.
+    """
+
+    def __init__(self, embed: Optional[Callable[[List[str]], List[List[float]]]] = None):
+        """
+        Initialize the ranker.
+
+        Args:
+            embed: Function embedding a list of texts in one call
+                (defaults to the cached OpenAI embeddings used for retrieval)
+        """
+        if embed is None:
+            from retrieval.vector_store import embed_texts
+            embed = embed_texts
+        self.embed = embed
+
+    def rank(
+        self,
+        query: str,
+        course_description: str,
+        results: List[Dict[str, Any]],
+        top_n: int,
+        prefer_recent: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Pick the best search results.
+
+        Args:
+            query: Student's question
+            course_description: Description of the course the question is asked in
+            results: Search API results (title, content, url, ...)
+            top_n: Number of results to keep
+            prefer_recent: Weight recency more heavily (questions about current information)
+
+        Returns:
+            The top results, best first, each copied with "rank_score" and "year" added
+        """
+        if not results:
+            return []
+
+        current_year = datetime.now().year
+        years = np.array([extract_year(result, current_year) for result in results], dtype=float)
+
+        embeddings = np.asarray(
+            self.embed([query, course_description] + [result_text(result) for result in results]),
+            dtype=float
+        )
+        embeddings = _normalize(embeddings)
+        # (results x 2): similarity of each result to the question and to the course
+        similarity = embeddings[2:] @ embeddings[:2].T
+
+        age = np.where(years > 0, current_year - years, WEB_RANK_RECENCY_YEARS)
+        recency = np.clip(1.0 - age / WEB_RANK_RECENCY_YEARS, 0.0, 1.0)
+        recency_weight = WEB_RANK_CURRENT_RECENCY_WEIGHT if prefer_recent else WEB_RANK_RECENCY_WEIGHT
+        scores = (
+            WEB_RANK_QUERY_WEIGHT * similarity[:, 0]
+            + WEB_RANK_COURSE_WEIGHT * similarity[:, 1]
+            + recency_weight * recency
+        )
+
+        order = np.argsort(-scores, kind="stable")[:top_n]
+        ranked = []
+        for i in order:
+            result = dict(results[i])
+            result["rank_score"] = float(scores[i])
+            result["year"] = int(years[i])
+            ranked.append(result)
+        logger.info(
+            f"Ranked {len(results)} web results, kept {len(ranked)} "
+            f"(scores {ranked[0]['rank_score']:.3f}..{ranked[-1]['rank_score']:.3f})"
+        )
+        return ranked
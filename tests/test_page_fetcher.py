@@ -0,0 +1,233 @@
+"""Page fetcher against a local HTTP fixture server."""
+
+import time
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from search import page_fetcher
+from search.page_fetcher import PageFetcher, UnsafeURLError, check_url
+
+VOCAB = ["transformer", "attention", "cooking", "gardening"]
+
+HTML_PAGE = b"""<html><head><style>p{}</style><script>var attention = 1;</script></head><body>
+<nav>Home | About</nav>
+<h1>Transformers</h1>
+<p>Cooking recipes are great for dinner parties with friends.</p>
+<p>The transformer architecture uses self attention to relate tokens.</p>
+<p>Attention weights are computed from queries and keys in the transformer.</p>
+<footer>copyright</footer>
+</body></html>"""
+
+
+def fake_embed(texts):
+    """Bag-of-words embedding over a tiny vocabulary."""
+    return [[text.lower().count(word) for word in VOCAB] for text in texts]
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """Serves the pages the tests fetch and records which paths were requested."""
+
+    def do_GET(self):
+        self.server.requested.append(self.path)
+        self.server.hosts.append(self.headers.get("Host"))
+        if self.path == "/page.html":
+            self._send(200, "text/html; charset=utf-8", HTML_PAGE)
+        elif self.path == "/notes.txt":
+            self._send(200, "text/plain", b"Attention heads in a transformer.\n\nUnrelated gardening tips.")
+        elif self.path == "/image.png":
+            self._send(200, "image/png", b"\x89PNG\r\n\x1a\n")
+        elif self.path == "/slow.html":
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.end_headers()
+            for _ in range(20):
+                self.wfile.write(b"<p>transformer attention</p>" * 5)
+                self.wfile.flush()
+                time.sleep(0.2)
+        elif self.path == "/redirect":
+            self._redirect(f"http://127.0.0.1:{self.server.server_port}/page.html")
+        elif self.path == "/redirect-private":
+            self._redirect(f"http://127.0.0.2:{self.server.server_port}/secret")
+        elif self.path == "/loop":
+            self._redirect("/loop")
+        elif self.path == "/secret":
+            self._send(200, "text/plain", b"transformer attention internal secret")
+        else:
+            self._send(404, "text/plain", b"not found")
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _redirect(self, location):
+        self.send_response(302)
+        self.send_header("Location", location)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("0.0.0.0", 0), FixtureHandler)
+    httpd.daemon_threads = True
+    httpd.requested = []
+    httpd.hosts = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def base_url(server):
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+@pytest.fixture
+def allow_fixture(server, monkeypatch):
+    """Treat the fixture server (127.0.0.1 on its port) as a public site; other addresses stay blocked."""
+    monkeypatch.setitem(page_fetcher.ALLOWED_PORTS, "http", {80, server.server_port})
+    monkeypatch.setattr(page_fetcher, "_is_public_address", lambda address: address == "127.0.0.1")
+
+
+@pytest.fixture
+def fetcher():
+    client = httpx.Client()
+    yield PageFetcher(embed=fake_embed, client=client)
+    client.close()
+
+
+def _unused_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_html_page_keeps_most_relevant_passages(fetcher, base_url, allow_fixture, monkeypatch):
+    split_passages = page_fetcher.split_passages
+    monkeypatch.setattr(page_fetcher, "split_passages", lambda text: split_passages(text, chunk_words=12))
+    monkeypatch.setattr(page_fetcher, "WEB_PAGE_CHUNKS_SELECTED", 2)
+    results = [{"url": f"{base_url}/page.html", "content": "thin"}]
+
+    fetcher.enrich("transformer attention", results)
+
+    excerpt = results[0]["excerpt"]
+    assert "self attention" in excerpt
+    assert "queries and keys" in excerpt
+    assert "Cooking" not in excerpt
+    assert "Home | About" not in excerpt
+    assert "var attention" not in excerpt
+
+
+def test_text_plain_page(fetcher, base_url, allow_fixture):
+    text = fetcher.fetch_page(f"{base_url}/notes.txt", timeout=5)
+
+    assert text.startswith("Attention heads")
+
+
+def test_binary_page_keeps_snippet(fetcher, base_url, allow_fixture):
+    results = [{"url": f"{base_url}/image.png", "content": "snippet"}]
+
+    fetcher.enrich("transformer", results)
+
+    assert "excerpt" not in results[0]
+
+
+def test_slow_page_is_cut_off_at_timeout(fetcher, base_url, allow_fixture):
+    started = time.monotonic()
+    text = fetcher.fetch_page(f"{base_url}/slow.html", timeout=1.0)
+
+    assert time.monotonic() - started < 2.0
+    assert text and "transformer attention" in text
+
+
+def test_unreachable_page(fetcher, allow_fixture, monkeypatch):
+    port = _unused_port()
+    monkeypatch.setitem(page_fetcher.ALLOWED_PORTS, "http", {80, port})
+
+    assert fetcher.fetch_page(f"http://127.0.0.1:{port}/", timeout=2) is None
+
+
+def test_redirect_is_followed(fetcher, base_url, allow_fixture):
+    text = fetcher.fetch_page(f"{base_url}/redirect", timeout=5)
+
+    assert "self attention" in text
+
+
+def test_redirect_loop_stops(fetcher, base_url, allow_fixture, server):
+    assert fetcher.fetch_page(f"{base_url}/loop", timeout=5) is None
+    assert len(server.requested) == page_fetcher.MAX_REDIRECTS + 1
+
+
+def test_redirect_to_private_address_is_refused(fetcher, base_url, allow_fixture, server):
+    results = [{"url": f"{base_url}/redirect-private", "content": "snippet"}]
+
+    fetcher.enrich("transformer attention", results)
+
+    assert "excerpt" not in results[0]
+    assert "/secret" not in server.requested
+
+
+def test_private_address_is_refused_before_connecting(fetcher, base_url, server, monkeypatch):
+    # Port allowed, but 127.0.0.1 is not treated as public
+    monkeypatch.setitem(page_fetcher.ALLOWED_PORTS, "http", {80, server.server_port})
+
+    assert fetcher.fetch_page(f"{base_url}/page.html", timeout=5) is None
+    assert server.requested == []
+
+
+def test_connects_to_checked_address(fetcher, server, allow_fixture, monkeypatch):
+    # The name resolves once to the fixture server; any second lookup (as a
+    # rebinding attack would exploit) fails, so the fetch only works if it is pinned
+    lookups = []
+    getaddrinfo = socket.getaddrinfo
+
+    def rebinding_getaddrinfo(host, port, *args, **kwargs):
+        if host != "rebind.test":
+            # Connecting to an IP address literal goes through getaddrinfo too
+            return getaddrinfo(host, port, *args, **kwargs)
+        lookups.append(host)
+        if len(lookups) > 1:
+            raise socket.gaierror("no second answer")
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", ("127.0.0.1", port))]
+
+    monkeypatch.setattr(socket, "getaddrinfo", rebinding_getaddrinfo)
+    host = f"rebind.test:{server.server_port}"
+
+    text = fetcher.fetch_page(f"http://{host}/notes.txt", timeout=5)
+
+    assert text.startswith("Attention heads")
+    assert lookups == ["rebind.test"]
+    assert server.hosts == [host]
+
+
+@pytest.mark.parametrize("url", [
+    "http://127.0.0.1/",
+    "http://localhost/",
+    "http://10.0.0.5/",
+    "http://192.168.1.1/",
+    "http://169.254.169.254/latest/meta-data/",
+    "http://[::1]/",
+    "http://[::ffff:127.0.0.1]/",
+    "ftp://example.com/",
+    "file:///etc/passwd",
+    "http://example.com:8080/",
+])
+def test_check_url_rejects(url):
+    with pytest.raises(UnsafeURLError):
+        check_url(url)
+
+
+def test_check_url_accepts_public_address():
+    assert check_url("https://8.8.8.8/path").host == "8.8.8.8"
@@ -4,6 +4,13 @@ import hashlib
 import streamlit as st
 
 
+@st.cache_resource
+def get_flashcard_generator():
+    """Get the shared flashcard generator (one retriever and Pinecone connection per process)."""
+    from core.flashcard_generator import FlashcardGenerator
+    return FlashcardGenerator()
+
+
 def display_flashcards(flashcards):
     """Display flashcards in an interactive format."""
     if not flashcards:
@@ -67,22 +74,25 @@ def handle_user_input(user_query, generate_response):
     
     # Check if this is a follow-up answer
     if st.session_state.get('follow_up_needed', False):
-        # This is an answer to a follow-up question
-        from core.agent import PRISMAgent
+        # This is an answer to a follow-up question. Use the shared agent so the
+        # thread's checkpointed history is kept and no graph is recompiled.
+        from core.agent import get_prism_agent
+        from ui.session import get_thread_id, get_conversation_history
         
-        agent = PRISMAgent()
+        agent = get_prism_agent()
         course_name = st.session_state.user_context.get('course')
         user_context = st.session_state.user_context
-        thread_id = f"session_{st.session_state.user_context.get('student_id', 'default')}"
         
         # Refine and process
-        result = agent.refine_query_with_follow_up(
-            original_query=st.session_state.original_query,
-            follow_up_answer=user_query,
-            course_name=course_name,
-            user_context=user_context,
-            thread_id=thread_id
-        )
+        with st.spinner(f"PRISM Agent (Course: {course_name}) is thinking..."):
+            result = agent.refine_query_with_follow_up(
+                original_query=st.session_state.original_query,
+                follow_up_answer=user_query,
+                course_name=course_name,
+                user_context=user_context,
+                thread_id=get_thread_id(),
+                conversation_history=get_conversation_history()
+            )
         
         # Store follow-up answer (without "Follow-up:" prefix for cleaner conversation)
         st.session_state.chat_history.append({"role": "user", "content": user_query})
@@ -142,7 +152,7 @@ def handle_user_input(user_query, generate_response):
 
 def handle_flashcard_generation(topic: str):
     """Handle flashcard generation request."""
-    from core.flashcard_generator import FlashcardGenerator
+    from core.flashcard_session import FlashcardSession
     
     # Store topic
     st.session_state.flashcard_topic = topic
@@ -162,13 +172,16 @@ def handle_flashcard_generation(topic: str):
     # Generate flashcards
     with st.chat_message("assistant", avatar="🧠"):
         with st.spinner("Generating flashcards..."):
-            generator = FlashcardGenerator()
-            result = generator.generate_flashcards(
+            # Keep the ranked chunks for this topic so "Generate 5 More" does not re-retrieve
+            flashcard_session = FlashcardSession(
+                generator=get_flashcard_generator(),
                 topic=topic,
                 course_name=st.session_state.user_context.get('course'),
-                existing_flashcards=all_existing_flashcards,
-                num_flashcards=5
+                num_flashcards=5,
+                student_id=st.session_state.user_context.get('student_id')
             )
+            st.session_state.flashcard_session = flashcard_session
+            result = flashcard_session.start(existing_flashcards=all_existing_flashcards)
             
             if result['flashcards']:
                 # Show response
@@ -220,27 +233,33 @@ def render_chat_interface(generate_response):
         with col2:
             if st.button("Generate 5 More", use_container_width=True, key="generate_more_flashcards"):
                 if st.session_state.get('flashcard_topic'):
-                    # Get all existing flashcards from chat history
-                    all_existing_flashcards = []
-                    for msg in st.session_state.chat_history:
-                        if msg.get("role") == "assistant" and msg.get("flashcards"):
-                            all_existing_flashcards.extend(msg.get("flashcards", []))
-                    
                     # Add user message for "Generate 5 More"
                     st.session_state.chat_history.append({
                         "role": "user",
                         "content": "Generate 5 more flashcards"
                     })
                     
-                    # Generate more flashcards
-                    from core.flashcard_generator import FlashcardGenerator
-                    generator = FlashcardGenerator()
-                    result = generator.generate_flashcards(
-                        topic=st.session_state.flashcard_topic,
-                        course_name=st.session_state.user_context.get('course'),
-                        existing_flashcards=all_existing_flashcards,
-                        num_flashcards=5
-                    )
+                    # Continue the topic's flashcard session (next page is usually prefetched)
+                    flashcard_session = st.session_state.get('flashcard_session')
+                    if flashcard_session is not None and flashcard_session.topic == st.session_state.flashcard_topic:
+                        result = flashcard_session.more()
+                    else:
+                        # No session (e.g. after a restart): start one, skipping cards already shown
+                        from core.flashcard_session import FlashcardSession
+                        all_existing_flashcards = []
+                        for msg in st.session_state.chat_history:
+                            if msg.get("role") == "assistant" and msg.get("flashcards"):
+                                all_existing_flashcards.extend(msg.get("flashcards", []))
+                        
+                        flashcard_session = FlashcardSession(
+                            generator=get_flashcard_generator(),
+                            topic=st.session_state.flashcard_topic,
+                            course_name=st.session_state.user_context.get('course'),
+                            num_flashcards=5,
+                            student_id=st.session_state.user_context.get('student_id')
+                        )
+                        st.session_state.flashcard_session = flashcard_session
+                        result = flashcard_session.start(existing_flashcards=all_existing_flashcards)
                     
                     if result['flashcards']:
                         response = f"Generated {len(result['flashcards'])} more flashcards! 📚"
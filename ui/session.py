@@ -25,6 +25,12 @@ def initialize_session_state():
     
     if 'flashcard_topic' not in st.session_state:
         st.session_state.flashcard_topic = None
+    
+    if 'flashcard_session' not in st.session_state:
+        st.session_state.flashcard_session = None
+    
+    if 'thread_id' not in st.session_state:
+        st.session_state.thread_id = None
 
 
 def handle_start_session(course_options, degree_options):
@@ -57,3 +63,52 @@ def handle_start_session(course_options, degree_options):
     })
     st.rerun()
 
+
+def get_thread_id() -> str:
+    """
+    Conversation memory thread for the current session, shared by every chat path.
+
+    A thread freed while the session sat idle is replaced by a new one, which
+    the agent seeds from the chat history; the student is told so.
+    """
+    from core.agent import get_prism_agent
+    session_manager = get_prism_agent().session_manager
+    thread_id = st.session_state.get('thread_id')
+    if thread_id and not session_manager.is_active(thread_id):
+        st.info("This chat was idle for a while, so PRISM reloaded the conversation from the messages above.")
+        thread_id = None
+    if not thread_id:
+        st.session_state.thread_id = session_manager.new_thread_id(
+            st.session_state.user_context.get('student_id')
+        )
+    return st.session_state.thread_id
+
+
+def get_conversation_history(exclude_last: bool = False):
+    """
+    Chat messages for the agent, as role/content dicts.
+
+    Args:
+        exclude_last: Leave out the last message (the query being answered)
+
+    Returns:
+        The messages, or None if there are none
+    """
+    messages = st.session_state.get('chat_history', [])
+    if exclude_last:
+        messages = messages[:-1]
+    history = [
+        {"role": msg["role"], "content": msg["content"]}
+        for msg in messages
+        if msg["role"] in ["user", "assistant"] and msg.get("content")  # Filter out None content
+    ]
+    return history or None
+
+
+def end_thread():
+    """Frees the current session's conversation memory; the next question starts a new thread."""
+    thread_id = st.session_state.get('thread_id')
+    if thread_id:
+        from core.agent import get_prism_agent
+        get_prism_agent().session_manager.end_thread(thread_id)
+        st.session_state.thread_id = None
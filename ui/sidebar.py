@@ -5,6 +5,8 @@ import streamlit as st
 
 def reset_session():
     """Resets the session to initial state for a new chat."""
+    from ui.session import end_thread
+    end_thread()
     st.session_state.chat_history = [
         {"role": "assistant", "content": "Welcome to PRISM! Please fill out the form on the left to start your adaptive learning session."}
     ]
@@ -20,6 +22,8 @@ def reset_session():
         st.session_state.flashcards = []
     if 'flashcard_topic' in st.session_state:
         st.session_state.flashcard_topic = None
+    if 'flashcard_session' in st.session_state:
+        st.session_state.flashcard_session = None
     # Clear follow-up state
     if 'follow_up_needed' in st.session_state:
         st.session_state.follow_up_needed = False
@@ -43,6 +47,17 @@ def render_new_chat_button():
         st.rerun()
 
 
+def render_readiness():
+    """Renders a one-line status while the assistant warms up after a restart."""
+    from core.warmup import warmup_status
+    
+    state = warmup_status()["state"]
+    if state == "warming":
+        st.caption("⏳ Getting PRISM ready... the first answer may take a little longer.")
+    elif state == "failed":
+        st.caption("⚠️ Some services could not be reached at startup; they will be retried on your first question.")
+
+
 def render_sidebar(course_options, degree_options, handle_start_session):
     """Renders the complete sidebar with user context and session setup."""
     with st.sidebar:
@@ -57,6 +72,7 @@ def render_sidebar(course_options, degree_options, handle_start_session):
             '</div>',
             unsafe_allow_html=True
         )
+        render_readiness()
         st.markdown("---")
         
         # New Chat button
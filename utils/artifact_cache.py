@@ -0,0 +1,46 @@
+"""Process-wide cache for locally built artifacts loaded from disk."""
+
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Loaded artifacts keyed by path, invalidated when the file changes on disk
+_artifact_cache: Dict[str, Tuple[float, Any]] = {}
+_artifact_cache_lock = threading.Lock()
+
+
+def load_cached_artifact(path: Path, loader: Callable[[Path], Any]) -> Optional[Any]:
+    """
+    Load an artifact file, reusing the cached object while the file is unchanged.
+    
+    Args:
+        path: Location of the artifact
+        loader: Function that loads the artifact from the path
+        
+    Returns:
+        The loaded artifact, or None if the file is missing or fails to load
+    """
+    path = Path(path)
+    try:
+        mtime = path.stat().st_mtime
+    except FileNotFoundError:
+        return None
+    
+    key = str(path)
+    with _artifact_cache_lock:
+        cached = _artifact_cache.get(key)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        
+        try:
+            artifact = loader(path)
+        except Exception as e:
+            logger.error(f"Error loading artifact from {path}: {e}")
+            return None
+        
+        _artifact_cache[key] = (mtime, artifact)
+        logger.info(f"Loaded artifact {path}")
+        return artifact
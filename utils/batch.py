@@ -0,0 +1,292 @@
+"""Resumable offline batch jobs through the OpenAI Batch API or a local stand-in."""
+
+import json
+import time
+import uuid
+import logging
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from config.settings import BATCH_BACKEND, BATCH_POLL_SECONDS, BATCH_COMPLETION_WINDOW
+from utils.http_clients import get_openai_client
+from utils.resilience import call_upstream
+
+logger = logging.getLogger(__name__)
+
+CHAT_COMPLETIONS_URL = "/v1/chat/completions"
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+def write_requests(path: Path, requests: List[Tuple[str, Dict[str, Any]]]):
+    """
+    Write chat completion requests in the batch input JSONL format.
+
+    Args:
+        path: Input file to write
+        requests: (custom_id, request body) pairs
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        for custom_id, body in requests:
+            f.write(json.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": CHAT_COMPLETIONS_URL,
+                "body": body
+            }) + "\n")
+
+
+def parse_output(text: str) -> Dict[str, Optional[str]]:
+    """
+    Read message contents from batch output JSONL.
+
+    Args:
+        text: Output file contents
+
+    Returns:
+        Mapping of custom_id to the completion's message content, or None for failed requests
+    """
+    results = {}
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        content = None
+        response = record.get("response") or {}
+        if not record.get("error") and response.get("status_code") == 200:
+            choices = (response.get("body") or {}).get("choices") or []
+            if choices:
+                content = choices[0].get("message", {}).get("content")
+        results[record["custom_id"]] = content
+    return results
+
+
+class OpenAIBatchBackend:
+    """Submits the input file to the OpenAI Batch API (half price, 24h completion window)."""
+
+    name = "openai"
+
+    def __init__(self):
+        """Initialize with the shared OpenAI client."""
+        self.client = get_openai_client()
+
+    def submit(self, input_path: Path) -> str:
+        """Upload the input file and create the batch, returning its ID."""
+        with open(input_path, 'rb') as f:
+            input_file = call_upstream("openai", lambda timeout: self.client.files.create(
+                file=f,
+                purpose="batch",
+                timeout=timeout
+            ), max_attempts=1)
+        batch = call_upstream("openai", lambda timeout: self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=CHAT_COMPLETIONS_URL,
+            completion_window=BATCH_COMPLETION_WINDOW,
+            timeout=timeout
+        ), max_attempts=1)
+        return batch.id
+
+    def status(self, batch_id: str) -> str:
+        """Get the batch's status (e.g. "in_progress", "completed")."""
+        batch = call_upstream("openai", lambda timeout: self.client.batches.retrieve(batch_id, timeout=timeout))
+        return batch.status
+
+    def results(self, batch_id: str) -> Dict[str, Optional[str]]:
+        """Download a finished batch's output and error files."""
+        batch = call_upstream("openai", lambda timeout: self.client.batches.retrieve(batch_id, timeout=timeout))
+        results: Dict[str, Optional[str]] = {}
+        for file_id in (batch.error_file_id, batch.output_file_id):
+            if file_id:
+                content = call_upstream("openai", lambda timeout: self.client.files.content(file_id, timeout=timeout))
+                results.update(parse_output(content.text))
+        return results
+
+
+class LocalBatchBackend:
+    """
+    Runs the input file's requests one by one and writes output in the batch format.
+
+    Useful in development and tests, where waiting on the Batch API is not
+    wanted; pass `complete` to avoid calling OpenAI at all.
+    """
+
+    name = "local"
+
+    def __init__(self, work_dir: Path, complete: Optional[Callable[[Dict[str, Any]], str]] = None):
+        """
+        Initialize the backend.
+
+        Args:
+            work_dir: Directory for the output files
+            complete: Function turning a request body into message content
+                (defaults to a chat completion on the shared OpenAI client)
+        """
+        self.work_dir = Path(work_dir)
+        self.complete = complete or self._openai_complete
+
+    @staticmethod
+    def _openai_complete(body: Dict[str, Any]) -> str:
+        client = get_openai_client()
+        response = call_upstream("openai", lambda timeout: client.chat.completions.create(**body, timeout=timeout))
+        return response.choices[0].message.content
+
+    def _output_path(self, batch_id: str) -> Path:
+        return self.work_dir / f"{batch_id}_output.jsonl"
+
+    def submit(self, input_path: Path) -> str:
+        """Run every request now and return an ID for the written output."""
+        batch_id = f"local_{uuid.uuid4().hex}"
+        self.work_dir.mkdir(parents=True, exist_ok=True)
+        with open(input_path, 'r', encoding='utf-8') as f_in, open(self._output_path(batch_id), 'w', encoding='utf-8') as f_out:
+            for line in f_in:
+                if not line.strip():
+                    continue
+                request = json.loads(line)
+                try:
+                    content = self.complete(request["body"])
+                    record = {
+                        "custom_id": request["custom_id"],
+                        "response": {"status_code": 200, "body": {"choices": [{"message": {"content": content}}]}},
+                        "error": None
+                    }
+                except Exception as e:
+                    logger.error(f"Local batch request {request['custom_id']} failed: {e}")
+                    record = {"custom_id": request["custom_id"], "response": None, "error": {"message": str(e)}}
+                f_out.write(json.dumps(record) + "\n")
+        return batch_id
+
+    def status(self, batch_id: str) -> str:
+        """Local batches finish during submit."""
+        return "completed" if self._output_path(batch_id).exists() else "failed"
+
+    def results(self, batch_id: str) -> Dict[str, Optional[str]]:
+        """Read the written output."""
+        return parse_output(self._output_path(batch_id).read_text(encoding='utf-8'))
+
+
+def get_batch_backend(name: str = BATCH_BACKEND, work_dir: Optional[Path] = None):
+    """
+    Create a batch backend by name.
+
+    Args:
+        name: "openai" or "local"
+        work_dir: Output directory for the local backend
+
+    Returns:
+        The backend
+    """
+    if name == "openai":
+        return OpenAIBatchBackend()
+    if name == "local":
+        return LocalBatchBackend(work_dir or Path("."))
+    raise ValueError(f"Unknown batch backend: {name}")
+
+
+class BatchJob:
+    """
+    A batch of requests whose progress is kept in a state file.
+
+    The state file records the submitted batch ID, so an interrupted run
+    resumes by polling the same batch instead of submitting (and paying for)
+    it again. Once results are merged the next run starts a fresh batch.
+    """
+
+    def __init__(self, state_path: Path, backend):
+        """
+        Initialize the job.
+
+        Args:
+            state_path: JSON file holding the job's progress
+            backend: OpenAIBatchBackend, LocalBatchBackend or compatible
+        """
+        self.state_path = Path(state_path)
+        self.input_path = self.state_path.with_name(self.state_path.stem + "_input.jsonl")
+        self.backend = backend
+        self.state: Dict[str, Any] = {}
+
+    def _load_state(self) -> Optional[Dict[str, Any]]:
+        if not self.state_path.exists():
+            return None
+        with open(self.state_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save_state(self):
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.state_path.with_suffix(".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f)
+        tmp_path.replace(self.state_path)
+
+    def run(
+        self,
+        build: Callable[[], Tuple[List[Tuple[str, Dict[str, Any]]], Dict[str, Any]]],
+        merge: Callable[[Dict[str, Optional[str]], Dict[str, Any]], Any],
+        wait: bool = True,
+        poll_seconds: float = BATCH_POLL_SECONDS
+    ) -> Dict[str, Any]:
+        """
+        Build, submit, poll and merge the batch, resuming from the state file.
+
+        Args:
+            build: Returns the (custom_id, body) requests and any context the merge needs
+            merge: Writes results (custom_id to content or None) into the artifacts,
+                given the context from build
+            wait: Poll until the batch finishes; otherwise return after one status check
+            poll_seconds: Seconds between status checks
+
+        Returns:
+            The job state, with "status" of "submitted", "merged" or a failure status
+        """
+        previous = self._load_state()
+        if previous and previous.get("status") not in ("merged", "failed", "expired", "cancelled"):
+            if previous.get("backend") != self.backend.name:
+                raise ValueError(
+                    f"{self.state_path} belongs to a {previous.get('backend')} batch; "
+                    f"finish it with that backend or delete the state file"
+                )
+            self.state = previous
+            logger.info(f"Resuming batch job {self.state_path.name} ({self.state['status']}, batch {self.state.get('batch_id')})")
+        else:
+            requests, context = build()
+            if not requests:
+                logger.info("Nothing to submit")
+                return {"status": "empty"}
+            write_requests(self.input_path, requests)
+            self.state = {
+                "backend": self.backend.name,
+                "status": "built",
+                "batch_id": None,
+                "requests": len(requests),
+                "context": context,
+                "created_at": time.time()
+            }
+            self._save_state()
+            logger.info(f"Wrote {len(requests)} batch requests to {self.input_path}")
+
+        if not self.state.get("batch_id"):
+            self.state["batch_id"] = self.backend.submit(self.input_path)
+            self.state["status"] = "submitted"
+            self._save_state()
+            logger.info(f"Submitted batch {self.state['batch_id']}")
+
+        while True:
+            status = self.backend.status(self.state["batch_id"])
+            if status in TERMINAL_STATUSES or not wait:
+                break
+            logger.info(f"Batch {self.state['batch_id']} is {status}; checking again in {poll_seconds:.0f}s")
+            time.sleep(poll_seconds)
+
+        if status != "completed":
+            if status in TERMINAL_STATUSES:
+                self.state["status"] = status
+                self._save_state()
+                logger.error(f"Batch {self.state['batch_id']} ended with status {status}")
+            return self.state
+
+        results = self.backend.results(self.state["batch_id"])
+        failed = sum(1 for content in results.values() if content is None)
+        logger.info(f"Batch {self.state['batch_id']} completed: {len(results) - failed} results, {failed} failed")
+        merge(results, self.state.get("context", {}))
+        self.state["status"] = "merged"
+        self._save_state()
+        return self.state
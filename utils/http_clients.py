@@ -0,0 +1,187 @@
+"""Process-wide pooled clients for OpenAI, Pinecone, Tavily and web page fetches.
+
+Nodes and agents are created per call, so clients owned by them throw away
+their connection pools. These getters build each client once and share it,
+keeping connections (and their TLS sessions) alive between requests.
+"""
+
+import logging
+import threading
+from typing import Optional
+import httpx
+from config.settings import (
+    OPENAI_API_KEY,
+    PINECONE_API_KEY,
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_TIMEOUT,
+    HTTP2_ENABLED,
+    validate_settings
+)
+from utils.metrics import connection_metrics
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_openai_client = None
+_pinecone_client = None
+_tavily_client = None
+_web_client = None
+
+
+def _http2_supported() -> bool:
+    """HTTP/2 needs the optional h2 package."""
+    if not HTTP2_ENABLED:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _track_connections(upstream: str):
+    """Build httpx event hooks recording whether each request opened a new connection."""
+    def on_request(request: httpx.Request):
+        opened = []
+
+        def trace(event_name: str, info: dict):
+            if event_name == "connection.connect_tcp.complete":
+                opened.append(True)
+
+        request.extensions["trace"] = trace
+        request.extensions["prism_opened"] = opened
+
+    def on_response(response: httpx.Response):
+        opened = response.request.extensions.get("prism_opened")
+        if opened is not None:
+            connection_metrics.record(upstream, reused=not opened)
+
+    return {"request": [on_request], "response": [on_response]}
+
+
+def create_http_client(upstream: str) -> httpx.Client:
+    """
+    Create a pooled httpx client using the configured limits and timeouts.
+
+    Args:
+        upstream: Name recorded in connection metrics
+
+    Returns:
+        An httpx client with keep-alive, and HTTP/2 when available
+    """
+    return httpx.Client(
+        http2=_http2_supported(),
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+        ),
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        event_hooks=_track_connections(upstream)
+    )
+
+
+def get_openai_client():
+    """Get the shared OpenAI client."""
+    global _openai_client
+    if _openai_client is None:
+        with _lock:
+            if _openai_client is None:
+                validate_settings()
+                from openai import OpenAI
+                # Retries are handled by utils.resilience within the request deadline
+                _openai_client = OpenAI(
+                    api_key=OPENAI_API_KEY,
+                    http_client=create_http_client("openai"),
+                    max_retries=0
+                )
+                logger.info(f"Created shared OpenAI client (HTTP/2: {_http2_supported()})")
+    return _openai_client
+
+
+def get_pinecone_client():
+    """Get the shared Pinecone client."""
+    global _pinecone_client
+    if _pinecone_client is None:
+        with _lock:
+            if _pinecone_client is None:
+                validate_settings()
+                from pinecone import Pinecone
+                try:
+                    _pinecone_client = Pinecone(
+                        api_key=PINECONE_API_KEY,
+                        timeout=HTTP_TIMEOUT,
+                        connection_pool_maxsize=HTTP_MAX_CONNECTIONS
+                    )
+                except TypeError:
+                    # Older clients do not take pool options; sharing the client still reuses its pool
+                    _pinecone_client = Pinecone(api_key=PINECONE_API_KEY)
+                logger.info("Created shared Pinecone client")
+    return _pinecone_client
+
+
+def get_tavily_client(api_key: str) -> Optional[object]:
+    """
+    Get the shared Tavily client, backed by a pooled requests session.
+
+    Args:
+        api_key: Tavily API key
+
+    Returns:
+        The client, or None if tavily-python is not installed
+    """
+    global _tavily_client
+    if _tavily_client is None:
+        with _lock:
+            if _tavily_client is None:
+                try:
+                    from tavily import TavilyClient
+                except ImportError:
+                    return None
+                try:
+                    _tavily_client = TavilyClient(api_key=api_key, session=_create_requests_session("tavily"))
+                except TypeError:
+                    # Older clients manage their own session
+                    _tavily_client = TavilyClient(api_key=api_key)
+                logger.info("Created shared Tavily client")
+    return _tavily_client
+
+
+def get_web_client() -> httpx.Client:
+    """Get the shared client used to fetch web pages found by search."""
+    global _web_client
+    if _web_client is None:
+        with _lock:
+            if _web_client is None:
+                _web_client = create_http_client("web")
+                logger.info("Created shared web page client")
+    return _web_client
+
+
+def _create_requests_session(upstream: str):
+    """Create a requests session whose adapter keeps a pool sized like the httpx clients."""
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    class _TrackingAdapter(HTTPAdapter):
+        def send(self, request, **kwargs):
+            # Look up the pool the same way HTTPAdapter.send does
+            if hasattr(self, "get_connection_with_tls_context"):
+                pool = self.get_connection_with_tls_context(
+                    request, kwargs.get("verify", True), kwargs.get("proxies"), kwargs.get("cert")
+                )
+            else:
+                pool = self.get_connection(request.url, kwargs.get("proxies"))
+            opened_before = pool.num_connections
+            response = super().send(request, **kwargs)
+            connection_metrics.record(upstream, reused=pool.num_connections == opened_before)
+            return response
+
+    session = requests.Session()
+    adapter = _TrackingAdapter(pool_connections=HTTP_MAX_KEEPALIVE, pool_maxsize=HTTP_MAX_CONNECTIONS)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
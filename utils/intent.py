@@ -0,0 +1,19 @@
+"""Lightweight query intent detection shared by the graph nodes."""
+
+import re
+
+# Words signalling that the student wants up-to-date information
+CURRENT_INFO_KEYWORDS = [
+    "latest", "current", "recent", "new", "updated", "now", "today", "2024", "2025"
+]
+
+# Whole-word match, so "know" or "newton" do not count as "now" or "new"
+_CURRENT_INFO_PATTERN = re.compile(
+    r'\b(?:' + '|'.join(re.escape(keyword) for keyword in CURRENT_INFO_KEYWORDS) + r')\b',
+    re.IGNORECASE
+)
+
+
+def needs_current_info(query: str) -> bool:
+    """Check whether a question asks for current or recently updated information."""
+    return bool(query) and _CURRENT_INFO_PATTERN.search(query) is not None
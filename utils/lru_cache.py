@@ -0,0 +1,63 @@
+"""Thread-safe in-memory LRU cache with optional expiry."""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, List, Optional, Tuple
+
+
+class LRUCache:
+    """Bounded mapping that evicts the least recently used entries."""
+
+    def __init__(self, max_size: int, ttl: Optional[float] = None):
+        """
+        Initialize the cache.
+
+        Args:
+            max_size: Maximum number of entries
+            ttl: Seconds an entry stays valid, or None for no expiry
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Get a cached value, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (self.ttl is not None and time.monotonic() - entry[0] > self.ttl):
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, value: Any):
+        """Store a value, evicting the oldest entries beyond the size limit."""
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def items(self) -> List[Tuple[Hashable, Any]]:
+        """Snapshot of the unexpired entries, oldest first."""
+        with self._lock:
+            now = time.monotonic()
+            return [
+                (key, value) for key, (stored, value) in self._entries.items()
+                if self.ttl is None or now - stored <= self.ttl
+            ]
+
+    def clear(self):
+        """Remove every entry."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,185 @@
+"""Process-wide counters for the shared HTTP clients, LLM prompt caching and node latency."""
+
+import time
+import threading
+from collections import deque
+from functools import wraps
+from typing import Any, Callable, Deque, Dict
+from config.settings import LATENCY_SAMPLES
+
+
+class ConnectionMetrics:
+    """Counts requests and newly opened connections per upstream."""
+
+    def __init__(self):
+        """Initialize empty counters."""
+        self._requests: Dict[str, int] = {}
+        self._new_connections: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, upstream: str, reused: bool):
+        """
+        Record one completed request.
+
+        Args:
+            upstream: Name of the service (e.g. "openai", "tavily")
+            reused: Whether the request went over an already open connection
+        """
+        with self._lock:
+            self._requests[upstream] = self._requests.get(upstream, 0) + 1
+            if not reused:
+                self._new_connections[upstream] = self._new_connections.get(upstream, 0) + 1
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """
+        Get the current counters.
+
+        Returns:
+            Mapping of upstream to requests, new_connections and reuse_rate
+        """
+        with self._lock:
+            stats = {}
+            for upstream, requests in self._requests.items():
+                new_connections = self._new_connections.get(upstream, 0)
+                stats[upstream] = {
+                    "requests": requests,
+                    "new_connections": new_connections,
+                    "reuse_rate": round(1 - new_connections / requests, 3) if requests else 0.0
+                }
+            return stats
+
+    def reset(self):
+        """Clear all counters."""
+        with self._lock:
+            self._requests.clear()
+            self._new_connections.clear()
+
+
+connection_metrics = ConnectionMetrics()
+
+
+class PromptCacheMetrics:
+    """Counts prompt tokens and provider-cached prompt tokens per prompt."""
+
+    def __init__(self):
+        """Initialize empty counters."""
+        self._prompt_tokens: Dict[str, int] = {}
+        self._cached_tokens: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, prompt: str, usage) -> float:
+        """
+        Record the token usage of one completion.
+
+        Args:
+            prompt: Name of the prompt (e.g. "personalization")
+            usage: The response's usage object, or None
+
+        Returns:
+            Share of this call's prompt tokens served from the cache
+        """
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = getattr(details, "cached_tokens", 0) or 0
+        with self._lock:
+            self._prompt_tokens[prompt] = self._prompt_tokens.get(prompt, 0) + prompt_tokens
+            self._cached_tokens[prompt] = self._cached_tokens.get(prompt, 0) + cached_tokens
+        return round(cached_tokens / prompt_tokens, 3) if prompt_tokens else 0.0
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """
+        Get the current counters.
+
+        Returns:
+            Mapping of prompt to prompt_tokens, cached_tokens and cached_share
+        """
+        with self._lock:
+            stats = {}
+            for prompt, prompt_tokens in self._prompt_tokens.items():
+                cached_tokens = self._cached_tokens.get(prompt, 0)
+                stats[prompt] = {
+                    "prompt_tokens": prompt_tokens,
+                    "cached_tokens": cached_tokens,
+                    "cached_share": round(cached_tokens / prompt_tokens, 3) if prompt_tokens else 0.0
+                }
+            return stats
+
+    def reset(self):
+        """Clear all counters."""
+        with self._lock:
+            self._prompt_tokens.clear()
+            self._cached_tokens.clear()
+
+
+prompt_cache_metrics = PromptCacheMetrics()
+
+
+class LatencyMetrics:
+    """Keeps recent timings per graph node or LLM call site."""
+
+    def __init__(self, max_samples: int = LATENCY_SAMPLES):
+        """
+        Initialize empty timings.
+
+        Args:
+            max_samples: Recent timings kept per name for percentiles
+        """
+        self.max_samples = max_samples
+        self._samples: Dict[str, Deque[float]] = {}
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float):
+        """
+        Record one timing.
+
+        Args:
+            name: Node or call site (e.g. "relevance", "llm.relevance[gpt-4o-mini]")
+            seconds: Time taken
+        """
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self.max_samples)
+            samples.append(seconds)
+            self._counts[name] = self._counts.get(name, 0) + 1
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """
+        Get the current timings.
+
+        Returns:
+            Mapping of name to calls, and mean, p50 and p95 milliseconds over recent samples
+        """
+        with self._lock:
+            stats = {}
+            for name, samples in self._samples.items():
+                ordered = sorted(samples)
+                stats[name] = {
+                    "calls": self._counts[name],
+                    "mean_ms": round(1000 * sum(ordered) / len(ordered), 1),
+                    "p50_ms": round(1000 * ordered[len(ordered) // 2], 1),
+                    "p95_ms": round(1000 * ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 1)
+                }
+            return stats
+
+    def reset(self):
+        """Clear all timings."""
+        with self._lock:
+            self._samples.clear()
+            self._counts.clear()
+
+
+latency_metrics = LatencyMetrics()
+
+
+def timed_node(name: str, node: Callable[[Dict[str, Any]], Dict[str, Any]]) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    """Wrap a LangGraph node so its run time is recorded under its name."""
+    @wraps(node)
+    def wrapper(state: Dict[str, Any]) -> Dict[str, Any]:
+        start = time.perf_counter()
+        try:
+            return node(state)
+        finally:
+            latency_metrics.record(name, time.perf_counter() - start)
+    return wrapper
@@ -0,0 +1,79 @@
+"""Per-node model selection with escalation of low-confidence triage answers."""
+
+import json
+import time
+import logging
+from typing import Any, Dict, List
+from config.settings import OPENAI_MODEL, MODEL_ESCALATION_ENABLED, ESCALATION_CONFIDENCE
+from config.prompts import get_node_model
+from utils.http_clients import get_openai_client
+from utils.metrics import latency_metrics
+from utils.resilience import call_upstream
+
+logger = logging.getLogger(__name__)
+
+
+def _json_call(node: str, model: str, messages: List[Dict[str, str]], temperature: float) -> Dict[str, Any]:
+    """Make one JSON-mode completion and record its latency under the node and model."""
+    client = get_openai_client()
+    start = time.perf_counter()
+    try:
+        response = call_upstream("openai", lambda timeout: client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            response_format={"type": "json_object"},
+            timeout=timeout
+        ))
+    finally:
+        latency_metrics.record(f"llm.{node}[{model}]", time.perf_counter() - start)
+    return json.loads(response.choices[0].message.content)
+
+
+def _is_confident(result: Dict[str, Any]) -> bool:
+    """Whether a triage answer's self-reported confidence clears the escalation threshold."""
+    try:
+        return float(result.get("confidence", 1.0)) >= ESCALATION_CONFIDENCE
+    except (TypeError, ValueError):
+        return False
+
+
+def json_completion(
+    node: str,
+    system_prompt: str,
+    user_prompt: str,
+    temperature: float = 0.3
+) -> Dict[str, Any]:
+    """
+    Run a JSON classification call on the node's configured model.
+
+    When the node uses a smaller model than OPENAI_MODEL, an answer that is not
+    valid JSON or reports a confidence below ESCALATION_CONFIDENCE is asked
+    again on OPENAI_MODEL.
+
+    Args:
+        node: Call site name under node_models in prompts.yaml
+        system_prompt: System message
+        user_prompt: User message
+        temperature: Sampling temperature
+
+    Returns:
+        Parsed JSON answer
+    """
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+    model = get_node_model(node)
+    if not MODEL_ESCALATION_ENABLED or model == OPENAI_MODEL:
+        return _json_call(node, model, messages, temperature)
+
+    try:
+        result = _json_call(node, model, messages, temperature)
+        if _is_confident(result):
+            return result
+        logger.info(f"{node}: {model} answered with confidence {result.get('confidence')}, escalating to {OPENAI_MODEL}")
+    except json.JSONDecodeError as e:
+        logger.info(f"{node}: {model} returned invalid JSON ({e}), escalating to {OPENAI_MODEL}")
+
+    return _json_call(node, OPENAI_MODEL, messages, temperature)
@@ -0,0 +1,28 @@
+"""Filesystem locations for locally built course artifacts."""
+
+import re
+from pathlib import Path
+from config.settings import INDEX_DIR
+
+
+def course_slug(course_name: str) -> str:
+    """Convert a course name into a filesystem-safe directory name."""
+    slug = re.sub(r'[^A-Za-z0-9_-]+', '_', course_name.strip())
+    return slug.strip('_') or "course"
+
+
+def course_index_dir(course_name: str, create: bool = False) -> Path:
+    """
+    Get the directory holding local indexes for a course.
+    
+    Args:
+        course_name: Name of the course
+        create: Create the directory if it does not exist
+        
+    Returns:
+        Path to the course's index directory
+    """
+    path = Path(INDEX_DIR) / course_slug(course_name)
+    if create:
+        path.mkdir(parents=True, exist_ok=True)
+    return path
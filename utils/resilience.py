@@ -0,0 +1,208 @@
+"""Deadline budget, retries and circuit breakers for calls to external services."""
+
+import time
+import random
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Dict, Optional
+from config.settings import (
+    UPSTREAM_TIMEOUTS,
+    RETRY_MAX_ATTEMPTS,
+    RETRY_BASE_DELAY,
+    RETRY_MAX_DELAY,
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_RESET_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+MIN_CALL_TIMEOUT = 1.0  # Calls are not started with less budget than this
+TRANSIENT_STATUS_CODES = {408, 409, 429}
+
+# Wall-clock time (time.time()) by which the current student request must finish
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """Raised when the request's time budget is spent before a call starts."""
+
+
+class CircuitOpenError(Exception):
+    """Raised when an upstream's circuit breaker is rejecting calls."""
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[float]):
+    """
+    Make a deadline current for the calls made inside the block.
+
+    Args:
+        deadline: Wall-clock time the request must finish by, or None for no deadline
+    """
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_budget() -> Optional[float]:
+    """Seconds left before the current deadline, or None when there is no deadline."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.time()
+
+
+def with_deadline(node: Callable[[Dict[str, Any]], Dict[str, Any]]) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    """Wrap a LangGraph node so calls it makes honour the deadline stored in the state."""
+    @wraps(node)
+    def wrapper(state: Dict[str, Any]) -> Dict[str, Any]:
+        with deadline_scope(state.get("deadline")):
+            return node(state)
+    return wrapper
+
+
+class CircuitBreaker:
+    """Skips an upstream after repeated failures and lets a trial call through after a cool-down."""
+
+    def __init__(self, name: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD, reset_seconds: float = CIRCUIT_RESET_SECONDS):
+        """
+        Initialize the breaker.
+
+        Args:
+            name: Upstream name used in logs
+            failure_threshold: Consecutive failures that open the circuit
+            reset_seconds: Seconds the circuit stays open before a trial call
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Check whether a call may be made now."""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_seconds or self._trial_in_flight:
+                return False
+            # Half-open: let a single trial call through
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        """Close the circuit after a successful call."""
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info(f"Circuit for {self.name} closed")
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        """Count a failed call, opening the circuit at the threshold."""
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning(f"Circuit for {self.name} opened after {self.failures} consecutive failures")
+                self.opened_at = time.monotonic()
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(upstream: str) -> CircuitBreaker:
+    """Get the process-wide circuit breaker for an upstream."""
+    with _breakers_lock:
+        if upstream not in _breakers:
+            _breakers[upstream] = CircuitBreaker(upstream)
+        return _breakers[upstream]
+
+
+def is_transient(error: Exception) -> bool:
+    """Check whether an error is worth retrying (timeouts, dropped connections, 429 and 5xx)."""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+
+    status = getattr(error, "status_code", None) or getattr(error, "status", None)
+    if isinstance(status, int):
+        return status in TRANSIENT_STATUS_CODES or status >= 500
+
+    try:
+        import httpx
+        if isinstance(error, (httpx.TimeoutException, httpx.NetworkError)):
+            return True
+    except ImportError:
+        pass
+    try:
+        import openai
+        if isinstance(error, openai.APIConnectionError):  # Includes APITimeoutError
+            return True
+    except ImportError:
+        pass
+    try:
+        import requests
+        if isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)):
+            return True
+    except ImportError:
+        pass
+    return False
+
+
+def call_upstream(upstream: str, call: Callable[[float], Any], max_attempts: int = RETRY_MAX_ATTEMPTS) -> Any:
+    """
+    Call an external service within the current deadline.
+
+    Each attempt gets the upstream's timeout, capped by the remaining budget.
+    Transient errors are retried with jittered exponential backoff; other
+    errors, an open circuit or a spent budget are raised for the caller's
+    existing fallback handling.
+
+    Args:
+        upstream: Service name ("openai", "pinecone" or "tavily")
+        call: Function making the request, given the timeout in seconds to use
+        max_attempts: Maximum number of attempts
+
+    Returns:
+        The call's result
+    """
+    breaker = get_circuit_breaker(upstream)
+    timeout_cap = UPSTREAM_TIMEOUTS.get(upstream, 30.0)
+
+    for attempt in range(1, max_attempts + 1):
+        remaining = remaining_budget()
+        if remaining is not None and remaining < MIN_CALL_TIMEOUT:
+            raise DeadlineExceeded(f"No time left in the request budget for {upstream}")
+        if not breaker.allow():
+            raise CircuitOpenError(f"{upstream} is temporarily unavailable (circuit open)")
+
+        timeout = timeout_cap if remaining is None else min(timeout_cap, remaining)
+        try:
+            result = call(timeout)
+        except Exception as e:
+            if not is_transient(e):
+                # The upstream answered; the request itself was rejected
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            if attempt == max_attempts:
+                raise
+            delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1)))
+            remaining = remaining_budget()
+            if remaining is not None and remaining - delay < MIN_CALL_TIMEOUT:
+                raise
+            logger.warning(f"Transient {upstream} error (attempt {attempt}/{max_attempts}), retrying in {delay:.2f}s: {e}")
+            time.sleep(delay)
+        else:
+            breaker.record_success()
+            return result
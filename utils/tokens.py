@@ -0,0 +1,47 @@
+"""Token counting with the model's tokenizer."""
+
+import logging
+from functools import lru_cache
+from config.settings import OPENAI_MODEL
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+    logger.warning("tiktoken not installed. Token counts will be estimated. Install with: pip install tiktoken")
+
+
+@lru_cache(maxsize=8)
+def _get_encoding(model: str):
+    """Get the tokenizer for a model, falling back to the GPT-4o encoding."""
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # tiktoken downloads encodings on first use, which fails when offline
+        logger.warning(f"Could not load tokenizer for {model}, estimating token counts: {e}")
+        return None
+
+
+def count_tokens(text: str, model: str = OPENAI_MODEL) -> int:
+    """
+    Count the tokens a text uses for a model.
+    
+    Args:
+        text: Text to count
+        model: Model whose tokenizer to use
+        
+    Returns:
+        Number of tokens (estimated at 4 characters per token without tiktoken)
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding(model) if TIKTOKEN_AVAILABLE else None
+    if encoding is None:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text, disallowed_special=()))